@@ -0,0 +1,329 @@
+"""
+Pipelines de agregação usados pelas telas administrativas
+Calculam os totais de todos os funcionários no servidor em uma única consulta
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from documents import ROSTER_ROLES
+from periods import build_period_match, get_day_bounds, get_period_key
+from rollups import ROLLUPS_COLLECTION, get_all_time_totals, get_period_totals
+
+
+def build_today_delivery_values_pipeline(employee_ids: List[str], today_iso: str) -> List[Dict[str, Any]]:
+    """Pipeline $match/$group com o valor entregue hoje por funcionário."""
+    start, end = get_day_bounds(today_iso)
+    return [
+        {
+            "$match": {
+                "employee_id": {"$in": employee_ids},
+                "created_at": {"$gte": start, "$lt": end},
+            }
+        },
+        {"$group": {"_id": "$employee_id", "total_value": {"$sum": "$value"}}},
+    ]
+
+
+async def get_today_delivery_values(
+    db: AsyncIOMotorDatabase,
+    employee_ids: List[str],
+    today_iso: str,
+) -> Dict[str, float]:
+    """Mapa employee_id -> valor entregue hoje, lido pelo índice (employee_id, created_at).
+
+    Os rollups mensais não guardam o dia, então o total de hoje vem das
+    entregas do dia, que são poucas.
+    """
+    today_values: Dict[str, float] = {employee_id: 0.0 for employee_id in employee_ids}
+    if not employee_ids:
+        return today_values
+
+    pipeline = build_today_delivery_values_pipeline(employee_ids, today_iso)
+    async for row in db.deliveries.aggregate(pipeline):
+        today_values[row["_id"]] = float(row.get("total_value", 0))
+
+    return today_values
+
+
+def build_occurrence_counts_pipeline(
+    employee_ids: List[str],
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Pipeline $match/$group com a contagem de ocorrências por funcionário.
+
+    Com mês/ano, o filtro usa `period` (ou o intervalo em `created_at` para
+    documentos ainda não migrados), atendido pelos índices (employee_id, period)
+    e (employee_id, created_at) em vez de um $regex por funcionário.
+    """
+    match: Dict[str, Any] = {"employee_id": {"$in": employee_ids}}
+    if month is not None and year is not None:
+        match.update(build_period_match(month, year))
+
+    return [
+        {"$match": match},
+        {"$group": {"_id": "$employee_id", "count": {"$sum": 1}}},
+    ]
+
+
+async def get_occurrence_counts_by_employee(
+    db: AsyncIOMotorDatabase,
+    employee_ids: List[str],
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+) -> Dict[str, int]:
+    """Mapa employee_id -> quantidade de ocorrências em um único $group.
+
+    Todos os funcionários informados aparecem no mapa (com 0 quando não há
+    ocorrências), pois o cálculo de tier compara o mínimo e o máximo da equipe.
+    """
+    occurrence_counts: Dict[str, int] = {employee_id: 0 for employee_id in employee_ids}
+    if not employee_ids:
+        return occurrence_counts
+
+    pipeline = build_occurrence_counts_pipeline(employee_ids, month, year)
+    async for row in db.occurrences.aggregate(pipeline):
+        occurrence_counts[row["_id"]] = row.get("count", 0)
+
+    return occurrence_counts
+
+
+def build_month_occurrence_counts_pipeline(month: int, year: int) -> List[Dict[str, Any]]:
+    """Contagem por funcionário das ocorrências lançadas com month/year (rotas de comissão).
+
+    A saída vem na ordem da primeira ocorrência de cada funcionário, a mesma
+    ordem de inserção que o agrupamento em Python produzia (desempate do ranking).
+    """
+    return [
+        {"$match": {"month": month, "year": year}},
+        {"$group": {"_id": "$employee_id", "count": {"$sum": 1}, "first_id": {"$min": "$_id"}}},
+        {"$sort": {"first_id": 1}},
+    ]
+
+
+async def get_month_occurrence_counts(db: AsyncIOMotorDatabase, month: int, year: int) -> Dict[str, int]:
+    """Mapa employee_id -> ocorrências do mês em um único $group, sem limite de documentos."""
+    occurrence_counts: Dict[str, int] = {}
+    async for row in db.occurrences.aggregate(build_month_occurrence_counts_pipeline(month, year)):
+        occurrence_counts[row["_id"]] = row.get("count", 0)
+    return occurrence_counts
+
+
+def _commission_totals_group(group_id: Any) -> Dict[str, Any]:
+    return {
+        "$group": {
+            "_id": group_id,
+            "count": {"$sum": 1},
+            "total_amount": {"$sum": "$commission_amount"},
+            "average_amount": {"$avg": "$commission_amount"},
+        }
+    }
+
+
+def build_commission_statistics_pipeline(
+    month: int,
+    year: int,
+    by_role: bool = False,
+    by_truck_type: bool = False,
+) -> List[Dict[str, Any]]:
+    """Estatísticas do mês em uma única agregação sobre `commissions`.
+
+    As ocorrências (e, com by_truck_type, os rollups do mês) entram no mesmo
+    fluxo com $unionWith, marcadas por `kind`; o $facet calcula cada bloco
+    separadamente. by_role busca o cargo em `users` apenas para as comissões.
+    """
+    commissions_only = {"$match": {"kind": "commission"}}
+    facets: Dict[str, List[Dict[str, Any]]] = {
+        "tiers": [commissions_only, {"$group": {"_id": "$tier", "count": {"$sum": 1}}}],
+        "totals": [commissions_only, _commission_totals_group(None)],
+        "occurrences": [{"$match": {"kind": "occurrence"}}, {"$count": "count"}],
+    }
+    if by_role:
+        facets["by_role"] = [
+            commissions_only,
+            {"$lookup": {"from": "users", "localField": "employee_id", "foreignField": "id", "as": "user"}},
+            _commission_totals_group({"$ifNull": [{"$arrayElemAt": ["$user.role", 0]}, "unknown"]}),
+            {"$sort": {"_id": 1}},
+        ]
+
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": {"month": month, "year": year}},
+        {
+            "$project": {
+                "_id": 0,
+                "kind": {"$literal": "commission"},
+                "employee_id": 1,
+                "tier": 1,
+                "commission_amount": 1,
+            }
+        },
+        {
+            "$unionWith": {
+                "coll": "occurrences",
+                "pipeline": [
+                    {"$match": {"month": month, "year": year}},
+                    {"$project": {"_id": 0, "kind": {"$literal": "occurrence"}}},
+                ],
+            }
+        },
+    ]
+
+    if by_truck_type:
+        pipeline.append(
+            {
+                "$unionWith": {
+                    "coll": "monthly_rollups",
+                    "pipeline": [
+                        {"$match": {"period": get_period_key(month, year), "truck_type": {"$ne": ""}}},
+                        {
+                            "$project": {
+                                "_id": 0,
+                                "kind": {"$literal": "rollup"},
+                                "truck_type": 1,
+                                "delivered_value": 1,
+                                "delivery_count": 1,
+                                "occurrence_count": 1,
+                            }
+                        },
+                    ],
+                }
+            }
+        )
+        facets["by_truck_type"] = [
+            {"$match": {"kind": "rollup"}},
+            {
+                "$group": {
+                    "_id": "$truck_type",
+                    "delivered_value": {"$sum": "$delivered_value"},
+                    "delivery_count": {"$sum": "$delivery_count"},
+                    "occurrence_count": {"$sum": "$occurrence_count"},
+                }
+            },
+            {"$sort": {"_id": 1}},
+        ]
+
+    pipeline.append({"$facet": facets})
+    return pipeline
+
+
+def _round_totals(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "count": row.get("count", 0),
+        "total_amount": round(row.get("total_amount") or 0, 2),
+        "average_amount": round(row.get("average_amount") or 0, 2),
+    }
+
+
+async def get_commission_totals(db: AsyncIOMotorDatabase, query: Dict[str, Any]) -> Tuple[int, float]:
+    """Quantidade e soma de commission_amount das comissões do filtro (todas, não uma página)."""
+    pipeline = [
+        {"$match": query},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "total_amount": {"$sum": "$commission_amount"}}},
+    ]
+    async for row in db.commissions.aggregate(pipeline):
+        return row["count"], row["total_amount"]
+    return 0, 0
+
+
+async def get_commission_statistics(
+    db: AsyncIOMotorDatabase,
+    month: int,
+    year: int,
+    by_role: bool = False,
+    by_truck_type: bool = False,
+) -> Dict[str, Any]:
+    """Distribuição por tier, totais, média e ocorrências do mês em um round trip, sem limite de documentos."""
+    pipeline = build_commission_statistics_pipeline(month, year, by_role, by_truck_type)
+    facets: Dict[str, Any] = {}
+    async for row in db.commissions.aggregate(pipeline):
+        facets = row
+
+    tiers = {"high": 0, "median": 0, "low": 0}
+    for row in facets.get("tiers", []):
+        tiers[row["_id"]] = row["count"]
+
+    totals = _round_totals((facets.get("totals") or [{}])[0])
+    occurrences = (facets.get("occurrences") or [{}])[0].get("count", 0)
+
+    statistics: Dict[str, Any] = {
+        "total_commissions_posted": totals["count"],
+        "total_occurrences_logged": occurrences,
+        "tier_distribution": tiers,
+        "average_commission": totals["average_amount"],
+        "total_commission_amount": totals["total_amount"],
+    }
+    if by_role:
+        statistics["by_role"] = {row["_id"]: _round_totals(row) for row in facets.get("by_role", [])}
+    if by_truck_type:
+        statistics["by_truck_type"] = {
+            row["_id"]: {
+                "delivered_value": round(row.get("delivered_value") or 0, 2),
+                "delivery_count": row.get("delivery_count", 0),
+                "occurrence_count": row.get("occurrence_count", 0),
+            }
+            for row in facets.get("by_truck_type", [])
+        }
+    return statistics
+
+
+def build_occurrence_histogram_pipeline(period: int) -> List[Dict[str, Any]]:
+    """Histograma ocorrências -> funcionários da equipe no mês, a partir de `monthly_rollups`.
+
+    Só entra quem teve ocorrência no mês (índice period/employee_id); quem tem
+    zero é a diferença para o tamanho da equipe, contado à parte.
+    """
+    return [
+        {"$match": {"period": period, "occurrence_count": {"$gt": 0}}},
+        {"$group": {"_id": "$employee_id", "occurrence_count": {"$sum": "$occurrence_count"}}},
+        {"$lookup": {"from": "users", "localField": "_id", "foreignField": "id", "as": "user"}},
+        {"$match": {"user.role": {"$in": ROSTER_ROLES}}},
+        {"$group": {"_id": "$occurrence_count", "employees": {"$sum": 1}}},
+    ]
+
+
+async def get_occurrence_count_histogram(db: AsyncIOMotorDatabase, period: int) -> Dict[int, int]:
+    """Quantos funcionários da equipe têm cada contagem de ocorrências no mês (inclusive zero)."""
+    histogram_rows, roster_size = await asyncio.gather(
+        db[ROLLUPS_COLLECTION].aggregate(build_occurrence_histogram_pipeline(period)).to_list(None),
+        db.users.count_documents({"role": {"$in": ROSTER_ROLES}}),
+    )
+    histogram = {row["_id"]: row["employees"] for row in histogram_rows}
+    without_occurrences = roster_size - sum(histogram.values())
+    if without_occurrences > 0:
+        histogram[0] = without_occurrences
+    return histogram
+
+
+async def get_employee_summary_totals(
+    db: AsyncIOMotorDatabase,
+    employee_id: str,
+    month: int,
+    year: int,
+    today_iso: str,
+) -> Dict[str, Any]:
+    """Totais do funcionário (mês, hoje, todos os meses, by_truck) e entradas do tier.
+
+    Consultas independentes, disparadas juntas: o tempo é o da mais lenta. O
+    ranking usa o histograma da equipe, sem carregar um documento por funcionário.
+    A lista de ocorrências fica em GET /api/employees/{employee_id}/occurrences.
+    """
+    period = get_period_key(month, year)
+    user, all_time, month_totals, today_values, histogram = await asyncio.gather(
+        db.users.find_one({"id": employee_id}, {"_id": 0, "name": 1, "role": 1}),
+        get_all_time_totals(db, [employee_id]),
+        get_period_totals(db, period, [employee_id]),
+        get_today_delivery_values(db, [employee_id], today_iso),
+        get_occurrence_count_histogram(db, period),
+    )
+
+    return {
+        "user": user,
+        "in_roster": bool(user and user.get("role") in ROSTER_ROLES),
+        "all_time": all_time.get(employee_id) or {},
+        "month": month_totals.get(employee_id) or {},
+        "today_delivered_value": today_values.get(employee_id, 0.0),
+        "occurrence_count_histogram": histogram,
+    }
@@ -0,0 +1,136 @@
+"""
+Benchmark do mapa employee_id -> ocorrências do mês
+
+Compara a versão antiga (um count_documents com $regex por funcionário) com o
+$group único de aggregations.get_occurrence_counts_by_employee.
+
+Uso:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_occurrence_counts.py
+    python benchmarks/bench_occurrence_counts.py --sizes 100 1000 --mongomock
+
+O banco usado (BENCH_DB_NAME, padrão commission_tracker_bench) é apagado e
+recriado a cada tamanho; nunca aponte para o banco de produção.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aggregations import get_occurrence_counts_by_employee  # noqa: E402
+
+try:
+    from mongomock_motor import AsyncMongoMockClient
+except Exception:
+    AsyncMongoMockClient = None
+
+
+OCCURRENCE_TYPES = ["delay", "damage", "accident", "other"]
+
+
+async def legacy_occurrence_count_map(db, employee_ids: List[str], month: int, year: int) -> Dict[str, int]:
+    """Implementação anterior: um count_documents com $regex por funcionário."""
+    period_prefix = f"{year:04d}-{month:02d}"
+    occurrence_counts: Dict[str, int] = {}
+    for employee_id in employee_ids:
+        occurrence_counts[employee_id] = await db.occurrences.count_documents(
+            {
+                "employee_id": employee_id,
+                "created_at": {"$regex": f"^{period_prefix}"},
+            }
+        )
+    return occurrence_counts
+
+
+async def seed(db, employees: int, occurrences_per_employee: float, month: int, year: int, rng: random.Random) -> List[str]:
+    await db.users.drop()
+    await db.occurrences.drop()
+
+    employee_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(employees)]
+    await db.users.insert_many(
+        [
+            {"id": employee_id, "username": f"bench_{idx}", "name": f"Bench {idx}", "role": "driver"}
+            for idx, employee_id in enumerate(employee_ids)
+        ]
+    )
+
+    occurrences = []
+    for employee_id in employee_ids:
+        for _ in range(int(rng.expovariate(1 / occurrences_per_employee))):
+            # Metade no mês medido, metade no mês anterior
+            occurrence_month = month if rng.random() < 0.5 else (month - 2) % 12 + 1
+            created_at = datetime(year, occurrence_month, rng.randint(1, 28), rng.randint(0, 23), tzinfo=timezone.utc)
+            occurrences.append(
+                {
+                    "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "employee_id": employee_id,
+                    "type": rng.choice(OCCURRENCE_TYPES),
+                    "created_at": created_at.isoformat(),
+                }
+            )
+    for start in range(0, len(occurrences), 5000):
+        await db.occurrences.insert_many(occurrences[start:start + 5000])
+
+    await db.occurrences.create_index([("employee_id", 1), ("created_at", 1)])
+    return employee_ids
+
+
+async def timed(coro_factory, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def run(args) -> None:
+    if args.mongomock:
+        if AsyncMongoMockClient is None:
+            raise SystemExit("mongomock-motor não instalado")
+        client = AsyncMongoMockClient()
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+
+    db = client[os.environ.get("BENCH_DB_NAME", "commission_tracker_bench")]
+    now = datetime.now(timezone.utc)
+    rng = random.Random(args.seed)
+
+    print(f"{'employees':>10} {'legacy (s)':>12} {'$group (s)':>12} {'speedup':>9}")
+    for size in args.sizes:
+        employee_ids = await seed(db, size, args.occurrences, now.month, now.year, rng)
+
+        legacy = await timed(lambda: legacy_occurrence_count_map(db, employee_ids, now.month, now.year), args.repeat)
+        grouped = await timed(lambda: get_occurrence_counts_by_employee(db, employee_ids, now.month, now.year), args.repeat)
+
+        expected = await legacy_occurrence_count_map(db, employee_ids, now.month, now.year)
+        actual = await get_occurrence_counts_by_employee(db, employee_ids, now.month, now.year)
+        if expected != actual:
+            raise SystemExit(f"Resultados divergentes para {size} funcionários")
+
+        print(f"{size:>10} {legacy:>12.4f} {grouped:>12.4f} {legacy / grouped:>8.1f}x")
+
+    await client.drop_database(db.name)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--occurrences", type=float, default=3.0, help="média de ocorrências por funcionário")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongomock", action="store_true", help="usa mongomock-motor em vez de um MongoDB real")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+Benchmark das rotas mais usadas do server.py
+
+Popula um banco de benchmark com funcionários, entregas e ocorrências e chama as
+rotas pelo app ASGI (sem rede): GET /api/admin/users, GET /api/employees/{id},
+GET /api/reports/monthly-commission, POST /api/deliveries e POST /api/auth/login.
+Mede latência p50/p95/p99, vazão e comandos enviados ao MongoDB por requisição,
+e grava o resultado em JSON para comparar execuções entre commits.
+
+Uso:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_routes.py --employees 500 --deliveries 50000
+    python benchmarks/bench_routes.py --mongomock --output results/local.json
+    python benchmarks/bench_routes.py --compare results/antes.json --output results/depois.json
+
+O banco usado (BENCH_DB_NAME, padrão commission_tracker_bench) é apagado e
+recriado; nunca aponte para o banco de produção. Com --mongomock não há
+contagem de comandos (o mongomock não passa pelo driver).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from pymongo import monitoring  # noqa: E402
+
+try:
+    import httpx
+except Exception:
+    httpx = None
+
+try:
+    from mongomock_motor import AsyncMongoMockClient
+except Exception:
+    AsyncMongoMockClient = None
+
+
+OCCURRENCE_TYPES = ["delay", "damage", "accident", "other"]
+BENCH_PASSWORD = "bench-password"
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Conta os comandos enviados ao MongoDB (cada um é um round trip)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def load_server(use_mongomock: bool):
+    """Importa server.py apontando para o banco de benchmark.
+
+    O server cria o cliente do MongoDB na importação, então o ambiente (e, com
+    --mongomock, o cliente em memória) precisa estar pronto antes do import.
+    """
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = os.environ.get("BENCH_DB_NAME", "commission_tracker_bench")
+    os.environ["NOTIFICATION_SENDER"] = "stub"
+
+    if use_mongomock:
+        if AsyncMongoMockClient is None:
+            raise SystemExit("mongomock-motor não instalado")
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+    import server
+
+    # As rotas registram uma linha por funcionário; no benchmark isso só atrapalha
+    logging.getLogger().setLevel(logging.WARNING)
+    return server
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(len(sorted_values) * fraction) - 1)]
+
+
+async def insert_in_batches(collection, docs: Iterable[Dict[str, Any]], batch_size: int = 5000) -> None:
+    batch: List[Dict[str, Any]] = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await collection.insert_many(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch)
+
+
+async def seed(server, args, rng: random.Random) -> Dict[str, Any]:
+    """Cria funcionários, entregas e ocorrências espalhadas pelos últimos meses."""
+    from rollups import rebuild_rollups
+    from periods import build_date_fields
+
+    db = server.db
+    await server.client.drop_database(db.name)
+
+    now = datetime.now(timezone.utc)
+    password_hash = server.hash_password(BENCH_PASSWORD)
+    users = []
+    for idx in range(args.employees):
+        users.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "username": f"bench_{idx}",
+            "name": f"Bench {idx}",
+            "role": "driver" if idx % 2 == 0 else "helper",
+            "assigned_day": None,
+            "password": password_hash,
+            "created_at": now.isoformat(),
+        })
+    admin = {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "username": "bench_admin",
+        "name": "Bench Admin",
+        "role": "admin",
+        "password": password_hash,
+        "created_at": now.isoformat(),
+    }
+    await db.users.insert_many(users + [admin])
+    employee_ids = [user["id"] for user in users]
+
+    def random_moment() -> datetime:
+        return now - timedelta(days=rng.uniform(0, 30 * args.months), seconds=rng.randint(0, 86399))
+
+    trucks = list(server.TRUCK_RATES)
+    deliveries = (
+        {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "employee_id": rng.choice(employee_ids),
+            "truck_type": rng.choice(trucks),
+            "value": round(rng.uniform(50, 3000), 2),
+            **build_date_fields(random_moment()),
+        }
+        for _ in range(args.deliveries)
+    )
+    await insert_in_batches(db.deliveries, deliveries)
+
+    def random_occurrence() -> Dict[str, Any]:
+        index = rng.randrange(len(users))
+        return {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "employee_id": users[index]["id"],
+            "employee_name": users[index]["name"],
+            "type": rng.choice(OCCURRENCE_TYPES),
+            "description": "benchmark",
+            "truck_type": rng.choice(trucks),
+            **build_date_fields(random_moment()),
+        }
+
+    await insert_in_batches(db.occurrences, (random_occurrence() for _ in range(args.occurrences)))
+
+    await server.ensure_indexes(db)
+    await rebuild_rollups(db)
+    return {"employee_ids": employee_ids, "admin": admin}
+
+
+async def measure(
+    name: str,
+    send: Callable[[int], Awaitable[Any]],
+    requests: int,
+    concurrency: int,
+    counter: Optional[CommandCounter],
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await send(index)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    commands_before = counter.count if counter else 0
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies_ms), 3),
+            "p50": round(percentile(latencies_ms, 0.50), 3),
+            "p95": round(percentile(latencies_ms, 0.95), 3),
+            "p99": round(percentile(latencies_ms, 0.99), 3),
+            "max": round(latencies_ms[-1], 3),
+        },
+        "mongo_commands_per_request": (
+            round((counter.count - commands_before) / requests, 2) if counter else None
+        ),
+    }
+    print(
+        f"{name:<44} {result['latency_ms']['p50']:>9.2f} {result['latency_ms']['p95']:>9.2f} "
+        f"{result['latency_ms']['p99']:>9.2f} {result['throughput_rps']:>10.1f} "
+        f"{result['mongo_commands_per_request'] if counter else '-':>8}"
+    )
+    return result
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def print_comparison(previous: Dict[str, Any], current: Dict[str, Any]) -> None:
+    print(f"\nComparação com {previous.get('revision') or '?'} (p95 ms / comandos por requisição)")
+    for route, result in current["routes"].items():
+        before = previous.get("routes", {}).get(route)
+        if not before:
+            continue
+        p95_before, p95_after = before["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        change = (p95_after - p95_before) / p95_before * 100 if p95_before else 0.0
+        print(
+            f"{route:<44} {p95_before:>9.2f} -> {p95_after:>9.2f} ({change:+.1f}%)   "
+            f"{before.get('mongo_commands_per_request')} -> {result.get('mongo_commands_per_request')}"
+        )
+
+
+async def run(args) -> Dict[str, Any]:
+    if httpx is None:
+        raise SystemExit("httpx não instalado (necessário para chamar o app ASGI)")
+
+    counter = None
+    if not args.mongomock:
+        counter = CommandCounter()
+        monitoring.register(counter)
+
+    server = load_server(args.mongomock)
+    rng = random.Random(args.seed)
+
+    print(
+        f"Populando: {args.employees} funcionários, {args.deliveries} entregas, "
+        f"{args.occurrences} ocorrências em {args.months} meses"
+    )
+    seeded = await seed(server, args, rng)
+    employee_ids = seeded["employee_ids"]
+    admin_token = server.create_access_token({"user_id": seeded["admin"]["id"], "role": "admin"})
+    now = datetime.now(timezone.utc)
+    previous_month = 12 if now.month == 1 else now.month - 1
+    previous_year = now.year - 1 if now.month == 1 else now.year
+    trucks = list(server.TRUCK_RATES)
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(
+        transport=transport,
+        base_url="http://bench",
+        headers={"Authorization": f"Bearer {admin_token}"},
+    ) as http:
+        routes: Dict[str, Callable[[int], Awaitable[Any]]] = {
+            "GET /api/admin/users": lambda i: http.get("/api/admin/users"),
+            "GET /api/employees/{id}": lambda i: http.get(f"/api/employees/{employee_ids[i % len(employee_ids)]}"),
+            "GET /api/reports/monthly-commission": lambda i: http.get(
+                "/api/reports/monthly-commission", params={"month": now.month, "year": now.year}
+            ),
+            "GET /api/reports/monthly-commission (closed)": lambda i: http.get(
+                "/api/reports/monthly-commission", params={"month": previous_month, "year": previous_year}
+            ),
+            "POST /api/deliveries": lambda i: http.post(
+                "/api/deliveries",
+                json={
+                    "employee_id": employee_ids[i % len(employee_ids)],
+                    "truck_type": trucks[i % len(trucks)],
+                    "value": 100.0,
+                },
+            ),
+            "POST /api/auth/login": lambda i: http.post(
+                "/api/auth/login",
+                json={"username": f"bench_{i % len(employee_ids)}", "password": BENCH_PASSWORD},
+            ),
+        }
+        if args.routes:
+            routes = {name: send for name, send in routes.items() if any(key in name for key in args.routes)}
+
+        print(f"\n{'rota':<44} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>10} {'cmds':>8}")
+        results = {}
+        for name, send in routes.items():
+            requests = args.login_requests if "login" in name else args.requests
+            for index in range(min(args.warmup, requests)):
+                await send(index)
+            results[name] = await measure(name, send, requests, args.concurrency, counter)
+
+    await server.outbox_dispatcher.stop()
+    if not args.keep_data:
+        await server.client.drop_database(server.db.name)
+
+    return {
+        "revision": git_revision(),
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "datastore": "mongomock" if args.mongomock else "mongodb",
+        "config": {
+            "employees": args.employees,
+            "deliveries": args.deliveries,
+            "occurrences": args.occurrences,
+            "months": args.months,
+            "requests": args.requests,
+            "login_requests": args.login_requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "routes": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--deliveries", type=int, default=20000)
+    parser.add_argument("--occurrences", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=6, help="meses de histórico gerado")
+    parser.add_argument("--requests", type=int, default=200, help="requisições por rota")
+    parser.add_argument("--login-requests", type=int, default=20, help="requisições de login (bcrypt é lento de propósito)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--routes", nargs="+", help="só as rotas cujo nome contém um destes trechos")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="arquivo JSON com o resultado")
+    parser.add_argument("--compare", type=Path, help="resultado JSON anterior para comparar")
+    parser.add_argument("--keep-data", action="store_true", help="não apaga o banco de benchmark no final")
+    parser.add_argument("--mongomock", action="store_true", help="usa mongomock-motor em vez de um MongoDB real")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+        print(f"\nResultado gravado em {args.output}")
+    if args.compare:
+        print_comparison(json.loads(args.compare.read_text()), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,23 @@ Endpoints para gerenciamento de comissões e ocorrências
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, Field
 from datetime import datetime, timezone
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Sequence
 import uuid
+import numpy as np
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from push_notifications import notify_commission_update
+from aggregations import get_commission_statistics as get_month_commission_statistics, get_commission_totals
+from notification_outbox import enqueue_commission_notification
+from pagination import InvalidCursor, find_page
+from periods import build_date_fields
+from tiers import assign_position_tiers
+from repositories import CommissionRepository, MongoRepository
+from live_updates import COMMISSION_EVENT, OCCURRENCE_EVENT, build_employee_deltas, dashboard_events
+
+# Limite de funcionários por chamada de /calculate/batch
+MAX_BATCH_ENTRIES = 5000
+
+# Detalhamentos aceitos por /statistics
+STATISTICS_BREAKDOWNS = {"role", "truck_type"}
 
 # Models
 class OccurrenceRecord(BaseModel):
@@ -40,6 +53,27 @@ class CommissionRequest(BaseModel):
     year: int
     notes: Optional[str] = None
 
+class CommissionBatchEntry(BaseModel):
+    employee_id: str
+    total_delivered_value: float
+
+class CommissionBatchRequest(BaseModel):
+    month: int
+    year: int
+    entries: List[CommissionBatchEntry]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "month": 2,
+                "year": 2026,
+                "entries": [
+                    {"employee_id": "emp_123", "total_delivered_value": 10500.00},
+                    {"employee_id": "emp_456", "total_delivered_value": 8200.00}
+                ]
+            }
+        }
+
 class CommissionPostRequest(BaseModel):
     employee_id: str
     employee_name: str
@@ -80,9 +114,14 @@ class CommissionRecord(BaseModel):
     posted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     notes: Optional[str] = None
 
-def create_commission_router(db: AsyncIOMotorDatabase, security_dependency) -> APIRouter:
+def create_commission_router(
+    db: AsyncIOMotorDatabase,
+    security_dependency,
+    repository: Optional[CommissionRepository] = None,
+) -> APIRouter:
     """Cria router com endpoints de comissões"""
     router = APIRouter(prefix="/api/commission", tags=["commission"])
+    repository = repository or MongoRepository(db)
 
     # Endpoints
     @router.post("/occurrences")
@@ -92,56 +131,61 @@ def create_commission_router(db: AsyncIOMotorDatabase, security_dependency) -> A
         Ocorrências são usadas para calcular o percentual de comissão
         """
         occurrence_doc = occurrence.model_dump()
-        occurrence_doc['created_at'] = occurrence_doc['created_at'].isoformat()
+        occurrence_doc.update(build_date_fields(occurrence_doc['created_at']))
         
-        result = await db.occurrences.insert_one(occurrence_doc)
-        if not result.inserted_id:
-            raise HTTPException(status_code=500, detail="Error saving occurrence")
+        async with dashboard_events.snapshot_lock:
+            occurrence_id = await repository.add_occurrence(occurrence_doc)
+            dashboard_events.publish_deltas(OCCURRENCE_EVENT, build_employee_deltas([occurrence_doc], is_delivery=False))
         
         return {
             "message": "Occurrence logged successfully",
-            "occurrence_id": str(result.inserted_id),
+            "occurrence_id": occurrence_id,
             "occurrence": occurrence
         }
 
     @router.get("/occurrences")
-    async def get_all_occurrences(month: int, year: int):
+    async def get_all_occurrences(month: int, year: int, limit: Optional[int] = None, cursor: Optional[str] = None):
         """
-        Obter todas as ocorrências de um mês/ano
-        Usado para calcular percentuais
+        Obter as ocorrências de um mês/ano, das mais recentes para as mais antigas
+        Paginado: passe `next_cursor` como `cursor` para obter a página seguinte
         """
-        occurrences = await db.occurrences.find(
-            {"month": month, "year": year},
-            {"_id": 0}
-        ).to_list(1000)
+        query = {"month": month, "year": year}
+        occurrences, next_cursor = await paginate(db.occurrences, query, OCCURRENCE_SORT, limit, cursor)
         
         return {
             "month": month,
             "year": year,
-            "total_occurrences": len(occurrences),
-            "occurrences": occurrences
+            "total_occurrences": await db.occurrences.count_documents(query),
+            "occurrences": occurrences,
+            "next_cursor": next_cursor
         }
 
     @router.get("/occurrences/employee/{employee_id}")
-    async def get_employee_occurrences(employee_id: str, month: int, year: int):
+    async def get_employee_occurrences(
+        employee_id: str,
+        month: int,
+        year: int,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ):
         """
-        Obter ocorrências de um funcionário específico
+        Obter ocorrências de um funcionário específico (paginado por cursor)
+        `occurrence_count` é o total do mês, não o tamanho da página
         """
-        occurrences = await db.occurrences.find(
-            {
-                "employee_id": employee_id,
-                "month": month,
-                "year": year
-            },
-            {"_id": 0}
-        ).to_list(100)
+        query = {
+            "employee_id": employee_id,
+            "month": month,
+            "year": year
+        }
+        occurrences, next_cursor = await paginate(db.occurrences, query, OCCURRENCE_SORT, limit, cursor)
         
         return {
             "employee_id": employee_id,
             "month": month,
             "year": year,
-            "occurrence_count": len(occurrences),
-            "occurrences": occurrences
+            "occurrence_count": await db.occurrences.count_documents(query),
+            "occurrences": occurrences,
+            "next_cursor": next_cursor
         }
 
     @router.post("/calculate")
@@ -158,35 +202,19 @@ def create_commission_router(db: AsyncIOMotorDatabase, security_dependency) -> A
         - Dividir em 3 tiers iguais
         - Tier alto: 0.8%, Tier médio: 0.9%, Tier baixo: 1.0%
         """
-        # Buscar todas as ocorrências do mês
-        all_occurrences = await db.occurrences.find(
-            {"month": commission_req.month, "year": commission_req.year},
-            {"_id": 0}
-        ).to_list(1000)
-        
-        # Agrupar ocorrências por funcionário
-        employee_occurrences: Dict[str, int] = {}
-        for occ in all_occurrences:
-            emp_id = occ['employee_id']
-            employee_occurrences[emp_id] = employee_occurrences.get(emp_id, 0) + 1
+        # Ocorrências do mês agrupadas por funcionário no servidor
+        employee_occurrences = await repository.get_month_occurrence_counts(commission_req.month, commission_req.year)
         
         # Obter contagem de ocorrências do funcionário atual
         current_employee_count = employee_occurrences.get(commission_req.employee_id, 0)
         
-        # Determinar o percentual baseado em ocorrências
-        percentage = determine_percentage_by_tier(
-            commission_req.employee_id,
-            employee_occurrences
-        )
+        # Determinar tier e percentual baseado em ocorrências
+        assignment = assign_position_tiers(employee_occurrences).lookup(commission_req.employee_id)
+        percentage = assignment.rate
+        tier = assignment.tier
         
         # Calcular valor da comissão
-        commission_amount = round(
-            commission_req.total_delivered_value * (percentage / 100),
-            2
-        )
-        
-        # Determinar tier
-        tier = get_employee_tier(commission_req.employee_id, employee_occurrences)
+        commission_amount = calculate_commission_amounts([commission_req.total_delivered_value], [percentage])[0]
         
         return {
             "employee_id": commission_req.employee_id,
@@ -202,6 +230,48 @@ def create_commission_router(db: AsyncIOMotorDatabase, security_dependency) -> A
             }
         }
 
+    @router.post("/calculate/batch")
+    async def calculate_commission_batch(batch_req: CommissionBatchRequest):
+        """
+        Calcular a comissão de vários funcionários do mesmo mês em uma chamada
+        Mesma regra de /calculate: as ocorrências do mês são buscadas uma vez,
+        a equipe é ranqueada uma vez e os valores são calculados em lote
+        """
+        entries = batch_req.entries
+        if not entries:
+            raise HTTPException(status_code=400, detail="No entries provided")
+        if len(entries) > MAX_BATCH_ENTRIES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ENTRIES} entries per request")
+        
+        employee_occurrences = await repository.get_month_occurrence_counts(batch_req.month, batch_req.year)
+        tiers = assign_position_tiers(employee_occurrences)
+        
+        assignments = [tiers.lookup(entry.employee_id) for entry in entries]
+        values = [entry.total_delivered_value for entry in entries]
+        amounts = calculate_commission_amounts(values, [assignment.rate for assignment in assignments])
+        
+        results = [
+            {
+                "employee_id": entry.employee_id,
+                "total_delivered_value": entry.total_delivered_value,
+                "occurrence_count": employee_occurrences.get(entry.employee_id, 0),
+                "percentage": assignment.rate,
+                "commission_amount": amount,
+                "tier": assignment.tier,
+                "rank": assignment.rank
+            }
+            for entry, assignment, amount in zip(entries, assignments, amounts)
+        ]
+        
+        return {
+            "month": batch_req.month,
+            "year": batch_req.year,
+            "total_employees": len(results),
+            "total_delivered_value": round(sum(values), 2),
+            "total_commission_amount": round(sum(amounts), 2),
+            "results": results
+        }
+
     @router.post("/post")
     async def post_commission(commission_data: CommissionPostRequest):
         """
@@ -224,13 +294,19 @@ def create_commission_router(db: AsyncIOMotorDatabase, security_dependency) -> A
         commission_doc = commission.model_dump()
         commission_doc['posted_at'] = commission_doc['posted_at'].isoformat()
         
-        result = await db.commissions.insert_one(commission_doc)
-        if not result.inserted_id:
-            raise HTTPException(status_code=500, detail="Error posting commission")
+        commission_id = await repository.add_commission(commission_doc)
+        dashboard_events.publish(COMMISSION_EVENT, {
+            "employee_id": commission.employee_id,
+            "employee_name": commission.employee_name,
+            "month": commission.month,
+            "year": commission.year,
+            "percentage": commission.percentage,
+            "commission_amount": commission.commission_amount,
+            "commission_id": commission_id,
+        })
         
-        # Enviar notificação para o funcionário
-        # TODO: Implementar sistema de notificações em tempo real
-        await send_commission_notification(
+        # Notificação vai para o outbox; o worker envia em segundo plano
+        notification_id = await send_commission_notification(
             db,
             commission.employee_id,
             commission.employee_name,
@@ -240,158 +316,132 @@ def create_commission_router(db: AsyncIOMotorDatabase, security_dependency) -> A
         
         return {
             "message": "Commission posted successfully",
-            "commission_id": str(result.inserted_id),
+            "commission_id": commission_id,
             "commission": commission.model_dump(),
-            "notification_sent": True
+            "notification_queued": True,
+            "notification_id": notification_id
         }
 
     @router.get("/commissions/employee/{employee_id}")
-    async def get_employee_commissions(employee_id: str, month: Optional[int] = None, year: Optional[int] = None):
+    async def get_employee_commissions(
+        employee_id: str,
+        month: Optional[int] = None,
+        year: Optional[int] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ):
         """
-        Obter histórico de comissões de um funcionário
+        Obter histórico de comissões de um funcionário (paginado por cursor)
+        Os totais cobrem todas as comissões do filtro, não só a página
         """
         query = {"employee_id": employee_id}
         if month and year:
             query["month"] = month
             query["year"] = year
         
-        commissions = await db.commissions.find(query, {"_id": 0}).sort("posted_at", -1).to_list(100)
+        commissions, next_cursor = await paginate(db.commissions, query, COMMISSION_SORT, limit, cursor)
+        total, total_amount = await get_commission_totals(db, query)
         
         return {
             "employee_id": employee_id,
             "commissions": commissions,
-            "total": len(commissions),
-            "total_commission": sum(c['commission_amount'] for c in commissions)
+            "total": total,
+            "total_commission": total_amount,
+            "next_cursor": next_cursor
         }
 
     @router.get("/commissions")
-    async def get_all_commissions(month: Optional[int] = None, year: Optional[int] = None):
+    async def get_all_commissions(
+        month: Optional[int] = None,
+        year: Optional[int] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ):
         """
-        Obter todas as comissões (admin)
-        Filtrar por mês/ano se fornecido
+        Obter as comissões (admin), das mais recentes para as mais antigas
+        Filtrar por mês/ano se fornecido; paginado por cursor
+        Os totais cobrem todas as comissões do filtro, não só a página
         """
         query = {}
         if month and year:
             query = {"month": month, "year": year}
         
-        commissions = await db.commissions.find(query, {"_id": 0}).sort("posted_at", -1).to_list(1000)
+        commissions, next_cursor = await paginate(db.commissions, query, COMMISSION_SORT, limit, cursor)
+        total, total_amount = await get_commission_totals(db, query)
         
         return {
             "month": month,
             "year": year,
-            "total_commissions": len(commissions),
-            "total_amount": sum(c['commission_amount'] for c in commissions),
-            "commissions": commissions
+            "total_commissions": total,
+            "total_amount": total_amount,
+            "commissions": commissions,
+            "next_cursor": next_cursor
         }
 
     @router.get("/statistics")
-    async def get_commission_statistics(month: int, year: int):
+    async def get_commission_statistics(month: int, year: int, breakdown: Optional[str] = None):
         """
         Obter estatísticas de comissões de um mês
+        Calculadas no banco em uma única agregação ($facet), sem limite de documentos
+        `breakdown` opcional: "role", "truck_type" ou "role,truck_type"
         """
-        commissions = await db.commissions.find(
-            {"month": month, "year": year},
-            {"_id": 0}
-        ).to_list(1000)
-        
-        occurrences = await db.occurrences.find(
-            {"month": month, "year": year},
-            {"_id": 0}
-        ).to_list(1000)
-        
-        # Agrupar por tier
-        tiers = {"high": 0, "median": 0, "low": 0}
-        total_commission = 0
+        breakdowns = {item.strip() for item in (breakdown or "").split(",") if item.strip()}
+        unknown = breakdowns - STATISTICS_BREAKDOWNS
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown breakdown: {', '.join(sorted(unknown))}. Use: {', '.join(sorted(STATISTICS_BREAKDOWNS))}"
+            )
         
-        for commission in commissions:
-            tiers[commission['tier']] += 1
-            total_commission += commission['commission_amount']
+        statistics = await get_month_commission_statistics(
+            db,
+            month,
+            year,
+            by_role="role" in breakdowns,
+            by_truck_type="truck_type" in breakdowns,
+        )
         
         return {
             "month": month,
             "year": year,
-            "total_commissions_posted": len(commissions),
-            "total_occurrences_logged": len(occurrences),
-            "tier_distribution": tiers,
-            "average_commission": round(total_commission / len(commissions), 2) if commissions else 0,
-            "total_commission_amount": round(total_commission, 2)
+            **statistics
         }
 
     return router
 
+# Ordenações das listagens, das mais recentes para as mais antigas. O _id
+# (ObjectId) cresce na ordem de inserção e não empata; posted_at é texto ISO
+OCCURRENCE_SORT = [("_id", -1)]
+COMMISSION_SORT = [("_id", -1)]
+
+async def paginate(collection, query: Dict, sort, limit: Optional[int], cursor: Optional[str]):
+    try:
+        return await find_page(collection, query, sort, limit=limit, cursor=cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
 # Helper functions
-def determine_percentage_by_tier(employee_id: str, employee_occurrences: Dict[str, int]) -> float:
+def calculate_commission_amounts(values: Sequence[float], percentages: Sequence[float]) -> List[float]:
     """
-    Determinar o percentual de comissão baseado no tier do funcionário
-    Divisão em 3 tiers iguais:
-    - Top 33%: 0.8% (mais ocorrências)
-    - Middle 33%: 0.9%
-    - Bottom 33%: 1.0% (menos ocorrências)
+    valor × percentual / 100, arredondado em 2 casas, para vários funcionários de uma vez
+    Usado também por /calculate, para os dois caminhos arredondarem igual
+    O produto sai do numpy, mas o arredondamento é o round() do Python, o mesmo do
+    fechamento do mês: np.round difere em alguns centavos (ex.: 45084.5 a 1%)
     """
-    if not employee_occurrences:
-        return 1.0
-    
-    # Ordenar funcionários por contagem de ocorrências (decrescente)
-    sorted_employees = sorted(
-        employee_occurrences.items(),
-        key=lambda x: x[1],
-        reverse=True
-    )
-    
-    employee_positions = {emp_id: idx for idx, (emp_id, _) in enumerate(sorted_employees)}
-    employee_position = employee_positions.get(employee_id, len(sorted_employees) - 1)
-    
-    # Dividir em 3 tiers
-    total_employees = len(sorted_employees)
-    tier_size = total_employees / 3
-    
-    if employee_position < tier_size:
-        return 0.8  # Top tier (mais ocorrências = menor percentual)
-    elif employee_position < tier_size * 2:
-        return 0.9  # Middle tier
-    else:
-        return 1.0  # Bottom tier (menos ocorrências = maior percentual)
+    amounts = np.asarray(values, dtype=np.float64) * (np.asarray(percentages, dtype=np.float64) / 100)
+    return [round(amount, 2) for amount in amounts.tolist()]
 
-def get_employee_tier(employee_id: str, employee_occurrences: Dict[str, int]) -> str:
-    """Obter o tier (high, median, low) do funcionário"""
-    if not employee_occurrences:
-        return "low"
-    
-    sorted_employees = sorted(
-        employee_occurrences.items(),
-        key=lambda x: x[1],
-        reverse=True
-    )
-    
-    employee_positions = {emp_id: idx for idx, (emp_id, _) in enumerate(sorted_employees)}
-    employee_position = employee_positions.get(employee_id, len(sorted_employees) - 1)
-    
-    total_employees = len(sorted_employees)
-    tier_size = total_employees / 3
-    
-    if employee_position < tier_size:
-        return "high"  # Mais ocorrências
-    elif employee_position < tier_size * 2:
-        return "median"  # Ocorrências medianas
-    else:
-        return "low"  # Menos ocorrências
-
-async def send_commission_notification(db: AsyncIOMotorDatabase, employee_id: str, employee_name: str, commission_amount: float, percentage: float):
+async def send_commission_notification(db: AsyncIOMotorDatabase, employee_id: str, employee_name: str, commission_amount: float, percentage: float) -> str:
     """
-    Enviar notificação para funcionário quando comissão é lançada
-    TODO: Implementar integração com sistema de notificações
-    - Notificação em tempo real na app React
-    - Push notification para Android/iOS
-    - Email para administrador
+    Enfileirar notificação para funcionário quando comissão é lançada
+    O envio (in-app + push) é feito pelo OutboxDispatcher em segundo plano
     """
-    result = await notify_commission_update(
+    notification_id = await enqueue_commission_notification(
         db=db,
         employee_id=employee_id,
         employee_name=employee_name,
         amount=commission_amount,
         percentage=percentage,
     )
-    print(
-        f"[NOTIFICATION] {employee_name}: Comissão de R$ {commission_amount:.2f} lançada "
-        f"(sent={result.get('sent', 0)}, failed={result.get('failed', 0)})"
-    )
+    print(f"[NOTIFICATION] {employee_name}: Comissão de R$ {commission_amount:.2f} enfileirada ({notification_id})")
+    return notification_id
@@ -0,0 +1,84 @@
+"""
+Formato dos documentos gravados pelas rotas de escrita do server.py
+Usado pelas rotas e pelo gerador de dados sintéticos, para que os dois gravem
+exatamente os mesmos campos
+"""
+
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from periods import build_date_fields
+
+
+# Caminhões aceitos pelas rotas de entrega e a taxa de cada um
+TRUCK_RATES = {
+    "BKO": 3.50,
+    "PYW": 3.50,
+    "NYC": 3.50,
+    "GKY": 7.50,
+    "GSD": 7.50,
+    "AUA": 10.00
+}
+
+# Papéis que entram na equipe (lista de usuários, ranking de ocorrências e relatórios)
+ROSTER_ROLES = ["driver", "helper"]
+
+
+def build_user_doc(
+    username: str,
+    name: str,
+    role: str,
+    password_hash: str,
+    assigned_day: Optional[str] = None,
+    user_id: Optional[str] = None,
+    created_at: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Usuário como gravado por POST /api/auth/register (campos do modelo User + senha)."""
+    return {
+        "id": user_id or str(uuid.uuid4()),
+        "username": username,
+        "name": name,
+        "role": role,
+        "assigned_day": assigned_day,
+        "created_at": (created_at or datetime.now(timezone.utc)).isoformat(),
+        "password": password_hash,
+    }
+
+
+def build_delivery_doc(
+    employee_id: str,
+    truck_type: str,
+    value: float,
+    date_fields: Optional[Dict[str, Any]] = None,
+    delivery_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Entrega como gravada por POST /api/deliveries e /api/deliveries/bulk."""
+    return {
+        "id": delivery_id or str(uuid.uuid4()),
+        "employee_id": employee_id,
+        "truck_type": truck_type,
+        "value": value,
+        **(date_fields or build_date_fields()),
+    }
+
+
+def build_occurrence_doc(
+    employee_id: str,
+    employee_name: str,
+    occurrence_type: str,
+    description: str,
+    truck_type: str,
+    date_fields: Optional[Dict[str, Any]] = None,
+    occurrence_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Ocorrência como gravada por POST /api/occurrences."""
+    return {
+        "id": occurrence_id or str(uuid.uuid4()),
+        "employee_id": employee_id,
+        "employee_name": employee_name,
+        "type": occurrence_type,
+        "description": description,
+        "truck_type": truck_type,
+        **(date_fields or build_date_fields()),
+    }
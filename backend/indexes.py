@@ -0,0 +1,187 @@
+"""
+Gerenciamento de índices do MongoDB
+Declara os índices exigidos pelas consultas de server.py, commission_routes.py
+e push_notifications.py, cria-os na inicialização e avisa sobre consultas sem índice
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    unique: bool = False
+
+    @property
+    def name(self) -> str:
+        return "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+
+@dataclass(frozen=True)
+class QueryShape:
+    """Formato de uma consulta: campos de igualdade e, em seguida, de intervalo/ordenação."""
+    route: str
+    collection: str
+    equality: Tuple[str, ...] = ()
+    sort_or_range: Tuple[str, ...] = ()
+
+
+INDEXES: List[IndexSpec] = [
+    IndexSpec("users", (("id", ASCENDING),), unique=True),
+    IndexSpec("users", (("username", ASCENDING),), unique=True),
+    IndexSpec("users", (("role", ASCENDING),)),
+    IndexSpec("deliveries", (("employee_id", ASCENDING), ("created_at", ASCENDING))),
+    IndexSpec("deliveries", (("employee_id", ASCENDING), ("period", ASCENDING))),
+    IndexSpec("deliveries", (("user_id", ASCENDING),)),
+    IndexSpec("occurrences", (("employee_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING))),
+    IndexSpec(
+        "occurrences",
+        (("employee_id", ASCENDING), ("period", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)),
+    ),
+    IndexSpec("occurrences", (("month", ASCENDING), ("year", ASCENDING), ("_id", DESCENDING))),
+    IndexSpec(
+        "occurrences",
+        (("employee_id", ASCENDING), ("month", ASCENDING), ("year", ASCENDING), ("_id", DESCENDING)),
+    ),
+    IndexSpec(
+        "monthly_rollups",
+        (("employee_id", ASCENDING), ("period", ASCENDING), ("truck_type", ASCENDING)),
+        unique=True,
+    ),
+    IndexSpec("monthly_rollups", (("period", ASCENDING), ("employee_id", ASCENDING))),
+    IndexSpec("report_snapshots", (("report_type", ASCENDING), ("period", ASCENDING)), unique=True),
+    IndexSpec("month_closes", (("period", ASCENDING),), unique=True),
+    IndexSpec("notification_outbox", (("status", ASCENDING), ("next_attempt_at", ASCENDING))),
+    IndexSpec("notification_outbox", (("id", ASCENDING),), unique=True),
+    IndexSpec("notification_outbox", (("claim_id", ASCENDING),)),
+    IndexSpec("notifications", (("employee_id", ASCENDING), ("timestamp", DESCENDING))),
+    # Upsert idempotente da notificação in-app do outbox (uma cópia por id)
+    IndexSpec("notifications", (("id", ASCENDING),), unique=True),
+    IndexSpec("device_tokens", (("token", ASCENDING),), unique=True),
+    IndexSpec("device_tokens", (("employee_id", ASCENDING), ("is_active", ASCENDING))),
+    # Listagens paginadas por _id (ordem de lançamento); ver commission_routes.COMMISSION_SORT
+    IndexSpec("commissions", (("employee_id", ASCENDING), ("_id", DESCENDING))),
+    IndexSpec("commissions", (("month", ASCENDING), ("year", ASCENDING), ("_id", DESCENDING))),
+    IndexSpec(
+        "commissions",
+        (("employee_id", ASCENDING), ("month", ASCENDING), ("year", ASCENDING), ("_id", DESCENDING)),
+    ),
+]
+
+
+QUERY_SHAPES: List[QueryShape] = [
+    # server.py
+    QueryShape("get_current_user", "users", ("id",)),
+    QueryShape("POST /api/auth/login", "users", ("username",)),
+    QueryShape("POST /api/auth/register", "users", ("username",)),
+    QueryShape("roster (driver/helper)", "users", ("role",)),
+    QueryShape("GET /api/user/dashboard", "deliveries", ("user_id",)),
+    QueryShape("GET /api/admin/users", "deliveries", ("employee_id",)),
+    QueryShape("GET /api/employees/{employee_id}", "deliveries", ("employee_id",)),
+    QueryShape("GET /api/employees/{employee_id}/occurrences", "occurrences", ("employee_id",), ("created_at", "_id")),
+    QueryShape(
+        "GET /api/employees/{employee_id}/occurrences (mês)",
+        "occurrences",
+        ("employee_id", "period"),
+        ("created_at", "_id"),
+    ),
+    QueryShape("occurrence count map (period)", "occurrences", ("employee_id", "period")),
+    QueryShape("occurrence count map (sem backfill)", "occurrences", ("employee_id",), ("created_at",)),
+    QueryShape("monthly_rollups (funcionário)", "monthly_rollups", ("employee_id",)),
+    QueryShape("monthly_rollups (mês)", "monthly_rollups", ("period", "employee_id")),
+    QueryShape("GET /api/reports/monthly-commission", "report_snapshots", ("report_type", "period")),
+    QueryShape("GET /api/notifications/me", "notifications", ("employee_id",), ("timestamp",)),
+    # commission_routes.py
+    QueryShape("GET /api/commission/occurrences", "occurrences", ("month", "year"), ("_id",)),
+    QueryShape(
+        "GET /api/commission/occurrences/employee/{employee_id}",
+        "occurrences",
+        ("employee_id", "month", "year"),
+        ("_id",),
+    ),
+    QueryShape("POST /api/commission/calculate", "occurrences", ("month", "year")),
+    QueryShape("POST /api/commission/calculate/batch", "occurrences", ("month", "year")),
+    QueryShape("GET /api/commission/statistics", "occurrences", ("month", "year")),
+    QueryShape("GET /api/commission/statistics", "commissions", ("month", "year")),
+    QueryShape("GET /api/commission/statistics", "monthly_rollups", ("period",)),
+    QueryShape("GET /api/commission/statistics (role)", "users", ("id",)),
+    QueryShape("GET /api/commission/commissions", "commissions", (), ("_id",)),
+    QueryShape("GET /api/commission/commissions", "commissions", ("month", "year"), ("_id",)),
+    QueryShape("GET /api/commission/commissions/employee/{employee_id}", "commissions", ("employee_id",), ("_id",)),
+    QueryShape(
+        "GET /api/commission/commissions/employee/{employee_id}",
+        "commissions",
+        ("employee_id", "month", "year"),
+        ("_id",),
+    ),
+    # month_close.py
+    QueryShape("POST /api/admin/month-close", "month_closes", ("period",)),
+    QueryShape("POST /api/admin/month-close (upsert)", "commissions", ("employee_id", "month", "year")),
+    # notification_outbox.py
+    QueryShape("OutboxDispatcher (claim)", "notification_outbox", ("status",), ("next_attempt_at",)),
+    QueryShape("OutboxDispatcher (update)", "notification_outbox", ("id",)),
+    QueryShape("OutboxDispatcher (claimed)", "notification_outbox", ("claim_id",)),
+    # push_notifications.py
+    QueryShape("create_in_app_notification", "notifications", ("id",)),
+    QueryShape("register_device_token", "device_tokens", ("token",)),
+    QueryShape("send_push_to_employee", "device_tokens", ("employee_id", "is_active")),
+]
+
+
+def index_supports(index_keys: Sequence[str], shape: QueryShape) -> bool:
+    """Um índice atende a consulta quando os campos de igualdade formam seu
+    prefixo (em qualquer ordem) e os de intervalo/ordenação vêm logo depois."""
+    equality_count = len(shape.equality)
+    if len(index_keys) < equality_count + len(shape.sort_or_range):
+        return False
+    if set(index_keys[:equality_count]) != set(shape.equality):
+        return False
+    next_keys = index_keys[equality_count:equality_count + len(shape.sort_or_range)]
+    return tuple(next_keys) == shape.sort_or_range
+
+
+async def create_indexes(db: AsyncIOMotorDatabase) -> None:
+    """Cria os índices declarados; create_index é idempotente para a mesma especificação."""
+    for spec in INDEXES:
+        try:
+            await db[spec.collection].create_index(list(spec.keys), name=spec.name, unique=spec.unique)
+        except OperationFailure as exc:
+            # Ex.: dados duplicados impedem um índice único; o servidor continua subindo
+            logger.error("Falha ao criar índice %s.%s: %s", spec.collection, spec.name, exc)
+
+
+async def find_unsupported_query_shapes(db: AsyncIOMotorDatabase) -> List[QueryShape]:
+    """Consulta os índices existentes e retorna os formatos de consulta sem índice."""
+    existing: Dict[str, List[List[str]]] = {}
+    for collection in {shape.collection for shape in QUERY_SHAPES}:
+        info = await db[collection].index_information()
+        existing[collection] = [[field for field, _ in index["key"]] for index in info.values()]
+
+    return [
+        shape
+        for shape in QUERY_SHAPES
+        if not any(index_supports(keys, shape) for keys in existing.get(shape.collection, []))
+    ]
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> None:
+    await create_indexes(db)
+    for shape in await find_unsupported_query_shapes(db):
+        fields = ", ".join(shape.equality + shape.sort_or_range) or "(nenhum filtro)"
+        logger.warning(
+            "⚠️ Consulta sem índice: %s em %s (%s)",
+            shape.route,
+            shape.collection,
+            fields,
+        )
+    logger.info("Índices verificados: %d declarados, %d formatos de consulta", len(INDEXES), len(QUERY_SHAPES))
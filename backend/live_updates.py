@@ -0,0 +1,227 @@
+"""
+Atualizações ao vivo do painel do admin via Server-Sent Events
+As rotas de escrita publicam, depois de gravar, o incremento dos totais de cada
+funcionário afetado; o painel carrega /api/admin/users uma vez e aplica os
+incrementos recebidos em GET /api/admin/live, sem recalcular a lista inteira
+
+Eventos:
+    delivery    {"employees": [delta, ...]} — entregas (uma ou um lote)
+    occurrence  {"employees": [delta, ...]} — ocorrências; o painel recarrega a lista,
+                porque o percentual depende do tier da equipe inteira
+    commission  comissão lançada em /api/commission/post
+    ready       data e mês do servidor, enviado a cada conexão
+    reset       eventos perdidos (reconexão antiga ou assinante lento): recarregar a lista
+
+/api/admin/users devolve no header X-Live-Event-Id o último evento já refletido
+na lista; o painel conecta com ?last_event_id=<id> e recebe só o que veio depois.
+A gravação + publicação de cada escrita e a leitura dos totais da lista acontecem
+sob `snapshot_lock`: uma escrita ou já está na lista ou tem id posterior ao do
+header, nunca as duas coisas (o que faria o painel somá-la duas vezes)
+
+Os assinantes ficam na memória do processo, o que vale para o deploy atual com
+um único worker do uvicorn (main.py). Com vários workers cada um só veria as
+próprias escritas e seria preciso um canal compartilhado (ex.: change streams)
+"""
+
+import asyncio
+import json
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from periods import get_period_key, split_period_key
+from rollups import add_to_rollups
+
+
+DELIVERY_EVENT = "delivery"
+OCCURRENCE_EVENT = "occurrence"
+COMMISSION_EVENT = "commission"
+READY_EVENT = "ready"
+RESET_EVENT = "reset"
+
+# Header de /api/admin/users com o id do último evento antes da leitura dos totais
+LIVE_EVENT_ID_HEADER = "X-Live-Event-Id"
+
+# Eventos pendentes por assinante; quem passar disso é desconectado e reconecta
+QUEUE_SIZE = 256
+# Eventos guardados para retomar uma conexão pelo Last-Event-ID
+HISTORY_SIZE = 1000
+# Comentário periódico para proxies não fecharem a conexão ociosa
+HEARTBEAT_SECONDS = 15.0
+# Espera do EventSource antes de reconectar (ms)
+RETRY_MILLISECONDS = 3000
+
+
+def format_event(event: str, data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _round_delta(delta: Dict[str, Any]) -> Dict[str, Any]:
+    delta["delivered_value"] = round(delta["delivered_value"], 2)
+    delta["today_delivered_value"] = round(delta["today_delivered_value"], 2)
+    for truck in delta["by_truck"].values():
+        truck["total_value"] = round(truck["total_value"], 2)
+    return delta
+
+
+def build_employee_deltas(
+    docs: Iterable[Dict[str, Any]],
+    is_delivery: bool,
+    today_iso: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Incremento por funcionário e mês das entregas/ocorrências recém-gravadas.
+
+    Mesmos campos de /api/admin/users: valor e entregas (também por caminhão),
+    ocorrências e valor entregue hoje.
+    """
+    if today_iso is None:
+        today_iso = datetime.now(timezone.utc).date().isoformat()
+
+    docs = list(docs)
+    rollups: Dict[Tuple[str, int, str], Dict[str, Any]] = {}
+    today_values: Dict[str, float] = {}
+    for doc in docs:
+        add_to_rollups(rollups, doc, is_delivery)
+        if is_delivery and str(doc.get("created_at", ""))[:10] == today_iso:
+            today_values[doc["employee_id"]] = today_values.get(doc["employee_id"], 0.0) + float(doc.get("value", 0))
+
+    deltas: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    for (employee_id, period, truck_type), values in rollups.items():
+        month, year = split_period_key(period)
+        delta = deltas.get((employee_id, period))
+        if delta is None:
+            delta = deltas[(employee_id, period)] = {
+                "employee_id": employee_id,
+                "month": month,
+                "year": year,
+                "date": today_iso,
+                "delivered_value": 0.0,
+                "delivery_count": 0,
+                "occurrence_count": 0,
+                "today_delivered_value": 0.0,
+                "by_truck": {},
+            }
+        delta["delivered_value"] += values["delivered_value"]
+        delta["delivery_count"] += values["delivery_count"]
+        delta["occurrence_count"] += values["occurrence_count"]
+        if truck_type and values["delivery_count"]:
+            truck = delta["by_truck"].setdefault(truck_type, {"count": 0, "total_value": 0.0})
+            truck["count"] += values["delivery_count"]
+            truck["total_value"] += values["delivered_value"]
+
+    # O valor de hoje vai só no delta do mês corrente de cada funcionário
+    today_period = get_period_key(int(today_iso[5:7]), int(today_iso[:4]))
+    for (employee_id, period), delta in deltas.items():
+        if period == today_period:
+            delta["today_delivered_value"] = today_values.get(employee_id, 0.0)
+
+    return [_round_delta(delta) for delta in deltas.values()]
+
+
+class _Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+
+class DashboardBroadcaster:
+    """Distribui os eventos do painel para as conexões SSE abertas.
+
+    `publish` é síncrono e não espera ninguém: um assinante com a fila cheia é
+    descartado e o EventSource reconecta retomando pelo Last-Event-ID.
+
+    `snapshot_lock` serializa as escritas que publicam incrementos com a leitura
+    de /api/admin/users, para que `last_event_id` e os totais lidos concordem.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = QUEUE_SIZE,
+        history_size: int = HISTORY_SIZE,
+        heartbeat_seconds: float = HEARTBEAT_SECONDS,
+    ):
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        # Ids "<processo>-<sequência>": um id de outro processo (restart) não é retomável
+        self._boot = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._history: Deque[Tuple[int, str]] = deque(maxlen=history_size)
+        self._subscribers: Set[_Subscriber] = set()
+        self.snapshot_lock = asyncio.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def last_event_id(self) -> str:
+        """Id do último evento publicado; retomar dele entrega só o que vier depois."""
+        return f"{self._boot}-{self._sequence}"
+
+    def publish(self, event: str, data: Dict[str, Any]) -> str:
+        self._sequence += 1
+        event_id = f"{self._boot}-{self._sequence}"
+        message = format_event(event, data, event_id)
+        self._history.append((self._sequence, message))
+
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self._subscribers.discard(subscriber)
+        return event_id
+
+    def publish_deltas(self, event: str, deltas: List[Dict[str, Any]]) -> Optional[str]:
+        if not deltas:
+            return None
+        return self.publish(event, {"employees": deltas})
+
+    def _missed_since(self, last_event_id: str) -> Optional[List[str]]:
+        """Eventos depois de `last_event_id`, ou None quando não dá para retomar."""
+        boot, _, sequence = last_event_id.partition("-")
+        if boot != self._boot or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        if sequence > self._sequence:
+            return None
+        oldest = self._history[0][0] if self._history else self._sequence + 1
+        if sequence < oldest - 1:
+            return None
+        return [message for event_sequence, message in self._history if event_sequence > sequence]
+
+    async def stream(self, last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+        """Corpo de um StreamingResponse text/event-stream."""
+        # Inscreve e lê o histórico sem await no meio: nenhum evento fica de fora nem repete
+        subscriber = _Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        missed = self._missed_since(last_event_id) if last_event_id else []
+        now = datetime.now(timezone.utc)
+
+        try:
+            yield f"retry: {RETRY_MILLISECONDS}\n\n"
+            yield format_event(READY_EVENT, {"date": now.date().isoformat(), "month": now.month, "year": now.year})
+            if missed is None:
+                yield format_event(RESET_EVENT, {})
+            else:
+                for message in missed:
+                    yield message
+
+            while not (subscriber.overflowed and subscriber.queue.empty()):
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield message
+        finally:
+            self._subscribers.discard(subscriber)
+
+
+dashboard_events = DashboardBroadcaster()
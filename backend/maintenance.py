@@ -0,0 +1,159 @@
+"""
+Comandos de manutenção do banco
+
+Uso:
+    python maintenance.py backfill-periods [--batch-size 1000] [--collections deliveries occurrences] [--restart]
+    python maintenance.py rebuild-rollups [--batch-size 1000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from periods import get_document_period, get_period_key, parse_iso_datetime
+from rollups import rebuild_rollups
+
+
+logger = logging.getLogger("maintenance")
+
+BACKFILL_COLLECTIONS = ["deliveries", "occurrences"]
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    env_file = Path(__file__).parent / ".env"
+    if env_file.exists():
+        load_dotenv(env_file)
+
+    mongo_url = os.environ.get("MONGO_URL") or os.environ.get("MONGODB_URI")
+    if not mongo_url:
+        raise ValueError("MONGO_URL ou MONGODB_URI não configurada!")
+
+    client = AsyncIOMotorClient(mongo_url)
+    return client[os.environ.get("DB_NAME", "commission_tracker")]
+
+
+def _build_period_update(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Campos `created_at_dt`/`period` derivados de `created_at` (ou de month/year)."""
+    created_at = doc.get("created_at")
+    if isinstance(created_at, datetime):
+        created_at_dt = created_at
+    else:
+        created_at_dt = parse_iso_datetime(str(created_at or ""))
+
+    fields: Dict[str, Any] = {}
+    if created_at_dt:
+        if created_at_dt.tzinfo is None:
+            created_at_dt = created_at_dt.replace(tzinfo=timezone.utc)
+        fields["created_at_dt"] = created_at_dt
+
+    period = get_document_period(doc)
+    if period is None and doc.get("month") and doc.get("year"):
+        period = get_period_key(int(doc["month"]), int(doc["year"]))
+    if period is not None:
+        fields["period"] = period
+
+    return fields or None
+
+
+async def backfill_periods(
+    db: AsyncIOMotorDatabase,
+    collections: List[str],
+    batch_size: int = 1000,
+    restart: bool = False,
+) -> Dict[str, int]:
+    """Preenche `created_at_dt` e `period` em lotes, ordenados por _id.
+
+    O último _id processado de cada coleção fica em `maintenance_checkpoints`,
+    então o comando pode ser interrompido e executado de novo a partir dali.
+    """
+    updated_by_collection: Dict[str, int] = {}
+
+    for collection_name in collections:
+        checkpoint_id = f"backfill_periods:{collection_name}"
+        if restart:
+            await db.maintenance_checkpoints.delete_one({"_id": checkpoint_id})
+
+        checkpoint = await db.maintenance_checkpoints.find_one({"_id": checkpoint_id}) or {}
+        last_id = checkpoint.get("last_id")
+        updated = checkpoint.get("updated", 0)
+        collection = db[collection_name]
+
+        while True:
+            query: Dict[str, Any] = {"period": {"$exists": False}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+
+            batch = await collection.find(
+                query,
+                {"_id": 1, "created_at": 1, "period": 1, "month": 1, "year": 1},
+            ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+
+            operations = []
+            for doc in batch:
+                fields = _build_period_update(doc)
+                if fields:
+                    operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+
+            if operations:
+                result = await collection.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+
+            last_id = batch[-1]["_id"]
+            await db.maintenance_checkpoints.update_one(
+                {"_id": checkpoint_id},
+                {
+                    "$set": {
+                        "last_id": last_id,
+                        "updated": updated,
+                        "updated_at": datetime.now(timezone.utc).isoformat(),
+                    }
+                },
+                upsert=True,
+            )
+            logger.info("%s: %d documentos atualizados (último _id %s)", collection_name, updated, last_id)
+
+        await db.maintenance_checkpoints.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"completed_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True,
+        )
+        updated_by_collection[collection_name] = updated
+
+    return updated_by_collection
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Comandos de manutenção do banco")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backfill = subparsers.add_parser("backfill-periods", help="preenche created_at_dt/period em documentos antigos")
+    backfill.add_argument("--batch-size", type=int, default=1000)
+    backfill.add_argument("--collections", nargs="+", choices=BACKFILL_COLLECTIONS, default=BACKFILL_COLLECTIONS)
+    backfill.add_argument("--restart", action="store_true", help="ignora o checkpoint e recomeça do início")
+
+    rebuild = subparsers.add_parser("rebuild-rollups", help="regenera monthly_rollups a partir das entregas e ocorrências")
+    rebuild.add_argument("--batch-size", type=int, default=1000)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    db = get_database()
+    if args.command == "backfill-periods":
+        result = asyncio.run(backfill_periods(db, args.collections, args.batch_size, args.restart))
+        logger.info("Backfill concluído: %s", result)
+    elif args.command == "rebuild-rollups":
+        asyncio.run(rebuild_rollups(db, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
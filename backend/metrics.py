@@ -0,0 +1,333 @@
+"""
+Métricas de latência por rota e de operações no MongoDB, no formato do Prometheus
+O middleware mede cada requisição pelo template da rota (ex.: /api/users/{user_id})
+e o listener de comandos do PyMongo conta operações, documentos retornados e
+tempo por coleção, inclusive quantos comandos cada requisição disparou
+"""
+
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMANDS_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Requisições sem rota (404) ficam todas sob o mesmo rótulo, para não explodir as séries
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Comandos de conexão e monitoramento não dizem nada sobre as consultas das rotas
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildInfo", "buildinfo",
+    "saslStart", "saslContinue", "authenticate", "getnonce", "endSessions",
+}
+
+# Comandos cujo valor é o nome da coleção (ex.: {"find": "users", ...})
+COLLECTION_COMMANDS = {
+    "find", "aggregate", "count", "distinct", "insert", "update", "delete",
+    "findAndModify", "findandmodify", "createIndexes", "listIndexes", "drop",
+}
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: LabelValues = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, labels: LabelValues = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Por série: contagem por bucket (não cumulativa), soma e total
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: LabelValues = ()) -> None:
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = ([0] * len(self.buckets), [0.0, 0.0])
+            counts, totals = series
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            totals[0] += value
+            totals[1] += 1
+
+    def get_count(self, labels: LabelValues = ()) -> int:
+        series = self._values.get(labels)
+        return int(series[1][1]) if series else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(counts), list(totals))) for labels, (counts, totals) in self._values.items())
+        for labels, (counts, (total, count)) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {_format_number(count)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def clear(self) -> None:
+        for metric in self.metrics:
+            metric.clear()
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "Requisições HTTP atendidas", ("method", "route", "status"),
+))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP", ("method", "route"),
+))
+http_request_mongo_commands = registry.register(Histogram(
+    "http_request_mongo_commands", "Comandos ao MongoDB por requisição", ("method", "route"),
+    buckets=COMMANDS_PER_REQUEST_BUCKETS,
+))
+mongodb_commands_total = registry.register(Counter(
+    "mongodb_commands_total", "Comandos enviados ao MongoDB", ("collection", "command"),
+))
+mongodb_command_failures_total = registry.register(Counter(
+    "mongodb_command_failures_total", "Comandos ao MongoDB que falharam", ("collection", "command"),
+))
+mongodb_command_duration_seconds = registry.register(Histogram(
+    "mongodb_command_duration_seconds", "Tempo dos comandos no MongoDB", ("collection", "command"),
+))
+mongodb_documents_returned_total = registry.register(Counter(
+    "mongodb_documents_returned_total", "Documentos retornados por find/aggregate/getMore", ("collection", "command"),
+))
+
+
+class RequestStats:
+    """Comandos ao MongoDB disparados por uma requisição."""
+
+    def __init__(self):
+        self.commands = 0
+        self.documents_returned = 0
+        self.by_command: Dict[Tuple[str, str], int] = {}
+        # Mesma consulta (coleção, comando e campos do filtro) repetida: suspeita de N+1
+        self.by_shape: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, collection: str, command: str, documents: int, shape: str = "") -> None:
+        with self._lock:
+            self.commands += 1
+            self.documents_returned += documents
+            key = (collection, command)
+            self.by_command[key] = self.by_command.get(key, 0) + 1
+            if shape:
+                self.by_shape[shape] = self.by_shape.get(shape, 0) + 1
+
+
+# O Motor copia o contexto para a thread que executa o comando, então o
+# listener enxerga o RequestStats da requisição que disparou a consulta
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+def _command_collection(command_name: str, command: Dict[str, Any]) -> str:
+    if command_name == "getMore":
+        return str(command.get("collection", ""))
+    if command_name in COLLECTION_COMMANDS:
+        value = command.get(command_name)
+        if isinstance(value, str):
+            return value
+    return ""
+
+
+def _filter_fields(command_name: str, command: Dict[str, Any]) -> List[str]:
+    if command_name in ("find", "count", "distinct", "findAndModify", "findandmodify"):
+        query = command.get("filter", command.get("query"))
+    elif command_name == "aggregate":
+        pipeline = command.get("pipeline") or [{}]
+        query = pipeline[0].get("$match")
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or [{}]
+        query = statements[0].get("q")
+    else:
+        query = None
+    return sorted(query) if isinstance(query, dict) else []
+
+
+def command_shape(command_name: str, collection: str, command: Dict[str, Any]) -> str:
+    """Forma da consulta sem os valores, ex.: "users.find{id}".
+
+    getMore e insert não entram: continuar um cursor ou inserir em lotes não é N+1.
+    """
+    if command_name in ("getMore", "insert"):
+        return ""
+    return f"{collection}.{command_name}{{{','.join(_filter_fields(command_name, command))}}}"
+
+
+def _documents_returned(command_name: str, reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if command_name in ("findAndModify", "findandmodify"):
+        return 1 if reply.get("value") is not None else 0
+    return 0
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Listener do PyMongo: conta comandos, documentos e tempo por coleção."""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[Any, int], Tuple[str, str, Optional[RequestStats]]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = _command_collection(event.command_name, event.command)
+        stats = current_request_stats.get()
+        shape = command_shape(event.command_name, collection, event.command) if stats is not None else ""
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, shape, stats)
+
+    def _finish(self, event, reply: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+
+        collection, shape, stats = pending
+        labels = (collection, event.command_name)
+        documents = _documents_returned(event.command_name, reply) if reply is not None else 0
+        mongodb_commands_total.inc(labels)
+        mongodb_command_duration_seconds.observe(event.duration_micros / 1_000_000, labels)
+        if documents:
+            mongodb_documents_returned_total.inc(labels, documents)
+        if reply is None:
+            mongodb_command_failures_total.inc(labels)
+        if stats is not None:
+            stats.record(collection, event.command_name, documents, shape)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, event.reply)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, None)
+
+
+mongo_command_metrics = MongoCommandMetrics()
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latência, status e comandos ao MongoDB por rota."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request_stats.reset(token)
+            # O roteador grava a rota encontrada no próprio scope
+            route = route_template(scope)
+            method = scope.get("method", "")
+            http_requests_total.inc((method, route, str(status_code)))
+            http_request_duration_seconds.observe(elapsed, (method, route))
+            http_request_mongo_commands.observe(stats.commands, (method, route))
+
+
+def render_metrics() -> str:
+    return registry.render()
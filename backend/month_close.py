@@ -0,0 +1,201 @@
+"""
+Fechamento do mês: lança a comissão final de toda a equipe de uma vez
+Um documento em `month_closes` por período garante que o fechamento rode uma
+única vez e guarda o progresso; as comissões e as notificações são gravadas em
+lote, na mesma transação quando o MongoDB suporta (replica set ou mongos)
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from notification_outbox import build_commission_notification, enqueue_notifications
+from periods import get_period_key
+
+
+logger = logging.getLogger(__name__)
+
+MONTH_CLOSES_COLLECTION = "month_closes"
+MONTH_CLOSE_SOURCE = "month_close"
+
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Um fechamento em "running" há mais tempo que isso é considerado interrompido
+STALE_AFTER_SECONDS = 900
+
+
+async def get_month_close(db: AsyncIOMotorDatabase, month: int, year: int) -> Optional[Dict[str, Any]]:
+    return await db[MONTH_CLOSES_COLLECTION].find_one({"period": get_period_key(month, year)}, {"_id": 0})
+
+
+async def claim_month_close(
+    db: AsyncIOMotorDatabase,
+    month: int,
+    year: int,
+    closed_by: str,
+) -> Tuple[Dict[str, Any], bool]:
+    """Reserva o fechamento do período; retorna (documento, reservado_agora).
+
+    Só um pedido reserva: os demais recebem o fechamento em andamento ou já
+    concluído. Fechamentos que falharam ou ficaram presos podem ser refeitos.
+    """
+    collection = db[MONTH_CLOSES_COLLECTION]
+    period = get_period_key(month, year)
+    now = datetime.now(timezone.utc)
+    job = {
+        "period": period,
+        "month": month,
+        "year": year,
+        "status": RUNNING,
+        "closed_by": closed_by,
+        "started_at": now,
+        "total": 0,
+        "written": 0,
+        "inserted": 0,
+        "skipped": 0,
+        "notifications_queued": 0,
+        "error": None,
+        "finished_at": None,
+    }
+
+    try:
+        await collection.insert_one(dict(job))
+        return job, True
+    except DuplicateKeyError:
+        pass
+
+    retryable = {
+        "period": period,
+        "$or": [
+            {"status": FAILED},
+            {"status": RUNNING, "started_at": {"$lt": now - timedelta(seconds=STALE_AFTER_SECONDS)}},
+        ],
+    }
+    result = await collection.update_one(retryable, {"$set": job})
+    if result.modified_count:
+        return job, True
+    return await get_month_close(db, month, year), False
+
+
+async def _update_progress(db: AsyncIOMotorDatabase, period: int, fields: Dict[str, Any]) -> None:
+    await db[MONTH_CLOSES_COLLECTION].update_one({"period": period}, {"$set": fields})
+
+
+async def supports_transactions(client: AsyncIOMotorClient) -> bool:
+    """Transações exigem replica set ou mongos; um servidor standalone não tem."""
+    try:
+        hello = await client.admin.command("hello")
+    except Exception:
+        return False
+    return bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+
+
+def build_commission_upsert(commission: Dict[str, Any]) -> UpdateOne:
+    """Upsert pela chave (funcionário, mês, ano, origem): refazer o fechamento não duplica."""
+    key = {
+        "employee_id": commission["employee_id"],
+        "month": commission["month"],
+        "year": commission["year"],
+        "source": MONTH_CLOSE_SOURCE,
+    }
+    return UpdateOne(key, {"$setOnInsert": {**commission, "source": MONTH_CLOSE_SOURCE}}, upsert=True)
+
+
+async def _write_commissions(
+    db: AsyncIOMotorDatabase,
+    period: int,
+    commissions: List[Dict[str, Any]],
+    batch_size: int,
+    session=None,
+) -> List[Dict[str, Any]]:
+    """Grava as comissões em lotes e retorna as que foram inseridas agora."""
+    inserted: List[Dict[str, Any]] = []
+    for start in range(0, len(commissions), batch_size):
+        batch = commissions[start:start + batch_size]
+        result = await db.commissions.bulk_write(
+            [build_commission_upsert(commission) for commission in batch],
+            ordered=False,
+            session=session,
+        )
+        inserted.extend(batch[index] for index in sorted(result.upserted_ids))
+        await _update_progress(db, period, {"written": start + len(batch)})
+    return inserted
+
+
+async def _post(
+    db: AsyncIOMotorDatabase,
+    period: int,
+    commissions: List[Dict[str, Any]],
+    batch_size: int,
+    session=None,
+) -> Tuple[int, int]:
+    inserted = await _write_commissions(db, period, commissions, batch_size, session)
+    notification_ids = await enqueue_notifications(
+        db,
+        [
+            build_commission_notification(
+                employee_id=commission["employee_id"],
+                employee_name=commission["employee_name"],
+                amount=commission["commission_amount"],
+                percentage=commission["percentage"],
+            )
+            for commission in inserted
+        ],
+        session=session,
+    )
+    return len(inserted), len(notification_ids)
+
+
+async def post_month_commissions(
+    client: AsyncIOMotorClient,
+    db: AsyncIOMotorDatabase,
+    month: int,
+    year: int,
+    commissions: List[Dict[str, Any]],
+    skipped: int = 0,
+    batch_size: int = 500,
+) -> Dict[str, Any]:
+    """Grava as comissões do fechamento e enfileira as notificações.
+
+    Com transação, comissões e outbox são confirmados juntos ou nada é gravado.
+    Sem transação (MongoDB standalone), os upserts por chave tornam seguro
+    rodar de novo após uma falha: só as comissões que faltaram são inseridas
+    e notificadas.
+    """
+    period = get_period_key(month, year)
+    await _update_progress(db, period, {"total": len(commissions), "skipped": skipped})
+
+    if await supports_transactions(client):
+        # with_transaction repete a transação em erros transitórios
+        async with await client.start_session() as session:
+            inserted, queued = await session.with_transaction(
+                lambda session: _post(db, period, commissions, batch_size, session)
+            )
+    else:
+        logger.warning("MongoDB sem suporte a transações; fechamento %s gravado sem transação", period)
+        inserted, queued = await _post(db, period, commissions, batch_size)
+
+    fields = {
+        "status": COMPLETED,
+        "written": len(commissions),
+        "inserted": inserted,
+        "notifications_queued": queued,
+        "finished_at": datetime.now(timezone.utc),
+    }
+    await _update_progress(db, period, fields)
+    logger.info("Fechamento %s concluído: %d comissões novas, %d notificações", period, inserted, queued)
+    return fields
+
+
+async def fail_month_close(db: AsyncIOMotorDatabase, month: int, year: int, error: Exception) -> None:
+    await _update_progress(
+        db,
+        get_period_key(month, year),
+        {"status": FAILED, "error": str(error), "finished_at": datetime.now(timezone.utc)},
+    )
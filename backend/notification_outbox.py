@@ -0,0 +1,276 @@
+"""
+Outbox de notificações
+As rotas de escrita só gravam a notificação em `notification_outbox`; um worker
+em segundo plano envia em lotes, com novas tentativas e backoff, e registra o resultado
+
+O envio tem dois passos: a notificação in-app é gravada uma vez (upsert pelo id
+do outbox) e só o push é repetido, apenas para os aparelhos que ainda não receberam
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from push_notifications import create_commission_in_app_notification, send_commission_push
+
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "notification_outbox"
+COMMISSION_UPDATE = "commission_update"
+
+# Acordado a cada enfileiramento, para o worker não esperar o próximo ciclo
+_new_work = asyncio.Event()
+
+
+def build_commission_notification(
+    employee_id: str,
+    employee_name: str,
+    amount: float,
+    percentage: Optional[float] = None,
+    truck_type: Optional[str] = None,
+) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": str(uuid.uuid4()),
+        "kind": COMMISSION_UPDATE,
+        "payload": {
+            "employee_id": employee_id,
+            "employee_name": employee_name,
+            "amount": amount,
+            "percentage": percentage,
+            "truck_type": truck_type,
+        },
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now.isoformat(),
+    }
+
+
+async def enqueue_notifications(
+    db: AsyncIOMotorDatabase,
+    notifications: List[Dict[str, Any]],
+    session=None,
+) -> List[str]:
+    """Grava as notificações no outbox com um único insert_many.
+
+    Com `session`, a gravação faz parte da transação de quem chamou.
+    """
+    if not notifications:
+        return []
+    await db[OUTBOX_COLLECTION].insert_many(notifications, session=session)
+    _new_work.set()
+    return [notification["id"] for notification in notifications]
+
+
+async def enqueue_commission_notification(
+    db: AsyncIOMotorDatabase,
+    employee_id: str,
+    employee_name: str,
+    amount: float,
+    percentage: Optional[float] = None,
+    truck_type: Optional[str] = None,
+) -> str:
+    notification = build_commission_notification(employee_id, employee_name, amount, percentage, truck_type)
+    ids = await enqueue_notifications(db, [notification])
+    return ids[0]
+
+
+class PushDeliveryIncomplete(Exception):
+    """Algum aparelho não recebeu o push; a notificação volta para nova tentativa."""
+
+
+def _check_kind(kind: str) -> None:
+    if kind != COMMISSION_UPDATE:
+        raise ValueError(f"Tipo de notificação desconhecido: {kind}")
+
+
+class PushNotificationSender:
+    """Envio real: notificação in-app + push FCM (push_notifications.py)."""
+
+    async def store_in_app(self, db: AsyncIOMotorDatabase, notification_id: str, kind: str, payload: Dict[str, Any]) -> None:
+        _check_kind(kind)
+        await create_commission_in_app_notification(db=db, notification_id=notification_id, **payload)
+
+    async def push(
+        self,
+        db: AsyncIOMotorDatabase,
+        kind: str,
+        payload: Dict[str, Any],
+        skip_tokens: List[str],
+    ) -> Dict[str, Any]:
+        _check_kind(kind)
+        return await send_commission_push(
+            db=db,
+            employee_id=payload["employee_id"],
+            amount=payload["amount"],
+            percentage=payload.get("percentage"),
+            truck_type=payload.get("truck_type"),
+            skip_tokens=skip_tokens,
+        )
+
+
+class StubNotificationSender:
+    """Envio local para testes e desenvolvimento offline: só registra as notificações."""
+
+    def __init__(self, fail_times: int = 0):
+        self.in_app: Dict[str, Dict[str, Any]] = {}
+        self.sent: List[Dict[str, Any]] = []
+        self.fail_times = fail_times
+
+    async def store_in_app(self, db: AsyncIOMotorDatabase, notification_id: str, kind: str, payload: Dict[str, Any]) -> None:
+        self.in_app.setdefault(notification_id, {"kind": kind, **payload})
+
+    async def push(
+        self,
+        db: AsyncIOMotorDatabase,
+        kind: str,
+        payload: Dict[str, Any],
+        skip_tokens: List[str],
+    ) -> Dict[str, Any]:
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise RuntimeError("Falha simulada no envio")
+        self.sent.append({"kind": kind, **payload})
+        logger.info("[STUB] Notificação %s para %s", kind, payload.get("employee_name"))
+        return {"sent": 1, "failed": 0, "sent_tokens": []}
+
+
+def get_notification_sender():
+    if os.environ.get("NOTIFICATION_SENDER", "fcm").lower() == "stub":
+        return StubNotificationSender()
+    return PushNotificationSender()
+
+
+class OutboxDispatcher:
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        sender,
+        batch_size: int = 50,
+        poll_interval: float = 2.0,
+        max_attempts: int = 5,
+        base_backoff_seconds: float = 5.0,
+        claim_timeout_seconds: float = 300.0,
+    ):
+        self.db = db
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.claim_timeout_seconds = claim_timeout_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            _new_work.clear()
+            try:
+                processed = await self.dispatch_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error("Erro no worker do outbox: %s", exc)
+                processed = 0
+
+            if processed:
+                continue
+            try:
+                await asyncio.wait_for(_new_work.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim_batch(self) -> List[Dict[str, Any]]:
+        """Reserva um lote de notificações pendentes (ou presas em processing).
+
+        O update_many só reserva documentos que ainda atendem ao filtro, então
+        dois workers nunca pegam a mesma notificação.
+        """
+        collection = self.db[OUTBOX_COLLECTION]
+        now = datetime.now(timezone.utc)
+        claimable = {
+            "$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "processing", "claimed_at": {"$lt": now - timedelta(seconds=self.claim_timeout_seconds)}},
+            ]
+        }
+
+        candidates = await collection.find(claimable, {"_id": 0, "id": 1}).sort(
+            "next_attempt_at", 1
+        ).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return []
+
+        claim_id = str(uuid.uuid4())
+        await collection.update_many(
+            {"id": {"$in": [doc["id"] for doc in candidates]}, **claimable},
+            {"$set": {"status": "processing", "claimed_at": now, "claim_id": claim_id}, "$inc": {"attempts": 1}},
+        )
+        return await collection.find({"claim_id": claim_id}, {"_id": 0}).to_list(self.batch_size)
+
+    async def dispatch_batch(self) -> int:
+        """Envia um lote de notificações e retorna quantas foram processadas."""
+        claimed = await self._claim_batch()
+        if claimed:
+            await asyncio.gather(*(self._deliver(notification) for notification in claimed))
+        return len(claimed)
+
+    async def _deliver(self, notification: Dict[str, Any]) -> None:
+        collection = self.db[OUTBOX_COLLECTION]
+        now = datetime.now(timezone.utc)
+        kind, payload = notification["kind"], notification["payload"]
+        try:
+            # Passo 1, uma vez só: a notificação in-app
+            if not notification.get("in_app_at"):
+                await self.sender.store_in_app(self.db, notification["id"], kind, payload)
+                await collection.update_one({"id": notification["id"]}, {"$set": {"in_app_at": now.isoformat()}})
+
+            # Passo 2: push, pulando os aparelhos que já receberam em tentativas anteriores
+            result = await self.sender.push(self.db, kind, payload, notification.get("delivered_tokens") or [])
+            sent_tokens = result.pop("sent_tokens", None) or []
+            if sent_tokens:
+                await collection.update_one(
+                    {"id": notification["id"]},
+                    {"$addToSet": {"delivered_tokens": {"$each": sent_tokens}}},
+                )
+            if result.get("failed"):
+                raise PushDeliveryIncomplete(f"push falhou para {result['failed']} aparelho(s)")
+        except Exception as exc:
+            attempts = notification.get("attempts", 1)
+            if attempts >= self.max_attempts:
+                update = {"status": "failed", "last_error": str(exc), "failed_at": now.isoformat()}
+                logger.error("Notificação %s descartada após %d tentativas: %s", notification["id"], attempts, exc)
+            else:
+                backoff = self.base_backoff_seconds * (2 ** (attempts - 1))
+                update = {
+                    "status": "pending",
+                    "last_error": str(exc),
+                    "next_attempt_at": now + timedelta(seconds=backoff),
+                }
+                logger.warning("Notificação %s falhou (tentativa %d), nova tentativa em %.1fs", notification["id"], attempts, backoff)
+            await collection.update_one({"id": notification["id"]}, {"$set": update})
+            return
+
+        await collection.update_one(
+            {"id": notification["id"]},
+            {"$set": {"status": "sent", "result": result, "sent_at": now.isoformat()}, "$unset": {"last_error": ""}},
+        )
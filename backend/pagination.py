@@ -0,0 +1,93 @@
+"""
+Paginação por cursor (keyset) das listagens
+A próxima página continua a partir dos valores de ordenação do último documento,
+com um filtro atendido pelo índice, então páginas profundas custam o mesmo que a primeira
+"""
+
+import base64
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+SortSpec = Sequence[Tuple[str, int]]
+
+
+class InvalidCursor(ValueError):
+    """Token de continuação malformado ou de outra ordenação."""
+
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(doc: Dict[str, Any], sort: SortSpec) -> str:
+    """Token opaco com os valores de ordenação do documento (ObjectId e datas preservados)."""
+    values = [doc.get(field) for field, _ in sort]
+    raw = json_util.dumps({"s": [field for field, _ in sort], "v": values})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: SortSpec) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        fields, values = payload["s"], payload["v"]
+    except Exception:
+        # O token vem do cliente: base64/JSON inválidos e também valores estendidos
+        # forjados ({"$oid": "zz"}, {"$date": "x"}...) que o json_util rejeita
+        raise InvalidCursor("Malformed cursor")
+
+    if not isinstance(values, list) or fields != [field for field, _ in sort] or len(values) != len(sort):
+        raise InvalidCursor("Cursor does not match this listing")
+    return values
+
+
+def build_keyset_filter(sort: SortSpec, values: List[Any]) -> Dict[str, Any]:
+    """Documentos depois de `values` na ordem `sort`.
+
+    Para (a desc, _id desc): a < va OU (a == va E _id < vid).
+    """
+    branches = []
+    for position, (field, direction) in enumerate(sort):
+        branch = {prev_field: values[index] for index, (prev_field, _) in enumerate(sort[:position])}
+        branch[field] = {"$lt" if direction < 0 else "$gt": values[position]}
+        branches.append(branch)
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+
+async def find_page(
+    collection: AsyncIOMotorCollection,
+    query: Dict[str, Any],
+    sort: SortSpec,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Uma página de `collection` e o token da próxima (None na última página).
+
+    `sort` deve terminar em um campo único (normalmente _id) para não haver
+    empates entre páginas; o `_id` é removido dos documentos retornados.
+    """
+    page_size = clamp_page_size(limit)
+    if cursor:
+        query = {"$and": [query, build_keyset_filter(sort, decode_cursor(cursor, sort))]}
+
+    projection = dict(projection or {})
+    projection.pop("_id", None)
+    docs = await collection.find(query, projection or None).sort(list(sort)).limit(page_size + 1).to_list(page_size + 1)
+
+    next_cursor = None
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        next_cursor = encode_cursor(docs[-1], sort)
+
+    for doc in docs:
+        doc.pop("_id", None)
+    return docs, next_cursor
@@ -0,0 +1,89 @@
+"""
+Hash e verificação de senha (bcrypt) fora do event loop
+O bcrypt leva ~100-300 ms por chamada; rodando em um pool de threads dedicado
+e limitado, um pico de logins não trava as outras requisições
+"""
+
+import asyncio
+import math
+import os
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict
+
+from passlib.context import CryptContext
+
+
+class PasswordHasherBusy(Exception):
+    """Fila do pool de hash cheia; a requisição deve ser recusada (503)."""
+
+
+class PasswordHasher:
+    def __init__(self, context: CryptContext, max_workers: int = 4, queue_limit: int = 64):
+        self.context = context
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        # bcrypt libera o GIL, então threads bastam para usar vários núcleos
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._in_flight = 0
+        self._queue_waits: Deque[float] = deque(maxlen=1000)
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_wait = 0.0
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._in_flight >= self.max_workers + self.queue_limit:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+
+        self._in_flight += 1
+        submitted_at = time.perf_counter()
+
+        def job() -> Any:
+            queue_wait = time.perf_counter() - submitted_at
+            return queue_wait, fn(*args)
+
+        try:
+            queue_wait, result = await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self._in_flight -= 1
+
+        self.completed += 1
+        self._queue_waits.append(queue_wait)
+        self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, plain_password, hashed_password)
+
+    def stats(self) -> Dict[str, Any]:
+        waits_ms = sorted(wait * 1000 for wait in self._queue_waits)
+        return {
+            "max_workers": self.max_workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_ms": {
+                "samples": len(waits_ms),
+                "mean": round(statistics.fmean(waits_ms), 3) if waits_ms else 0.0,
+                "p95": round(waits_ms[max(0, math.ceil(len(waits_ms) * 0.95) - 1)], 3) if waits_ms else 0.0,
+                "max": round(self.max_queue_wait * 1000, 3),
+            },
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+def create_password_hasher(context: CryptContext) -> PasswordHasher:
+    return PasswordHasher(
+        context,
+        max_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", "4")),
+        queue_limit=int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", "64")),
+    )
@@ -0,0 +1,77 @@
+"""
+Campos de data e período (mês) gravados em entregas e ocorrências
+`created_at` continua em ISO; `created_at_dt` guarda o datetime BSON e `period`
+a chave compacta do mês (ex.: 202610), usada em consultas por intervalo com índice
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+
+def parse_iso_datetime(value: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def get_period_key(month: int, year: int) -> int:
+    """Chave compacta do mês: 2026/10 -> 202610."""
+    return year * 100 + month
+
+
+def split_period_key(period: int) -> Tuple[int, int]:
+    """202610 -> (10, 2026)."""
+    return period % 100, period // 100
+
+
+def get_period_bounds(month: int, year: int) -> Tuple[str, str]:
+    """Limites [início, fim) do mês para comparar com `created_at` em ISO."""
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year:04d}-{month:02d}", f"{next_year:04d}-{next_month:02d}"
+
+
+def get_day_bounds(day_iso: str) -> Tuple[str, str]:
+    """Limites [início, fim) do dia para comparar com `created_at` em ISO."""
+    next_day = date.fromisoformat(day_iso) + timedelta(days=1)
+    return day_iso, next_day.isoformat()
+
+
+def build_date_fields(moment: Optional[datetime] = None) -> Dict[str, Any]:
+    """Campos de data de um novo documento: ISO, datetime BSON e período."""
+    if moment is None:
+        moment = datetime.now(timezone.utc)
+    return {
+        "created_at": moment.isoformat(),
+        "created_at_dt": moment,
+        "period": get_period_key(moment.month, moment.year),
+    }
+
+
+def get_document_period(doc: Dict[str, Any]) -> Optional[int]:
+    """Período de um documento; usa `period` quando já gravado, senão `created_at`."""
+    period = doc.get("period")
+    if period:
+        return int(period)
+
+    created_at = doc.get("created_at")
+    if isinstance(created_at, datetime):
+        return get_period_key(created_at.month, created_at.year)
+    dt = parse_iso_datetime(str(created_at or ""))
+    if dt:
+        return get_period_key(dt.month, dt.year)
+    return None
+
+
+def build_period_match(month: int, year: int) -> Dict[str, Any]:
+    """Filtro do mês: `period` nos documentos novos ou já migrados, intervalo em
+    `created_at` nos que ainda não passaram pelo backfill. Os dois ramos usam índice."""
+    start, end = get_period_bounds(month, year)
+    return {
+        "$or": [
+            {"period": get_period_key(month, year)},
+            {"period": {"$exists": False}, "created_at": {"$gte": start, "$lt": end}},
+        ]
+    }
@@ -1,9 +1,11 @@
+import asyncio
 import json
 import logging
 import os
+import threading
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Collection, Dict, List, Optional, Tuple
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
@@ -38,21 +40,54 @@ def _load_firebase_credentials() -> Optional[Dict[str, Any]]:
     return None
 
 
-def _ensure_firebase_initialized() -> bool:
-    if firebase_admin is None or credentials is None:
-        logger.warning("firebase-admin não instalado; push notification desabilitado")
-        return False
+class FirebaseSender:
+    """Envio FCM com inicialização preguiçosa e única por processo.
 
-    creds = _load_firebase_credentials()
-    if not creds:
-        logger.warning("Credenciais Firebase não configuradas; push notification desabilitado")
-        return False
+    As credenciais são lidas e o app Firebase é inicializado só no primeiro
+    envio; a decisão de "push desabilitado" também fica memorizada. Use
+    reload() depois de trocar as credenciais.
+    """
 
-    if not firebase_admin._apps:
-        cert = credentials.Certificate(creds)
-        firebase_admin.initialize_app(cert)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._enabled: Optional[bool] = None
 
-    return True
+    def _initialize(self) -> bool:
+        if firebase_admin is None or credentials is None:
+            logger.warning("firebase-admin não instalado; push notification desabilitado")
+            return False
+
+        if firebase_admin._apps:
+            return True
+
+        creds = _load_firebase_credentials()
+        if not creds:
+            logger.warning("Credenciais Firebase não configuradas; push notification desabilitado")
+            return False
+
+        firebase_admin.initialize_app(credentials.Certificate(creds))
+        return True
+
+    def is_enabled(self) -> bool:
+        if self._enabled is None:
+            with self._lock:
+                if self._enabled is None:
+                    self._enabled = self._initialize()
+        return self._enabled
+
+    def reload(self) -> bool:
+        """Descarta o app atual e relê as credenciais."""
+        with self._lock:
+            if firebase_admin is not None and firebase_admin._apps:
+                firebase_admin.delete_app(firebase_admin.get_app())
+            self._enabled = self._initialize()
+        return self._enabled
+
+    def send_multicast(self, message):
+        return messaging.send_each_for_multicast(message)
+
+
+firebase_sender = FirebaseSender()
 
 
 async def register_device_token(
@@ -92,19 +127,30 @@ async def create_in_app_notification(
     message: str,
     notification_type: str,
     data: Optional[Dict[str, Any]] = None,
+    notification_id: Optional[str] = None,
 ) -> None:
-    await db.notifications.insert_one(
-        {
-            "id": str(uuid.uuid4()),
-            "employee_id": employee_id,
-            "employee_name": employee_name,
-            "type": notification_type,
-            "title": title,
-            "message": message,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "read": False,
-            "data": data or {},
-        }
+    """Grava a notificação in-app.
+
+    Com `notification_id` (id do outbox) a gravação é um upsert por id: uma
+    nova tentativa de envio não duplica a notificação.
+    """
+    notification = {
+        "employee_id": employee_id,
+        "employee_name": employee_name,
+        "type": notification_type,
+        "title": title,
+        "message": message,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "read": False,
+        "data": data or {},
+    }
+    if notification_id is None:
+        await db.notifications.insert_one({"id": str(uuid.uuid4()), **notification})
+        return
+    await db.notifications.update_one(
+        {"id": notification_id},
+        {"$setOnInsert": notification},
+        upsert=True,
     )
 
 
@@ -114,18 +160,25 @@ async def send_push_to_employee(
     title: str,
     body: str,
     data: Optional[Dict[str, Any]] = None,
-) -> Dict[str, int]:
+    skip_tokens: Optional[Collection[str]] = None,
+) -> Dict[str, Any]:
+    """Push para os aparelhos ativos do funcionário.
+
+    `skip_tokens` são aparelhos que já receberam esta notificação numa tentativa
+    anterior; `sent_tokens` no resultado lista os que receberam agora.
+    """
     token_docs = await db.device_tokens.find(
         {"employee_id": employee_id, "is_active": True},
         {"_id": 0, "token": 1},
     ).to_list(100)
 
-    tokens: List[str] = [doc["token"] for doc in token_docs if doc.get("token")]
+    skip = set(skip_tokens or ())
+    tokens: List[str] = [doc["token"] for doc in token_docs if doc.get("token") and doc["token"] not in skip]
     if not tokens:
-        return {"sent": 0, "failed": 0}
+        return {"sent": 0, "failed": 0, "sent_tokens": []}
 
-    if not _ensure_firebase_initialized():
-        return {"sent": 0, "failed": len(tokens)}
+    if not firebase_sender.is_enabled():
+        return {"sent": 0, "failed": len(tokens), "sent_tokens": []}
 
     normalized_data = {k: str(v) for k, v in (data or {}).items()}
 
@@ -135,11 +188,14 @@ async def send_push_to_employee(
         tokens=tokens,
     )
 
-    response = messaging.send_each_for_multicast(message)
+    # Chamada HTTP síncrona do SDK: roda em thread para não bloquear o event loop
+    response = await asyncio.to_thread(firebase_sender.send_multicast, message)
 
     invalid_tokens: List[str] = []
+    sent_tokens: List[str] = []
     for idx, send_response in enumerate(response.responses):
         if send_response.success:
+            sent_tokens.append(tokens[idx])
             continue
         exc = send_response.exception
         code = getattr(exc, "code", "") if exc else ""
@@ -159,17 +215,16 @@ async def send_push_to_employee(
     return {
         "sent": response.success_count,
         "failed": response.failure_count,
+        "sent_tokens": sent_tokens,
     }
 
 
-async def notify_commission_update(
-    db: AsyncIOMotorDatabase,
-    employee_id: str,
-    employee_name: str,
+def build_commission_message(
     amount: float,
     percentage: Optional[float] = None,
     truck_type: Optional[str] = None,
-) -> Dict[str, int]:
+) -> Tuple[str, str, Dict[str, Any]]:
+    """Título, texto e dados da notificação de comissão (in-app e push)."""
     details = []
     if percentage is not None:
         details.append(f"{percentage}%")
@@ -179,7 +234,24 @@ async def notify_commission_update(
     detail_text = f" ({', '.join(details)})" if details else ""
     title = "💰 Nova comissão lançada"
     body = f"Foi lançada uma comissão de R$ {amount:.2f}{detail_text}."
+    data = {
+        "amount": amount,
+        "percentage": percentage if percentage is not None else "",
+        "truck_type": truck_type or "",
+    }
+    return title, body, data
+
 
+async def create_commission_in_app_notification(
+    db: AsyncIOMotorDatabase,
+    employee_id: str,
+    employee_name: str,
+    amount: float,
+    percentage: Optional[float] = None,
+    truck_type: Optional[str] = None,
+    notification_id: Optional[str] = None,
+) -> None:
+    title, body, data = build_commission_message(amount, percentage, truck_type)
     await create_in_app_notification(
         db=db,
         employee_id=employee_id,
@@ -187,22 +259,26 @@ async def notify_commission_update(
         title=title,
         message=body,
         notification_type="commission_posted",
-        data={
-            "amount": amount,
-            "percentage": percentage if percentage is not None else "",
-            "truck_type": truck_type or "",
-        },
+        data=data,
+        notification_id=notification_id,
     )
 
+
+async def send_commission_push(
+    db: AsyncIOMotorDatabase,
+    employee_id: str,
+    amount: float,
+    percentage: Optional[float] = None,
+    truck_type: Optional[str] = None,
+    skip_tokens: Optional[Collection[str]] = None,
+) -> Dict[str, Any]:
+    title, body, data = build_commission_message(amount, percentage, truck_type)
     return await send_push_to_employee(
         db=db,
         employee_id=employee_id,
         title=title,
         body=body,
-        data={
-            "type": "commission_posted",
-            "amount": amount,
-            "percentage": percentage if percentage is not None else "",
-            "truck_type": truck_type or "",
-        },
-    )
\ No newline at end of file
+        data={"type": "commission_posted", **data},
+        skip_tokens=skip_tokens,
+    )
+
@@ -0,0 +1,142 @@
+"""
+Orçamento de consultas ao MongoDB por requisição e detector de N+1
+Para desenvolvimento e homologação: compara os comandos de cada requisição
+(contados pelo listener de metrics.py) com o orçamento da rota e acusa a mesma
+consulta repetida muitas vezes, típico de um find_one dentro de um loop
+
+QUERY_BUDGET_MODE:
+    off     (padrão) não verifica nada
+    report  informa no header X-Query-Budget e no log
+    strict  como report, e levanta QueryBudgetExceeded no fim da requisição,
+            o que faz o teste que a disparou falhar
+"""
+
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from metrics import RequestStats, current_request_stats, route_template
+
+
+logger = logging.getLogger(__name__)
+
+OFF = "off"
+REPORT = "report"
+STRICT = "strict"
+MODES = {OFF, REPORT, STRICT}
+
+COMMANDS_HEADER = b"x-mongo-commands"
+BUDGET_HEADER = b"x-query-budget"
+
+
+class QueryBudgetExceeded(Exception):
+    """Requisição passou do orçamento de consultas ou repetiu a mesma consulta (modo strict)."""
+
+
+@dataclass
+class QueryBudget:
+    mode: str = OFF
+    # Comandos por requisição quando a rota não tem orçamento próprio
+    default_budget: int = 25
+    # A mesma forma de consulta repetida a partir daqui é tratada como N+1
+    repeat_threshold: int = 5
+    # "GET /api/admin/users" (ou só "/api/admin/users") -> máximo de comandos
+    route_budgets: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != OFF
+
+    def set_route_budget(self, route: str, budget: int, method: Optional[str] = None) -> None:
+        key = f"{method.upper()} {route}" if method else route
+        self.route_budgets[key] = budget
+
+    def budget_for(self, method: str, route: str) -> int:
+        return self.route_budgets.get(
+            f"{method} {route}",
+            self.route_budgets.get(route, self.default_budget),
+        )
+
+    def check(self, method: str, route: str, stats: RequestStats) -> List[str]:
+        """Violações da requisição, em texto; lista vazia quando está dentro do orçamento."""
+        violations = []
+        budget = self.budget_for(method, route)
+        if stats.commands > budget:
+            violations.append(f"budget {stats.commands}/{budget}")
+        for shape, count in sorted(stats.by_shape.items()):
+            if count >= self.repeat_threshold:
+                violations.append(f"n+1 {shape} x{count}")
+        return violations
+
+
+def load_query_budget() -> QueryBudget:
+    mode = os.environ.get("QUERY_BUDGET_MODE", OFF).lower()
+    if mode not in MODES:
+        raise ValueError(f"QUERY_BUDGET_MODE inválido: {mode} (use off, report ou strict)")
+    route_budgets = json.loads(os.environ.get("QUERY_BUDGETS") or "{}")
+    return QueryBudget(
+        mode=mode,
+        default_budget=int(os.environ.get("QUERY_BUDGET_DEFAULT", "25")),
+        repeat_threshold=int(os.environ.get("QUERY_BUDGET_REPEAT_THRESHOLD", "5")),
+        route_budgets={key: int(value) for key, value in route_budgets.items()},
+    )
+
+
+query_budget = load_query_budget()
+
+
+class QueryBudgetMiddleware:
+    """Middleware ASGI que aplica o orçamento; fica por dentro do MetricsMiddleware.
+
+    Os headers saem no início da resposta: rotas em streaming (exportações)
+    ainda podem consultar depois disso, e essas consultas só entram no log.
+    """
+
+    def __init__(self, app, budget: QueryBudget = query_budget):
+        self.app = app
+        self.budget = budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.budget.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        # Reaproveita o RequestStats do MetricsMiddleware quando existe
+        stats = current_request_stats.get()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = current_request_stats.set(stats)
+        method = scope.get("method", "")
+
+        async def send_with_budget(message):
+            if message["type"] == "http.response.start":
+                violations = self.budget.check(method, route_template(scope), stats)
+                headers = list(message.get("headers", []))
+                headers.append((COMMANDS_HEADER, str(stats.commands).encode()))
+                if violations:
+                    headers.append((BUDGET_HEADER, "; ".join(violations).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_budget)
+        finally:
+            if token is not None:
+                current_request_stats.reset(token)
+
+        route = route_template(scope)
+        violations = self.budget.check(method, route, stats)
+        if not violations:
+            return
+
+        commands = ", ".join(
+            f"{collection}.{command}={count}"
+            for (collection, command), count in sorted(stats.by_command.items())
+        )
+        summary = f"{method} {route}: {stats.commands} comandos ({commands}); {'; '.join(violations)}"
+        logger.warning("Orçamento de consultas excedido: %s", summary)
+        if self.budget.mode == STRICT:
+            raise QueryBudgetExceeded(summary)
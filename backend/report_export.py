@@ -0,0 +1,167 @@
+"""
+Exportação em streaming do relatório mensal de comissão (CSV e NDJSON)
+As linhas saem de um cursor de agregação e são escritas conforme chegam, então a
+memória não cresce com o número de funcionários nem de meses exportados
+"""
+
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from documents import ROSTER_ROLES
+from periods import get_period_key
+from rollups import ROLLUPS_COLLECTION
+
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+EXPORT_COLUMNS = [
+    "month",
+    "year",
+    "employee_id",
+    "employee_name",
+    "role",
+    "occurrence_count",
+    "monthly_delivered_value",
+    "percentage",
+    "commission_value",
+    "final_percentage",
+    "final_commission_value",
+]
+
+# Limite de meses por exportação (ex.: um ano e meio de folha)
+MAX_EXPORT_MONTHS = 24
+
+
+def iter_months(month: int, year: int, end_month: int, end_year: int) -> Iterator[Tuple[int, int]]:
+    """(mês, ano) de month/year até end_month/end_year, inclusive."""
+    current, last = get_period_key(month, year), get_period_key(end_month, end_year)
+    while current <= last:
+        current_month, current_year = current % 100, current // 100
+        yield current_month, current_year
+        current = get_period_key(1, current_year + 1) if current_month == 12 else current + 1
+
+
+def build_period_totals_pipeline(period: int) -> List[Dict[str, Any]]:
+    """Funcionários com o valor entregue e as ocorrências do mês, lidos de `monthly_rollups`.
+
+    O $lookup filtra por (employee_id, period), atendido pelo índice do rollup;
+    quem não tem rollup no mês aparece com zeros, como no relatório JSON.
+    """
+    return [
+        {"$match": {"role": {"$in": ROSTER_ROLES}}},
+        {
+            "$lookup": {
+                "from": ROLLUPS_COLLECTION,
+                "let": {"employee_id": "$id"},
+                "pipeline": [
+                    {
+                        "$match": {
+                            "$expr": {
+                                "$and": [
+                                    {"$eq": ["$employee_id", "$$employee_id"]},
+                                    {"$eq": ["$period", period]},
+                                ]
+                            }
+                        }
+                    },
+                    {
+                        "$group": {
+                            "_id": None,
+                            "delivered_value": {"$sum": "$delivered_value"},
+                            "occurrence_count": {"$sum": "$occurrence_count"},
+                        }
+                    },
+                ],
+                "as": "totals",
+            }
+        },
+        {"$unwind": {"path": "$totals", "preserveNullAndEmptyArrays": True}},
+        {
+            "$project": {
+                "_id": 0,
+                "id": 1,
+                "name": 1,
+                "role": 1,
+                "delivered_value": {"$ifNull": ["$totals.delivered_value", 0]},
+                "occurrence_count": {"$ifNull": ["$totals.occurrence_count", 0]},
+            }
+        },
+    ]
+
+
+def build_report_rows_pipeline(period: int) -> List[Dict[str, Any]]:
+    """Mesma ordenação do relatório JSON: menos ocorrências e maior valor primeiro."""
+    return build_period_totals_pipeline(period) + [
+        {"$sort": {"occurrence_count": 1, "delivered_value": -1, "id": 1}},
+    ]
+
+
+async def get_occurrence_count_bounds(db: AsyncIOMotorDatabase, period: int) -> Tuple[int, int]:
+    """(mínimo, máximo) de ocorrências do mês na equipe, sem trazer a equipe para o Python."""
+    pipeline = build_period_totals_pipeline(period) + [
+        {
+            "$group": {
+                "_id": None,
+                "min_count": {"$min": "$occurrence_count"},
+                "max_count": {"$max": "$occurrence_count"},
+            }
+        },
+    ]
+    async for row in db.users.aggregate(pipeline):
+        return int(row["min_count"]), int(row["max_count"])
+    return 0, 0
+
+
+async def iter_period_totals(db: AsyncIOMotorDatabase, period: int, batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+    cursor = db.users.aggregate(build_report_rows_pipeline(period), allowDiskUse=True, batchSize=batch_size)
+    async for row in cursor:
+        yield row
+
+
+async def encode_csv(rows: AsyncIterator[Dict[str, Any]], flush_every: int = 200) -> AsyncIterator[str]:
+    """CSV com cabeçalho enviado antes da primeira consulta, em blocos de `flush_every` linhas."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    async for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= flush_every:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if pending:
+        yield buffer.getvalue()
+
+
+async def encode_ndjson(rows: AsyncIterator[Dict[str, Any]], flush_every: int = 200) -> AsyncIterator[str]:
+    """Um objeto JSON por linha, em blocos de `flush_every` linhas."""
+    lines: List[str] = []
+    async for row in rows:
+        lines.append(json.dumps({column: row.get(column) for column in EXPORT_COLUMNS}, ensure_ascii=False))
+        if len(lines) >= flush_every:
+            yield "\n".join(lines) + "\n"
+            lines = []
+
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+ENCODERS = {
+    "csv": encode_csv,
+    "ndjson": encode_ndjson,
+}
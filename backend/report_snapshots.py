@@ -0,0 +1,64 @@
+"""
+Snapshots congelados de relatórios de meses encerrados
+Um mês fechado não muda mais; o relatório é calculado uma vez e servido daqui
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from periods import get_period_key
+
+
+SNAPSHOTS_COLLECTION = "report_snapshots"
+MONTHLY_COMMISSION_REPORT = "monthly_commission"
+
+
+def _snapshot_filter(report_type: str, month: int, year: int) -> Dict[str, Any]:
+    return {"report_type": report_type, "period": get_period_key(month, year)}
+
+
+async def get_report_snapshot(
+    db: AsyncIOMotorDatabase,
+    report_type: str,
+    month: int,
+    year: int,
+) -> Optional[Dict[str, Any]]:
+    snapshot = await db[SNAPSHOTS_COLLECTION].find_one(
+        _snapshot_filter(report_type, month, year),
+        {"_id": 0, "report": 1},
+    )
+    return snapshot["report"] if snapshot else None
+
+
+async def save_report_snapshot(
+    db: AsyncIOMotorDatabase,
+    report_type: str,
+    month: int,
+    year: int,
+    report: Dict[str, Any],
+) -> None:
+    """Grava o snapshot; se outra requisição gravou antes, mantém o existente."""
+    await db[SNAPSHOTS_COLLECTION].update_one(
+        _snapshot_filter(report_type, month, year),
+        {
+            "$setOnInsert": {
+                "month": month,
+                "year": year,
+                "report": report,
+                "generated_at": datetime.now(timezone.utc).isoformat(),
+            }
+        },
+        upsert=True,
+    )
+
+
+async def delete_report_snapshot(
+    db: AsyncIOMotorDatabase,
+    report_type: str,
+    month: int,
+    year: int,
+) -> bool:
+    result = await db[SNAPSHOTS_COLLECTION].delete_one(_snapshot_filter(report_type, month, year))
+    return result.deleted_count > 0
@@ -0,0 +1,294 @@
+"""
+Repositório de entregas, ocorrências e comissões
+Mesma interface para o MongoDB (server.py) e para a memória (server_simple.py),
+para que as duas versões do servidor usem a mesma regra de comissão e só
+mudem onde os dados ficam
+"""
+
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from itertools import islice
+from typing import Any, DefaultDict, Dict, Iterable, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from aggregations import get_month_occurrence_counts
+from periods import get_document_period, get_period_key
+from rollups import (
+    apply_deliveries as apply_deliveries_to_rollup,
+    apply_delivery as apply_delivery_to_rollup,
+    apply_occurrence as apply_occurrence_to_rollup,
+    get_all_time_totals as get_all_time_rollup_totals,
+    get_period_totals as get_period_rollup_totals,
+)
+
+
+Totals = Dict[str, Any]
+
+
+class CommissionRepository(ABC):
+    """Interface comum; os totais seguem o formato de rollups.get_period_totals.
+
+    Classe abstrata: uma implementação sem algum dos métodos falha ao ser
+    instanciada, não na primeira chamada.
+
+    Os métodos `add_*` gravam o documento como recebido (montado com os
+    builders de documents.py) e devolvem o id gerado pelo armazenamento.
+    """
+
+    @abstractmethod
+    async def add_delivery(self, delivery: Dict[str, Any]) -> str:
+        ...
+
+    @abstractmethod
+    async def add_deliveries(self, deliveries: List[Dict[str, Any]]) -> None:
+        ...
+
+    @abstractmethod
+    async def add_occurrence(self, occurrence: Dict[str, Any]) -> str:
+        ...
+
+    @abstractmethod
+    async def add_commission(self, commission: Dict[str, Any]) -> str:
+        ...
+
+    @abstractmethod
+    async def get_period_totals(self, period: int, employee_ids: Optional[List[str]] = None) -> Dict[str, Totals]:
+        """Mapa employee_id -> totais do mês (valor, entregas, ocorrências, by_truck)."""
+
+    @abstractmethod
+    async def get_all_time_totals(self, employee_ids: List[str]) -> Dict[str, Totals]:
+        """Mapa employee_id -> totais somando todos os meses."""
+
+    @abstractmethod
+    async def get_month_occurrence_counts(self, month: int, year: int) -> Dict[str, int]:
+        """Ocorrências do mês por funcionário, na ordem da primeira ocorrência (desempate do ranking)."""
+
+    @abstractmethod
+    async def list_occurrences(
+        self,
+        employee_id: Optional[str] = None,
+        period: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Ocorrências das mais recentes para as mais antigas."""
+
+    @abstractmethod
+    async def list_commissions(
+        self,
+        month: Optional[int] = None,
+        year: Optional[int] = None,
+        employee_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        ...
+
+
+class MongoRepository(CommissionRepository):
+    """Coleções do MongoDB, com os totais lidos do read model `monthly_rollups`."""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+
+    async def add_delivery(self, delivery: Dict[str, Any]) -> str:
+        # Cópia: insert_one acrescenta _id ao dicionário
+        result = await self.db.deliveries.insert_one(delivery.copy())
+        await apply_delivery_to_rollup(self.db, delivery)
+        return str(result.inserted_id)
+
+    async def add_deliveries(self, deliveries: List[Dict[str, Any]]) -> None:
+        await self.db.deliveries.insert_many([delivery.copy() for delivery in deliveries], ordered=False)
+        await apply_deliveries_to_rollup(self.db, deliveries)
+
+    async def add_occurrence(self, occurrence: Dict[str, Any]) -> str:
+        result = await self.db.occurrences.insert_one(occurrence.copy())
+        await apply_occurrence_to_rollup(self.db, occurrence)
+        return str(result.inserted_id)
+
+    async def add_commission(self, commission: Dict[str, Any]) -> str:
+        result = await self.db.commissions.insert_one(commission.copy())
+        return str(result.inserted_id)
+
+    async def get_period_totals(self, period: int, employee_ids: Optional[List[str]] = None) -> Dict[str, Totals]:
+        return await get_period_rollup_totals(self.db, period, employee_ids)
+
+    async def get_all_time_totals(self, employee_ids: List[str]) -> Dict[str, Totals]:
+        return await get_all_time_rollup_totals(self.db, employee_ids)
+
+    async def get_month_occurrence_counts(self, month: int, year: int) -> Dict[str, int]:
+        return await get_month_occurrence_counts(self.db, month, year)
+
+    async def list_occurrences(
+        self,
+        employee_id: Optional[str] = None,
+        period: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {}
+        if employee_id is not None:
+            query["employee_id"] = employee_id
+        if period is not None:
+            query["period"] = period
+        return await self.db.occurrences.find(query, {"_id": 0}).sort("created_at", -1).to_list(limit)
+
+    async def list_commissions(
+        self,
+        month: Optional[int] = None,
+        year: Optional[int] = None,
+        employee_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {}
+        if month and year:
+            query.update({"month": month, "year": year})
+        if employee_id is not None:
+            query["employee_id"] = employee_id
+        return await self.db.commissions.find(query, {"_id": 0}).sort("_id", -1).to_list(None)
+
+
+def _empty_totals() -> Totals:
+    return {"delivered_value": 0.0, "delivery_count": 0, "occurrence_count": 0, "by_truck": {}}
+
+
+def _copy_totals(totals: Totals) -> Totals:
+    return {**totals, "by_truck": {truck: dict(values) for truck, values in totals["by_truck"].items()}}
+
+
+def _occurrence_month(occurrence: Dict[str, Any]) -> Optional[int]:
+    """Mês da ocorrência: month/year quando lançados (rotas de comissão), senão o período da data."""
+    if occurrence.get("month") and occurrence.get("year"):
+        return get_period_key(int(occurrence["month"]), int(occurrence["year"]))
+    return get_document_period(occurrence)
+
+
+def _newest_first(docs: List[Dict[str, Any]], limit: Optional[int]) -> List[Dict[str, Any]]:
+    return [dict(doc) for doc in islice(reversed(docs), limit)]
+
+
+class InMemoryRepository(CommissionRepository):
+    """Armazenamento em memória com índices por funcionário e por período.
+
+    Os totais por funcionário, mês e caminhão são somados a cada inserção
+    (como o monthly_rollups), então as consultas não percorrem as listas:
+    custam o tamanho da resposta, não o volume de registros guardados.
+    """
+
+    def __init__(self):
+        self._next_id = 0
+        self._deliveries_by_employee: DefaultDict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._occurrences: List[Dict[str, Any]] = []
+        self._occurrences_by_employee: DefaultDict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._occurrences_by_period: DefaultDict[int, List[Dict[str, Any]]] = defaultdict(list)
+        self._occurrences_by_employee_period: DefaultDict[Tuple[str, int], List[Dict[str, Any]]] = defaultdict(list)
+        self._commissions: List[Dict[str, Any]] = []
+        self._commissions_by_period: DefaultDict[int, List[Dict[str, Any]]] = defaultdict(list)
+        self._commissions_by_employee: DefaultDict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._period_totals: DefaultDict[int, Dict[str, Totals]] = defaultdict(dict)
+        self._all_time_totals: Dict[str, Totals] = {}
+        # Inserção na ordem da primeira ocorrência do funcionário no mês
+        self._month_occurrence_counts: DefaultDict[int, Dict[str, int]] = defaultdict(dict)
+
+    def _new_id(self, prefix: str) -> str:
+        self._next_id += 1
+        return f"{prefix}_{self._next_id}"
+
+    def _totals_entries(self, employee_id: str, period: Optional[int]) -> Iterable[Totals]:
+        if period is not None:
+            yield self._period_totals[period].setdefault(employee_id, _empty_totals())
+        yield self._all_time_totals.setdefault(employee_id, _empty_totals())
+
+    def _index_delivery(self, delivery: Dict[str, Any]) -> None:
+        employee_id = delivery["employee_id"]
+        value = float(delivery.get("value", 0))
+        self._deliveries_by_employee[employee_id].append(delivery)
+        for totals in self._totals_entries(employee_id, get_document_period(delivery)):
+            totals["delivered_value"] += value
+            totals["delivery_count"] += 1
+            truck = totals["by_truck"].setdefault(delivery["truck_type"], {"count": 0, "total_value": 0})
+            truck["count"] += 1
+            truck["total_value"] += value
+
+    async def add_delivery(self, delivery: Dict[str, Any]) -> str:
+        self._index_delivery(dict(delivery))
+        return delivery.get("id") or self._new_id("del")
+
+    async def add_deliveries(self, deliveries: List[Dict[str, Any]]) -> None:
+        for delivery in deliveries:
+            self._index_delivery(dict(delivery))
+
+    async def add_occurrence(self, occurrence: Dict[str, Any]) -> str:
+        occurrence = dict(occurrence)
+        employee_id = occurrence["employee_id"]
+        period = get_document_period(occurrence)
+
+        self._occurrences.append(occurrence)
+        self._occurrences_by_employee[employee_id].append(occurrence)
+        if period is not None:
+            self._occurrences_by_period[period].append(occurrence)
+            self._occurrences_by_employee_period[(employee_id, period)].append(occurrence)
+        for totals in self._totals_entries(employee_id, period):
+            totals["occurrence_count"] += 1
+
+        month = _occurrence_month(occurrence)
+        if month is not None:
+            counts = self._month_occurrence_counts[month]
+            counts[employee_id] = counts.get(employee_id, 0) + 1
+        return occurrence.get("id") or self._new_id("occ")
+
+    async def add_commission(self, commission: Dict[str, Any]) -> str:
+        commission = dict(commission)
+        self._commissions.append(commission)
+        self._commissions_by_period[get_period_key(commission["month"], commission["year"])].append(commission)
+        self._commissions_by_employee[commission["employee_id"]].append(commission)
+        return commission.get("id") or self._new_id("com")
+
+    async def get_period_totals(self, period: int, employee_ids: Optional[List[str]] = None) -> Dict[str, Totals]:
+        month_totals = self._period_totals.get(period, {})
+        if employee_ids is None:
+            return {employee_id: _copy_totals(totals) for employee_id, totals in month_totals.items()}
+        return {
+            employee_id: _copy_totals(month_totals[employee_id])
+            for employee_id in employee_ids
+            if employee_id in month_totals
+        }
+
+    async def get_all_time_totals(self, employee_ids: List[str]) -> Dict[str, Totals]:
+        return {
+            employee_id: _copy_totals(self._all_time_totals[employee_id])
+            for employee_id in employee_ids
+            if employee_id in self._all_time_totals
+        }
+
+    async def get_month_occurrence_counts(self, month: int, year: int) -> Dict[str, int]:
+        return dict(self._month_occurrence_counts.get(get_period_key(month, year), {}))
+
+    async def list_occurrences(
+        self,
+        employee_id: Optional[str] = None,
+        period: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        # Inserção em ordem cronológica: de trás para frente são as mais recentes
+        if employee_id is not None and period is not None:
+            docs = self._occurrences_by_employee_period.get((employee_id, period), [])
+        elif employee_id is not None:
+            docs = self._occurrences_by_employee.get(employee_id, [])
+        elif period is not None:
+            docs = self._occurrences_by_period.get(period, [])
+        else:
+            docs = self._occurrences
+        return _newest_first(docs, limit)
+
+    async def list_commissions(
+        self,
+        month: Optional[int] = None,
+        year: Optional[int] = None,
+        employee_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        if month and year:
+            docs = self._commissions_by_period.get(get_period_key(month, year), [])
+            if employee_id is not None:
+                docs = [doc for doc in docs if doc["employee_id"] == employee_id]
+        elif employee_id is not None:
+            docs = self._commissions_by_employee.get(employee_id, [])
+        else:
+            docs = self._commissions
+        return _newest_first(docs, None)
@@ -0,0 +1,268 @@
+"""
+Read model `monthly_rollups`: totais por funcionário, mês e caminhão
+Atualizado com $inc a cada entrega/ocorrência; as telas leem daqui em vez de
+recalcular a partir de todas as entregas
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorCursor, AsyncIOMotorDatabase
+from pymongo import InsertOne, UpdateOne
+
+from indexes import INDEXES
+from periods import get_document_period
+
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_COLLECTION = "monthly_rollups"
+
+# Marca em `maintenance_checkpoints` gravada por rebuild_rollups: sem ela os
+# rollups só têm os lançamentos feitos depois do deploy
+ROLLUPS_CHECKPOINT_ID = "rebuild_rollups"
+
+RollupKey = Tuple[str, int, str]
+
+
+def _rollup_key(doc: Dict[str, Any]) -> Optional[RollupKey]:
+    employee_id = doc.get("employee_id")
+    period = get_document_period(doc)
+    if not employee_id or period is None:
+        return None
+    return employee_id, period, doc.get("truck_type") or ""
+
+
+def _rollup_filter(key: RollupKey) -> Dict[str, Any]:
+    employee_id, period, truck_type = key
+    return {"employee_id": employee_id, "period": period, "truck_type": truck_type}
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {
+        "delivered_value": 0.0,
+        "delivery_count": 0,
+        "occurrence_count": 0,
+        "by_truck": {},
+    }
+
+
+async def _increment(db: AsyncIOMotorDatabase, key: RollupKey, increments: Dict[str, Any]) -> None:
+    await db[ROLLUPS_COLLECTION].update_one(
+        _rollup_filter(key),
+        {
+            "$inc": increments,
+            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()},
+        },
+        upsert=True,
+    )
+
+
+async def apply_delivery(db: AsyncIOMotorDatabase, delivery: Dict[str, Any]) -> None:
+    """Soma uma entrega ao rollup (employee_id, period, truck_type)."""
+    key = _rollup_key(delivery)
+    if key is None:
+        return
+    await _increment(db, key, {"delivered_value": float(delivery.get("value", 0)), "delivery_count": 1})
+
+
+async def apply_deliveries(db: AsyncIOMotorDatabase, deliveries: List[Dict[str, Any]]) -> None:
+    """Soma várias entregas com um único bulk_write, um $inc por rollup afetado."""
+    increments: Dict[RollupKey, Dict[str, Any]] = {}
+    for delivery in deliveries:
+        key = _rollup_key(delivery)
+        if key is None:
+            continue
+        entry = increments.setdefault(key, {"delivered_value": 0.0, "delivery_count": 0})
+        entry["delivered_value"] += float(delivery.get("value", 0))
+        entry["delivery_count"] += 1
+
+    if not increments:
+        return
+
+    now_iso = datetime.now(timezone.utc).isoformat()
+    await db[ROLLUPS_COLLECTION].bulk_write(
+        [
+            UpdateOne(_rollup_filter(key), {"$inc": values, "$set": {"updated_at": now_iso}}, upsert=True)
+            for key, values in increments.items()
+        ],
+        ordered=False,
+    )
+
+
+async def apply_occurrence(db: AsyncIOMotorDatabase, occurrence: Dict[str, Any]) -> None:
+    """Soma uma ocorrência ao rollup (employee_id, period, truck_type)."""
+    key = _rollup_key(occurrence)
+    if key is None:
+        return
+    await _increment(db, key, {"occurrence_count": 1})
+
+
+def fold_totals(totals: Dict[str, Dict[str, Any]], row: Dict[str, Any]) -> None:
+    entry = totals.setdefault(row["employee_id"], _empty_totals())
+    delivered_value = float(row.get("delivered_value", 0))
+    delivery_count = row.get("delivery_count", 0)
+    entry["delivered_value"] += delivered_value
+    entry["delivery_count"] += delivery_count
+    entry["occurrence_count"] += row.get("occurrence_count", 0)
+
+    # Mesmo formato de by_truck das rotas: só caminhões com entregas
+    truck_type = row.get("truck_type")
+    if truck_type and delivery_count:
+        truck = entry["by_truck"].setdefault(truck_type, {"count": 0, "total_value": 0})
+        truck["count"] += delivery_count
+        truck["total_value"] += delivered_value
+
+
+async def get_period_totals(
+    db: AsyncIOMotorDatabase,
+    period: int,
+    employee_ids: Optional[List[str]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Mapa employee_id -> totais do mês (valor, entregas, ocorrências, by_truck)."""
+    query: Dict[str, Any] = {"period": period}
+    if employee_ids is not None:
+        query["employee_id"] = {"$in": employee_ids}
+
+    totals: Dict[str, Dict[str, Any]] = {}
+    async for row in db[ROLLUPS_COLLECTION].find(query, {"_id": 0}):
+        fold_totals(totals, row)
+    return totals
+
+
+async def get_all_time_totals(
+    db: AsyncIOMotorDatabase,
+    employee_ids: List[str],
+) -> Dict[str, Dict[str, Any]]:
+    """Mapa employee_id -> totais de todos os meses, agrupados por caminhão no servidor."""
+    pipeline = [
+        {"$match": {"employee_id": {"$in": employee_ids}}},
+        {
+            "$group": {
+                "_id": {"employee_id": "$employee_id", "truck_type": "$truck_type"},
+                "delivered_value": {"$sum": "$delivered_value"},
+                "delivery_count": {"$sum": "$delivery_count"},
+                "occurrence_count": {"$sum": "$occurrence_count"},
+            }
+        },
+    ]
+
+    totals: Dict[str, Dict[str, Any]] = {}
+    async for row in db[ROLLUPS_COLLECTION].aggregate(pipeline):
+        row.update(row.pop("_id"))
+        fold_totals(totals, row)
+    return totals
+
+
+def add_to_rollups(rollups: Dict[RollupKey, Dict[str, Any]], doc: Dict[str, Any], is_delivery: bool) -> None:
+    """Soma uma entrega/ocorrência ao acumulador em memória usado para gerar os rollups."""
+    key = _rollup_key(doc)
+    if key is None:
+        return
+    entry = rollups.setdefault(key, {"delivered_value": 0.0, "delivery_count": 0, "occurrence_count": 0})
+    if is_delivery:
+        entry["delivered_value"] += float(doc.get("value", 0))
+        entry["delivery_count"] += 1
+    else:
+        entry["occurrence_count"] += 1
+
+
+def build_rollup_documents(
+    rollups: Dict[RollupKey, Dict[str, Any]],
+    updated_at: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Documentos de `monthly_rollups` a partir do acumulador de add_to_rollups.
+
+    `updated_at` fixo deixa a saída repetível (synthetic_data); o padrão é agora.
+    """
+    updated_at = updated_at or datetime.now(timezone.utc).isoformat()
+    return [{**_rollup_filter(key), **values, "updated_at": updated_at} for key, values in rollups.items()]
+
+
+async def apply_rollup_totals(
+    db: AsyncIOMotorDatabase,
+    rollups: Dict[RollupKey, Dict[str, Any]],
+    batch_size: int = 1000,
+) -> int:
+    """Soma os totais do acumulador aos rollups existentes ($inc com upsert, em lotes)."""
+    now_iso = datetime.now(timezone.utc).isoformat()
+    operations = [
+        UpdateOne(_rollup_filter(key), {"$inc": values, "$set": {"updated_at": now_iso}}, upsert=True)
+        for key, values in rollups.items()
+    ]
+    for start in range(0, len(operations), batch_size):
+        await db[ROLLUPS_COLLECTION].bulk_write(operations[start:start + batch_size], ordered=False)
+    return len(operations)
+
+
+async def _accumulate(
+    cursor: AsyncIOMotorCursor,
+    rollups: Dict[RollupKey, Dict[str, Any]],
+    is_delivery: bool,
+) -> None:
+    async for doc in cursor:
+        add_to_rollups(rollups, doc, is_delivery)
+
+
+async def rebuild_rollups(db: AsyncIOMotorDatabase, batch_size: int = 1000) -> int:
+    """Regenera `monthly_rollups` a partir das entregas e ocorrências.
+
+    Os rollups são montados em uma coleção temporária e trocados com rename,
+    para que as leituras nunca vejam a coleção pela metade. Lançamentos feitos
+    durante a reconstrução podem ficar de fora: rode fora do horário de uso.
+    """
+    projection = {"_id": 0, "employee_id": 1, "truck_type": 1, "value": 1, "period": 1, "created_at": 1}
+    rollups: Dict[RollupKey, Dict[str, Any]] = {}
+    await _accumulate(db.deliveries.find({}, projection), rollups, is_delivery=True)
+    await _accumulate(db.occurrences.find({}, projection), rollups, is_delivery=False)
+
+    staging = db[f"{ROLLUPS_COLLECTION}_rebuild"]
+    await staging.drop()
+    await _create_rollup_indexes(staging)
+
+    operations = [InsertOne(doc) for doc in build_rollup_documents(rollups)]
+    for start in range(0, len(operations), batch_size):
+        await staging.bulk_write(operations[start:start + batch_size], ordered=False)
+
+    if operations:
+        await staging.rename(ROLLUPS_COLLECTION, dropTarget=True)
+    else:
+        await db[ROLLUPS_COLLECTION].delete_many({})
+
+    await mark_rollups_built(db)
+    logger.info("Rollups reconstruídos: %d documentos", len(operations))
+    return len(operations)
+
+
+async def mark_rollups_built(db: AsyncIOMotorDatabase) -> None:
+    await db.maintenance_checkpoints.update_one(
+        {"_id": ROLLUPS_CHECKPOINT_ID},
+        {"$set": {"completed_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+    )
+
+
+async def rollups_built(db: AsyncIOMotorDatabase) -> bool:
+    """True depois do primeiro rebuild_rollups (ou em banco criado já com rollups)."""
+    return await db.maintenance_checkpoints.find_one({"_id": ROLLUPS_CHECKPOINT_ID}, {"_id": 1}) is not None
+
+
+async def check_rollups_built(db: AsyncIOMotorDatabase) -> bool:
+    """Verificação do startup; um banco sem entregas nem ocorrências não tem o que reconstruir."""
+    if await rollups_built(db):
+        return True
+    if not await db.deliveries.find_one({}, {"_id": 1}) and not await db.occurrences.find_one({}, {"_id": 1}):
+        await mark_rollups_built(db)
+        return True
+    logger.warning(
+        "monthly_rollups ainda não foi reconstruído: rode `python maintenance.py rebuild-rollups`; "
+        "até lá os relatórios de meses encerrados não são congelados"
+    )
+    return False
+
+
+async def _create_rollup_indexes(collection: AsyncIOMotorCollection) -> None:
+    for spec in INDEXES:
+        if spec.collection == ROLLUPS_COLLECTION:
+            await collection.create_index(list(spec.keys), name=spec.name, unique=spec.unique)
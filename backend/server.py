@@ -1,21 +1,64 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import PlainTextResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Tuple
+from typing import AsyncIterator, List, Optional, Dict, Tuple
 import uuid
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
 import jwt
 
 # Import commission routes
-from commission_routes import create_commission_router
-from push_notifications import notify_commission_update, register_device_token
+from commission_routes import CommissionRecord, create_commission_router
+from aggregations import get_employee_summary_totals, get_today_delivery_values
+from push_notifications import firebase_sender, register_device_token
+from notification_outbox import (
+    OutboxDispatcher,
+    build_commission_notification,
+    enqueue_commission_notification,
+    enqueue_notifications,
+    get_notification_sender,
+)
+from documents import TRUCK_RATES, build_delivery_doc, build_occurrence_doc, build_user_doc
+from indexes import ensure_indexes
+from live_updates import (
+    DELIVERY_EVENT,
+    LIVE_EVENT_ID_HEADER,
+    OCCURRENCE_EVENT,
+    build_employee_deltas,
+    dashboard_events,
+)
+from metrics import METRICS_CONTENT_TYPE, MetricsMiddleware, mongo_command_metrics, render_metrics
+from query_budget import QueryBudgetMiddleware
+from month_close import claim_month_close, fail_month_close, get_month_close, post_month_commissions
+from user_cache import user_cache
+from password_hashing import PasswordHasherBusy, create_password_hasher
+from pagination import InvalidCursor, find_page
+from periods import build_date_fields, build_period_match, get_period_key
+from report_snapshots import (
+    MONTHLY_COMMISSION_REPORT,
+    delete_report_snapshot,
+    get_report_snapshot,
+    save_report_snapshot,
+)
+from report_export import (
+    ENCODERS,
+    EXPORT_MEDIA_TYPES,
+    MAX_EXPORT_MONTHS,
+    get_occurrence_count_bounds,
+    iter_months,
+    iter_period_totals,
+)
+from tiers import EXTREME_RATES, TierTable, assign_extreme_tier_from_histogram, assign_extreme_tiers, extreme_tier
+from repositories import MongoRepository
+from rollups import check_rollups_built, rollups_built
 
 ROOT_DIR = Path(__file__).parent
 # Carregar .env local se existir
@@ -31,25 +74,36 @@ if not mongo_url:
 db_name = os.environ.get('DB_NAME', 'commission_tracker')
 
 print(f"🔗 Conectando ao MongoDB...")
-client = AsyncIOMotorClient(mongo_url)
+# O listener alimenta as métricas de comandos ao MongoDB expostas em /metrics
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_command_metrics])
 db = client[db_name]
+# Entregas, ocorrências e totais (a mesma interface do server_simple.py em memória)
+repository = MongoRepository(db)
 print(f"✅ Conectado a {db_name}")
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = create_password_hasher(pwd_context)
 security = HTTPBearer()
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
+# Quando definido, /metrics exige "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
 ALGORITHM = "HS256"
 
-# Truck rates configuration
-TRUCK_RATES = {
-    "BKO": 3.50,
-    "PYW": 3.50,
-    "NYC": 3.50,
-    "GKY": 7.50,
-    "GSD": 7.50,
-    "AUA": 10.00
-}
+# Percentual aplicado a todos durante o mês (ver get_monthly_percentage)
+PROVISIONAL_MONTHLY_PERCENTAGE = 0.4
+
+# Percentual fixo do membro especial (ver is_special_member)
+SPECIAL_MEMBER_PERCENTAGE = 1.3
+
+# Limite de linhas por chamada de POST /api/deliveries/bulk
+MAX_BULK_DELIVERIES = 5000
+
+# Snapshot e fechamento do mês leem os rollups: antes do rebuild o mês sairia zerado
+ROLLUPS_NOT_BUILT_DETAIL = "monthly_rollups not built yet; run `python maintenance.py rebuild-rollups`"
+
+# Ordem de GET /api/employees/{employee_id}/occurrences; _id desempata o cursor
+EMPLOYEE_OCCURRENCE_SORT = [("created_at", -1), ("_id", -1)]
 
 # Day assignments for drivers
 DAY_ASSIGNMENTS = {
@@ -59,6 +113,9 @@ DAY_ASSIGNMENTS = {
     "Valdiney": "Thursday"
 }
 
+# Tarefas em segundo plano (ex.: fechamento do mês); a referência evita coleta pelo GC
+background_tasks = set()
+
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -96,6 +153,9 @@ class DeliveryCreate(BaseModel):
     truck_type: str
     value: float
 
+class DeliveryBulkCreate(BaseModel):
+    deliveries: List[DeliveryCreate]
+
 class OccurrenceRecord(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -136,6 +196,20 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+async def hash_password_async(password: str) -> str:
+    """hash_password no pool dedicado, sem bloquear o event loop"""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password no pool dedicado, sem bloquear o event loop"""
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(days=7)
@@ -159,9 +233,12 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
+        user = user_cache.get(user_id)
+        if user is None:
+            user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+            if not user:
+                raise HTTPException(status_code=401, detail="User not found")
+            user_cache.set(user_id, user)
         return User(**user)
     except Exception:
         raise HTTPException(status_code=401, detail="Authentication required")
@@ -202,99 +279,36 @@ def is_month_closed(month: int, year: int) -> bool:
     return (year < now.year) or (year == now.year and month < now.month)
 
 
-def parse_iso_datetime(value: str) -> Optional[datetime]:
-    if not value:
-        return None
-    try:
-        return datetime.fromisoformat(value.replace("Z", "+00:00"))
-    except ValueError:
-        return None
-
-def get_tier_percentage(employee_id: str, occurrence_counts: Dict[str, int], employee_name: Optional[str] = None) -> float:
+def get_tier_percentage(employee_id: str, tiers: TierTable, employee_name: Optional[str] = None) -> float:
     """Calcula percentual por tier de ocorrências.
 
-    Regras padrão:
+    Regras padrão (tiers.assign_extreme_tiers):
     - Mais ocorrências: 0.4%
     - Ocorrências medianas: 0.5%
     - Menos ocorrências: 0.6%
-    - Se todos tiverem 0 ocorrências: 1.0% para todos
+    - Se todos tiverem 0 ocorrências: 0.6% para todos
 
     Regra especial Valdiney:
-    - Fixo em 2.5%
-    """
-    is_valdiney = is_special_member(employee_name)
-    if is_valdiney:
-        return 1.3
-
-    min_rate = 0.4
-    mid_rate = 0.5
-    max_rate = 0.6
-
-    if not occurrence_counts:
-        return max_rate
-
-    employee_count = occurrence_counts.get(employee_id, 0)
-    all_counts = list(occurrence_counts.values())
-    max_count = max(all_counts)
-    min_count = min(all_counts)
-
-    # Sem diferenciação real: todos sem ocorrência => melhor taxa;
-    # todos com mesmo número > 0 => taxa média.
-    if max_count == min_count:
-        return max_rate if max_count == 0 else mid_rate
-
-    # Com empates, quem tem mesma quantidade recebe o mesmo tier.
-    if employee_count == max_count:
-        return min_rate
-    if employee_count == min_count:
-        return max_rate
-    return mid_rate
-
-async def get_occurrence_count_map() -> Dict[str, int]:
-    """Retorna mapa employee_id -> quantidade de ocorrências para todos os membros."""
-    users = await db.users.find(
-        {"role": {"$in": ["driver", "helper"]}},
-        {"_id": 0, "id": 1}
-    ).to_list(1000)
+    - Fixo em 1.3%
 
-    occurrence_counts: Dict[str, int] = {}
-    for user in users:
-        employee_id = user.get("id")
-        if not employee_id:
-            continue
-        occurrence_counts[employee_id] = await db.occurrences.count_documents({"employee_id": employee_id})
-
-    return occurrence_counts
-
-
-async def get_occurrence_count_map_for_period(month: int, year: int) -> Dict[str, int]:
-    """Mapa employee_id -> ocorrências apenas do mês/ano informado."""
-    users = await db.users.find(
-        {"role": {"$in": ["driver", "helper"]}},
-        {"_id": 0, "id": 1}
-    ).to_list(1000)
-
-    period_prefix = f"{year:04d}-{month:02d}"
-    occurrence_counts: Dict[str, int] = {}
-
-    for user in users:
-        employee_id = user.get("id")
-        if not employee_id:
-            continue
-        occurrence_counts[employee_id] = await db.occurrences.count_documents(
-            {
-                "employee_id": employee_id,
-                "created_at": {"$regex": f"^{period_prefix}"},
-            }
-        )
+    A tabela de tiers é montada uma vez por período; aqui é só uma consulta.
+    """
+    if is_special_member(employee_name):
+        return SPECIAL_MEMBER_PERCENTAGE
+    return tiers.lookup(employee_id).rate
 
-    return occurrence_counts
+def build_occurrence_count_map(employee_ids: List[str], period_totals: Dict[str, dict]) -> Dict[str, int]:
+    """Mapa employee_id -> ocorrências do mês a partir dos rollups, com 0 para quem não tem."""
+    return {
+        employee_id: (period_totals.get(employee_id) or {}).get("occurrence_count", 0)
+        for employee_id in employee_ids
+    }
 
 
 def get_monthly_percentage(
     employee_id: str,
     employee_name: Optional[str],
-    occurrence_counts: Dict[str, int],
+    tiers: TierTable,
     month: int,
     year: int,
 ) -> float:
@@ -307,15 +321,15 @@ def get_monthly_percentage(
     - O fechamento final por ranking (0.8/0.9/1.0) é aplicado apenas no relatório mensal.
     """
     if is_special_member(employee_name):
-        return get_tier_percentage(employee_id, occurrence_counts, employee_name)
+        return get_tier_percentage(employee_id, tiers, employee_name)
 
-    return 0.4
+    return PROVISIONAL_MONTHLY_PERCENTAGE
 
 
 def get_final_monthly_percentage(
     employee_id: str,
     employee_name: Optional[str],
-    occurrence_counts: Dict[str, int],
+    tiers: TierTable,
 ) -> float:
     """
     Percentual final de fechamento mensal:
@@ -324,21 +338,9 @@ def get_final_monthly_percentage(
     - Menos ocorrências: 1.0%
     - Exceção Valdiney: regra especial (2.5% fixo)
     """
-    return get_tier_percentage(employee_id, occurrence_counts, employee_name)
+    return get_tier_percentage(employee_id, tiers, employee_name)
 
 
-def get_delivery_values_for_period(deliveries: List[dict], month: int, year: int) -> Tuple[float, float]:
-    """Retorna total geral e total do mês/ano informado para uma lista de entregas."""
-    total_all_time = sum(d.get("value", 0) for d in deliveries)
-    total_period = 0.0
-
-    for delivery in deliveries:
-        dt = parse_iso_datetime(str(delivery.get("created_at", "")))
-        if dt and dt.month == month and dt.year == year:
-            total_period += float(delivery.get("value", 0))
-
-    return total_all_time, total_period
-
 # Calculate commission for a user
 async def calculate_user_commission(user_id: str) -> dict:
     deliveries = await db.deliveries.find({"user_id": user_id}, {"_id": 0}).to_list(100)
@@ -378,18 +380,17 @@ async def register(user_data: UserRegister):
         assigned_day = get_assigned_day(user_data.name)
     
     # Create user
-    user = User(
+    user_doc = build_user_doc(
         username=user_data.username,
         name=user_data.name,
         role=user_data.role,
+        password_hash=await hash_password_async(user_data.password),
         assigned_day=assigned_day
     )
-    
-    user_doc = user.model_dump()
-    user_doc['password'] = hash_password(user_data.password)
-    user_doc['created_at'] = user_doc['created_at'].isoformat()
+    user = User(**user_doc)
     
     await db.users.insert_one(user_doc)
+    user_cache.invalidate(user.id)
     
     # Initialize delivery records for all trucks
     for truck in TRUCK_RATES.keys():
@@ -407,7 +408,7 @@ async def login(credentials: UserLogin):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if not verify_password(credentials.password, user['password']):
+    if not await verify_password_async(credentials.password, user['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_access_token({"user_id": user['id'], "role": user['role']})
@@ -443,6 +444,11 @@ async def get_my_notifications(
     ).sort("timestamp", -1).to_list(safe_limit)
     return {"notifications": notifications, "total": len(notifications)}
 
+@api_router.post("/admin/notifications/reload-credentials")
+async def reload_push_credentials(admin: User = Depends(get_admin_user)):
+    """Relê as credenciais do Firebase sem reiniciar o servidor"""
+    return {"push_enabled": firebase_sender.reload()}
+
 @api_router.get("/user/dashboard", response_model=UserDashboard)
 async def get_user_dashboard(current_user: User = Depends(get_current_user)):
     commission_data = await calculate_user_commission(current_user.id)
@@ -454,6 +460,16 @@ async def get_user_dashboard(current_user: User = Depends(get_current_user)):
         total_commission=commission_data["total_commission"]
     )
 
+@api_router.get("/admin/cache/users")
+async def get_user_cache_stats(admin: User = Depends(get_admin_user)):
+    """Contadores do cache de usuários autenticados"""
+    return user_cache.stats()
+
+@api_router.get("/admin/password-hashing")
+async def get_password_hashing_stats(admin: User = Depends(get_admin_user)):
+    """Métricas do pool de hash de senha (fila e tempo de espera)"""
+    return password_hasher.stats()
+
 @api_router.get("/admin/users/legacy", response_model=List[AdminUserSummary])
 async def get_all_users(admin: User = Depends(get_admin_user)):
     users = await db.users.find({"role": {"$in": ["driver", "helper"]}}, {"_id": 0}).to_list(1000)
@@ -482,21 +498,16 @@ async def create_delivery(payload: DeliveryCreate):
     if payload.truck_type not in TRUCK_RATES:
         raise HTTPException(status_code=400, detail="Invalid truck type")
     
-    delivery = {
-        "id": str(uuid.uuid4()),
-        "employee_id": payload.employee_id,
-        "truck_type": payload.truck_type,
-        "value": payload.value,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
+    delivery = build_delivery_doc(payload.employee_id, payload.truck_type, payload.value, build_date_fields())
     
-    delivery_doc = delivery.copy()
-    result = await db.deliveries.insert_one(delivery_doc)
-    logger.info(f"✅ Entrega inserida no MongoDB: {payload.employee_id} - {payload.truck_type} - R${payload.value} (ID: {result.inserted_id})")
+    async with dashboard_events.snapshot_lock:
+        inserted_id = await repository.add_delivery(delivery)
+        dashboard_events.publish_deltas(DELIVERY_EVENT, build_employee_deltas([delivery], is_delivery=True))
+    logger.info(f"✅ Entrega inserida no MongoDB: {payload.employee_id} - {payload.truck_type} - R${payload.value} (ID: {inserted_id})")
 
     employee = await db.users.find_one({"id": payload.employee_id}, {"_id": 0, "name": 1})
     employee_name = employee.get("name", f"Funcionário {payload.employee_id}") if employee else f"Funcionário {payload.employee_id}"
-    push_result = await notify_commission_update(
+    notification_id = await enqueue_commission_notification(
         db=db,
         employee_id=payload.employee_id,
         employee_name=employee_name,
@@ -507,35 +518,100 @@ async def create_delivery(payload: DeliveryCreate):
     return {
         "success": True,
         "delivery": delivery,
-        "inserted_id": str(result.inserted_id),
-        "notification_sent": push_result.get("sent", 0) > 0,
-        "notification_result": push_result,
+        "inserted_id": inserted_id,
+        "notification_queued": True,
+        "notification_id": notification_id,
+    }
+
+@api_router.post("/deliveries/bulk")
+async def create_deliveries_bulk(payload: DeliveryBulkCreate):
+    """Registra as entregas de um dia inteiro em uma única chamada.
+
+    Valida todos os caminhões antes de gravar, insere com um insert_many,
+    busca os nomes em uma consulta e enfileira uma notificação-resumo por funcionário.
+    """
+    rows = payload.deliveries
+    if not rows:
+        raise HTTPException(status_code=400, detail="No deliveries provided")
+    if len(rows) > MAX_BULK_DELIVERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_DELIVERIES} deliveries per request")
+
+    invalid_rows = [index for index, row in enumerate(rows) if row.truck_type not in TRUCK_RATES]
+    if invalid_rows:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Invalid truck type", "rows": invalid_rows},
+        )
+
+    date_fields = build_date_fields()
+    deliveries = [build_delivery_doc(row.employee_id, row.truck_type, row.value, date_fields) for row in rows]
+
+    async with dashboard_events.snapshot_lock:
+        await repository.add_deliveries(deliveries)
+        dashboard_events.publish_deltas(DELIVERY_EVENT, build_employee_deltas(deliveries, is_delivery=True))
+    logger.info(f"✅ {len(deliveries)} entregas inseridas no MongoDB em lote")
+
+    # Resumo por funcionário: total entregue e caminhões usados
+    summaries: Dict[str, dict] = {}
+    for delivery in deliveries:
+        summary = summaries.setdefault(delivery["employee_id"], {"amount": 0.0, "count": 0, "trucks": set()})
+        summary["amount"] += delivery["value"]
+        summary["count"] += 1
+        summary["trucks"].add(delivery["truck_type"])
+
+    employees = await db.users.find(
+        {"id": {"$in": list(summaries.keys())}},
+        {"_id": 0, "id": 1, "name": 1},
+    ).to_list(None)
+    names = {employee["id"]: employee.get("name") for employee in employees}
+
+    notification_ids = await enqueue_notifications(
+        db,
+        [
+            build_commission_notification(
+                employee_id=employee_id,
+                employee_name=names.get(employee_id) or f"Funcionário {employee_id}",
+                amount=round(summary["amount"], 2),
+                truck_type=", ".join(sorted(summary["trucks"])),
+            )
+            for employee_id, summary in summaries.items()
+        ],
+    )
+
+    return {
+        "success": True,
+        "inserted": len(deliveries),
+        "employees": {
+            employee_id: {"count": summary["count"], "total_value": round(summary["amount"], 2)}
+            for employee_id, summary in summaries.items()
+        },
+        "deliveries": deliveries,
+        "notifications_queued": len(notification_ids),
     }
 
 @api_router.post("/occurrences")
 async def create_occurrence(payload: OccurrenceCreate):
     """Registra uma ocorrência"""
-    occurrence = {
-        "id": str(uuid.uuid4()),
-        "employee_id": payload.employee_id,
-        "employee_name": payload.employee_name,
-        "type": payload.occurrence_type,
-        "description": payload.description,
-        "truck_type": payload.truck_type,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
+    occurrence = build_occurrence_doc(
+        payload.employee_id,
+        payload.employee_name,
+        payload.occurrence_type,
+        payload.description,
+        payload.truck_type,
+    )
     
-    occurrence_doc = occurrence.copy()
-    result = await db.occurrences.insert_one(occurrence_doc)
-    logger.info(f"✅ Ocorrência inserida no MongoDB: {payload.employee_id} - {payload.occurrence_type} (ID: {result.inserted_id})")
+    async with dashboard_events.snapshot_lock:
+        inserted_id = await repository.add_occurrence(occurrence)
+        dashboard_events.publish_deltas(OCCURRENCE_EVENT, build_employee_deltas([occurrence], is_delivery=False))
+    logger.info(f"✅ Ocorrência inserida no MongoDB: {payload.employee_id} - {payload.occurrence_type} (ID: {inserted_id})")
     return {
         "success": True,
         "occurrence": occurrence,
-        "inserted_id": str(result.inserted_id)
+        "inserted_id": inserted_id
     }
 
 @api_router.get("/admin/users")
-async def get_admin_users_new(admin: User = Depends(get_admin_user)):
+async def get_admin_users_new(response: Response, admin: User = Depends(get_admin_user)):
     """Retorna lista de usuários com novo sistema de comissão"""
     users = await db.users.find({"role": {"$in": ["driver", "helper"]}}, {"_id": 0, "password": 0}).to_list(1000)
     logger.info(f"📋 Buscando dados de {len(users)} usuários do MongoDB")
@@ -543,41 +619,39 @@ async def get_admin_users_new(admin: User = Depends(get_admin_user)):
     now = datetime.now(timezone.utc)
     month = now.month
     year = now.year
-    occurrence_counts = await get_occurrence_count_map_for_period(month, year)
+    user_ids = [user_data["id"] for user_data in users]
+
+    # O painel abre /api/admin/live a partir deste id; sob o lock nenhuma escrita
+    # entra nos totais depois de lido o id, então nada se perde nem conta duas vezes
+    async with dashboard_events.snapshot_lock:
+        response.headers[LIVE_EVENT_ID_HEADER] = dashboard_events.last_event_id
+        # Totais lidos do read model monthly_rollups (custo proporcional ao nº de funcionários)
+        month_totals = await repository.get_period_totals(get_period_key(month, year), user_ids)
+        all_time_totals = await repository.get_all_time_totals(user_ids)
+        today_values = await get_today_delivery_values(db, user_ids, now.date().isoformat())
+    occurrence_counts = build_occurrence_count_map(user_ids, month_totals)
+    tiers = assign_extreme_tiers(occurrence_counts)
     
     result = []
-    today_iso = datetime.now(timezone.utc).date().isoformat()
     for user_data in users:
         user_id = user_data["id"]
         
-        # Busca entregas
-        deliveries = await db.deliveries.find({"employee_id": user_id}, {"_id": 0}).to_list(1000)
-        total_delivered, month_delivered = get_delivery_values_for_period(deliveries, month, year)
-        today_delivered_value = sum(
-            d.get("value", 0)
-            for d in deliveries
-            if str(d.get("created_at", "")).startswith(today_iso)
-        )
-        
-        # Agrupa por caminhão
-        by_truck = {}
-        for d in deliveries:
-            truck = d.get("truck_type", "")
-            if truck:
-                if truck not in by_truck:
-                    by_truck[truck] = {"count": 0, "total_value": 0}
-                by_truck[truck]["count"] += 1
-                by_truck[truck]["total_value"] += d.get("value", 0)
+        totals = all_time_totals.get(user_id) or {}
+        total_delivered = totals.get("delivered_value", 0.0)
+        month_delivered = (month_totals.get(user_id) or {}).get("delivered_value", 0.0)
+        today_delivered_value = today_values.get(user_id, 0.0)
+        delivery_count = totals.get("delivery_count", 0)
+        by_truck = totals.get("by_truck", {})
         
         # Conta ocorrências e calcula percentual por tier
         occurrence_count = occurrence_counts.get(user_id, 0)
-        percentage = get_monthly_percentage(user_id, user_data.get("name"), occurrence_counts, month, year)
+        percentage = get_monthly_percentage(user_id, user_data.get("name"), tiers, month, year)
         
         # Calcula valor a receber com base no mês atual
         value_to_receive = month_delivered * (percentage / 100)
         
         logger.info(
-            f"  👤 {user_data['name']}: {len(deliveries)} entregas "
+            f"  👤 {user_data['name']}: {delivery_count} entregas "
             f"(mês R${month_delivered:.2f}, total R${total_delivered:.2f}), "
             f"{occurrence_count} ocorrências no mês, {percentage:.1f}% comissão"
         )
@@ -590,7 +664,7 @@ async def get_admin_users_new(admin: User = Depends(get_admin_user)):
                 "role": user_data["role"],
                 "assigned_day": user_data.get("assigned_day")
             },
-            "total_deliveries": len(deliveries),
+            "total_deliveries": delivery_count,
             "total_commission": round(value_to_receive, 2),
             "total_delivered_value": round(month_delivered, 2),
             "all_time_delivered_value": round(total_delivered, 2),
@@ -608,50 +682,60 @@ async def get_admin_users_new(admin: User = Depends(get_admin_user)):
     
     return result
 
+async def get_live_admin_user(request: Request, token: Optional[str] = None) -> User:
+    """Admin do stream SSE: o EventSource do navegador não envia headers, então o token pode vir na query."""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    current_user = await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    return await get_admin_user(current_user)
+
+@api_router.get("/admin/live")
+async def stream_admin_live_updates(
+    request: Request,
+    last_event_id: Optional[str] = None,
+    admin: User = Depends(get_live_admin_user),
+):
+    """Incrementos por funcionário para o painel do admin (Server-Sent Events).
+
+    O painel carrega /api/admin/users uma vez e aplica os eventos `delivery`,
+    `occurrence` e `commission`; em `reset` recarrega a lista inteira.
+    """
+    return StreamingResponse(
+        dashboard_events.stream(request.headers.get("last-event-id") or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @api_router.get("/employees/{employee_id}")
 async def get_employee_summary(employee_id: str):
     """Retorna resumo de entrega de um motorista"""
-    # Busca entregas
-    deliveries = await db.deliveries.find({"employee_id": employee_id}, {"_id": 0}).to_list(1000)
     now = datetime.now(timezone.utc)
     month = now.month
     year = now.year
-    total_delivered, month_delivered = get_delivery_values_for_period(deliveries, month, year)
-    today_iso = datetime.now(timezone.utc).date().isoformat()
-    today_delivered_value = sum(
-        d.get("value", 0)
-        for d in deliveries
-        if str(d.get("created_at", "")).startswith(today_iso)
-    )
-    
-    # Agrupa por caminhão
-    by_truck = {}
-    for d in deliveries:
-        truck = d.get("truck_type", "")
-        if truck:
-            if truck not in by_truck:
-                by_truck[truck] = {"count": 0, "total_value": 0}
-            by_truck[truck]["count"] += 1
-            by_truck[truck]["total_value"] += d.get("value", 0)
-    
-    # Busca dados do usuário
-    user = await db.users.find_one({"id": employee_id}, {"_id": 0, "password": 0})
-    user_name = user.get("name", f"Funcionário {employee_id}") if user else f"Funcionário {employee_id}"
 
-    # Busca ocorrências detalhadas
-    occurrences = await db.occurrences.find(
-        {"employee_id": employee_id},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(200)
-    occurrence_count = 0
-    for occurrence in occurrences:
-        dt = parse_iso_datetime(str(occurrence.get("created_at", "")))
-        if dt and dt.month == month and dt.year == year:
-            occurrence_count += 1
+    # Consultas em paralelo: rollups, cadastro, entregas de hoje e histograma da equipe (tier)
+    summary = await get_employee_summary_totals(db, employee_id, month, year, now.date().isoformat())
+    totals = summary["all_time"]
+    total_delivered = totals.get("delivered_value", 0.0)
+    by_truck = totals.get("by_truck", {})
+    month_delivered = summary["month"].get("delivered_value", 0.0)
+    occurrence_count = summary["month"].get("occurrence_count", 0)
+    today_delivered_value = summary["today_delivered_value"]
+
+    user = summary["user"]
+    user_name = user.get("name", f"Funcionário {employee_id}") if user else f"Funcionário {employee_id}"
 
     # Calcula percentual por tier (comparando com todos os membros)
-    occurrence_counts = await get_occurrence_count_map_for_period(month, year)
-    percentage = get_monthly_percentage(employee_id, user_name, occurrence_counts, month, year)
+    tiers = assign_extreme_tier_from_histogram(
+        employee_id,
+        occurrence_count,
+        summary["occurrence_count_histogram"],
+        in_roster=summary["in_roster"],
+    )
+    percentage = get_monthly_percentage(employee_id, user_name, tiers, month, year)
     
     # Calcula valor a receber no mês atual
     value_to_receive = month_delivered * (percentage / 100)
@@ -665,55 +749,94 @@ async def get_employee_summary(employee_id: str):
         "value_to_receive": round(value_to_receive, 2),
         "by_truck": by_truck,
         "occurrence_count": occurrence_count,
+        "all_time_occurrence_count": totals.get("occurrence_count", 0),
         "percentage": percentage,
         "month": month,
         "year": year,
         "status": "closed" if is_month_closed(month, year) else "provisional",
-        "occurrences": occurrences
     }
 
-
-@api_router.get("/reports/monthly-commission")
-async def get_monthly_commission_report(
-    month: int,
-    year: int,
-    admin: User = Depends(get_admin_user),
+@api_router.get("/employees/{employee_id}/occurrences")
+async def get_employee_occurrences(
+    employee_id: str,
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
 ):
-    """Gera relatório mensal de comissão por ranking de ocorrências."""
-    if month < 1 or month > 12:
-        raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
+    """Ocorrências do motorista, das mais recentes para as mais antigas (paginado por cursor).
+
+    Com month/year, só as do mês. Passe `next_cursor` como `cursor` para a página seguinte.
+    """
+    if (month is None) != (year is None):
+        raise HTTPException(status_code=400, detail="month and year must be given together")
+
+    query = {"employee_id": employee_id}
+    if month is not None:
+        query.update(build_period_match(month, year))
 
+    try:
+        occurrences, next_cursor = await find_page(db.occurrences, query, EMPLOYEE_OCCURRENCE_SORT, limit, cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return {
+        "employee_id": employee_id,
+        "month": month,
+        "year": year,
+        "occurrences": occurrences,
+        "next_cursor": next_cursor,
+    }
+
+
+def build_monthly_commission_row(
+    user_data: dict,
+    month_delivered: float,
+    occurrence_count: int,
+    tier_rate: float,
+) -> dict:
+    """Linha do relatório mensal; `tier_rate` é o percentual do tier do funcionário no mês."""
+    name = user_data.get("name")
+    if is_special_member(name):
+        percentage = final_percentage = SPECIAL_MEMBER_PERCENTAGE
+    else:
+        percentage, final_percentage = PROVISIONAL_MONTHLY_PERCENTAGE, tier_rate
+    commission_value = month_delivered * (percentage / 100)
+    final_commission_value = month_delivered * (final_percentage / 100)
+
+    return {
+        "employee_id": user_data["id"],
+        "employee_name": name,
+        "role": user_data.get("role"),
+        "occurrence_count": occurrence_count,
+        "monthly_delivered_value": round(month_delivered, 2),
+        "percentage": round(percentage, 2),
+        "commission_value": round(commission_value, 2),
+        "final_percentage": round(final_percentage, 2),
+        "final_commission_value": round(final_commission_value, 2),
+    }
+
+
+async def build_monthly_commission_report(month: int, year: int) -> dict:
+    """Calcula o relatório mensal de comissão por ranking de ocorrências."""
     users = await db.users.find(
         {"role": {"$in": ["driver", "helper"]}},
         {"_id": 0, "password": 0}
     ).to_list(1000)
 
-    occurrence_counts = await get_occurrence_count_map_for_period(month, year)
-    report_rows = []
+    month_totals = await repository.get_period_totals(get_period_key(month, year))
+    occurrence_counts = build_occurrence_count_map([user_data["id"] for user_data in users], month_totals)
+    tiers = assign_extreme_tiers(occurrence_counts)
 
-    for user_data in users:
-        user_id = user_data["id"]
-        name = user_data.get("name")
-        deliveries = await db.deliveries.find({"employee_id": user_id}, {"_id": 0}).to_list(5000)
-        _, month_delivered = get_delivery_values_for_period(deliveries, month, year)
-
-        percentage = get_monthly_percentage(user_id, name, occurrence_counts, month, year)
-        commission_value = month_delivered * (percentage / 100)
-
-        final_percentage = get_final_monthly_percentage(user_id, name, occurrence_counts)
-        final_commission_value = month_delivered * (final_percentage / 100)
-
-        report_rows.append({
-            "employee_id": user_id,
-            "employee_name": name,
-            "role": user_data.get("role"),
-            "occurrence_count": occurrence_counts.get(user_id, 0),
-            "monthly_delivered_value": round(month_delivered, 2),
-            "percentage": round(percentage, 2),
-            "commission_value": round(commission_value, 2),
-            "final_percentage": round(final_percentage, 2),
-            "final_commission_value": round(final_commission_value, 2),
-        })
+    report_rows = [
+        build_monthly_commission_row(
+            user_data,
+            (month_totals.get(user_data["id"]) or {}).get("delivered_value", 0.0),
+            occurrence_counts.get(user_data["id"], 0),
+            tiers.lookup(user_data["id"]).rate,
+        )
+        for user_data in users
+    ]
 
     report_rows.sort(key=lambda row: (row["occurrence_count"], -row["monthly_delivered_value"]))
 
@@ -743,10 +866,216 @@ async def get_monthly_commission_report(
         "rows": report_rows,
     }
 
+@api_router.get("/reports/monthly-commission")
+async def get_monthly_commission_report(
+    month: int,
+    year: int,
+    admin: User = Depends(get_admin_user),
+):
+    """Gera relatório mensal de comissão por ranking de ocorrências.
+
+    Meses encerrados são calculados uma vez e servidos do snapshot congelado;
+    o mês em andamento (provisório) é sempre calculado na hora.
+    """
+    if month < 1 or month > 12:
+        raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
+
+    if not is_month_closed(month, year):
+        return await build_monthly_commission_report(month, year)
+
+    snapshot = await get_report_snapshot(db, MONTHLY_COMMISSION_REPORT, month, year)
+    if snapshot:
+        return snapshot
+
+    report = await build_monthly_commission_report(month, year)
+    # Sem o rebuild dos rollups o mês sairia zerado e ficaria congelado assim
+    if not await rollups_built(db):
+        logger.warning(f"⚠️ Relatório {month:02d}/{year} não congelado: rode maintenance.py rebuild-rollups")
+        return report
+
+    await save_report_snapshot(db, MONTHLY_COMMISSION_REPORT, month, year, report)
+    logger.info(f"🧊 Snapshot do relatório {month:02d}/{year} gerado")
+    return report
+
+
+@api_router.post("/reports/monthly-commission/snapshot/refresh")
+async def refresh_monthly_commission_snapshot(
+    month: int,
+    year: int,
+    admin: User = Depends(get_admin_user),
+):
+    """Invalida e recalcula o snapshot de um mês encerrado."""
+    if month < 1 or month > 12:
+        raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
+    if not is_month_closed(month, year):
+        raise HTTPException(status_code=400, detail="Only closed months have snapshots")
+    if not await rollups_built(db):
+        raise HTTPException(status_code=409, detail=ROLLUPS_NOT_BUILT_DETAIL)
+
+    await delete_report_snapshot(db, MONTHLY_COMMISSION_REPORT, month, year)
+    report = await build_monthly_commission_report(month, year)
+    await save_report_snapshot(db, MONTHLY_COMMISSION_REPORT, month, year, report)
+    logger.info(f"🧊 Snapshot do relatório {month:02d}/{year} recalculado por {admin.username}")
+    return report
+
+async def iter_monthly_commission_rows(month: int, year: int) -> AsyncIterator[dict]:
+    """Linhas do relatório de um mês, uma a uma.
+
+    Meses encerrados com snapshot usam as linhas congeladas; os demais saem
+    do cursor de agregação já ordenado, sem carregar a equipe em memória.
+    """
+    if is_month_closed(month, year):
+        snapshot = await get_report_snapshot(db, MONTHLY_COMMISSION_REPORT, month, year)
+        if snapshot:
+            for row in snapshot["rows"]:
+                yield {"month": month, "year": year, **row}
+            return
+
+    period = get_period_key(month, year)
+    min_count, max_count = await get_occurrence_count_bounds(db, period)
+    async for totals in iter_period_totals(db, period):
+        occurrence_count = int(totals.get("occurrence_count", 0))
+        row = build_monthly_commission_row(
+            totals,
+            float(totals.get("delivered_value", 0)),
+            occurrence_count,
+            EXTREME_RATES[extreme_tier(occurrence_count, min_count, max_count)],
+        )
+        yield {"month": month, "year": year, **row}
+
+
+@api_router.get("/reports/monthly-commission/export")
+async def export_monthly_commission_report(
+    month: int,
+    year: int,
+    end_month: Optional[int] = None,
+    end_year: Optional[int] = None,
+    format: str = "csv",
+    admin: User = Depends(get_admin_user),
+):
+    """Exporta o relatório mensal em CSV ou NDJSON, em streaming.
+
+    Com end_month/end_year, exporta todos os meses do intervalo em sequência;
+    os bytes começam a sair antes de o primeiro mês terminar de ser calculado.
+    """
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(EXPORT_MEDIA_TYPES)}")
+
+    end_month = end_month or month
+    end_year = end_year or year
+    for value in (month, end_month):
+        if value < 1 or value > 12:
+            raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
+    if get_period_key(end_month, end_year) < get_period_key(month, year):
+        raise HTTPException(status_code=400, detail="End period must not be before start period")
+
+    months = list(iter_months(month, year, end_month, end_year))
+    if len(months) > MAX_EXPORT_MONTHS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_EXPORT_MONTHS} months per export")
+
+    async def rows() -> AsyncIterator[dict]:
+        for row_month, row_year in months:
+            async for row in iter_monthly_commission_rows(row_month, row_year):
+                yield row
+
+    filename = f"comissoes_{year:04d}-{month:02d}"
+    if months[-1] != (month, year):
+        filename += f"_{end_year:04d}-{end_month:02d}"
+    logger.info(f"📤 Exportação {format} de {len(months)} mês(es) iniciada por {admin.username}")
+
+    return StreamingResponse(
+        ENCODERS[format](rows()),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'},
+    )
+
+async def build_month_close_commissions(month: int, year: int) -> Tuple[List[dict], int]:
+    """Comissões finais do mês (get_final_monthly_percentage) e quantos ficaram sem entrega."""
+    users = await db.users.find(
+        {"role": {"$in": ["driver", "helper"]}},
+        {"_id": 0, "id": 1, "name": 1}
+    ).to_list(None)
+
+    month_totals = await repository.get_period_totals(get_period_key(month, year))
+    occurrence_counts = build_occurrence_count_map([user_data["id"] for user_data in users], month_totals)
+    tiers = assign_extreme_tiers(occurrence_counts)
+    posted_at = datetime.now(timezone.utc)
+
+    commissions = []
+    skipped = 0
+    for user_data in users:
+        user_id = user_data["id"]
+        month_delivered = (month_totals.get(user_id) or {}).get("delivered_value", 0.0)
+        if month_delivered <= 0:
+            skipped += 1
+            continue
+
+        name = user_data.get("name") or f"Funcionário {user_id}"
+        percentage = get_final_monthly_percentage(user_id, name, tiers)
+        commission = CommissionRecord(
+            employee_id=user_id,
+            employee_name=name,
+            month=month,
+            year=year,
+            total_delivered_value=round(month_delivered, 2),
+            percentage=percentage,
+            commission_amount=round(month_delivered * (percentage / 100), 2),
+            occurrence_count=occurrence_counts.get(user_id, 0),
+            tier=tiers.lookup(user_id).tier,
+            posted_at=posted_at,
+            notes="Fechamento do mês",
+        )
+        commission_doc = commission.model_dump()
+        commission_doc["posted_at"] = commission_doc["posted_at"].isoformat()
+        commissions.append(commission_doc)
+
+    return commissions, skipped
+
+
+async def run_month_close(month: int, year: int) -> None:
+    try:
+        commissions, skipped = await build_month_close_commissions(month, year)
+        await post_month_commissions(client, db, month, year, commissions, skipped)
+    except Exception as exc:
+        logger.error(f"❌ Fechamento {month:02d}/{year} falhou: {exc}")
+        await fail_month_close(db, month, year, exc)
+
+
+@api_router.post("/admin/month-close", status_code=202)
+async def close_month(month: int, year: int, admin: User = Depends(get_admin_user)):
+    """Fecha o mês: lança a comissão final de todos os funcionários em lote.
+
+    Roda em segundo plano e uma única vez por mês; chamadas repetidas
+    devolvem o fechamento em andamento ou concluído. Acompanhe por GET.
+    """
+    if month < 1 or month > 12:
+        raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
+    if not is_month_closed(month, year):
+        raise HTTPException(status_code=400, detail="Only finished months can be closed")
+    if not await rollups_built(db):
+        raise HTTPException(status_code=409, detail=ROLLUPS_NOT_BUILT_DETAIL)
+
+    job, claimed = await claim_month_close(db, month, year, admin.username)
+    if claimed:
+        logger.info(f"🔒 Fechamento {month:02d}/{year} iniciado por {admin.username}")
+        task = asyncio.create_task(run_month_close(month, year))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    return {**job, "started": claimed}
+
+
+@api_router.get("/admin/month-close")
+async def get_month_close_status(month: int, year: int, admin: User = Depends(get_admin_user)):
+    """Progresso do fechamento do mês (total, gravadas, notificações enfileiradas)."""
+    job = await get_month_close(db, month, year)
+    if not job:
+        raise HTTPException(status_code=404, detail="Month has not been closed")
+    return job
+
 app.include_router(api_router)
 
 # Register commission routes (novo sistema de comissões)
-commission_router = create_commission_router(db, security)
+commission_router = create_commission_router(db, security, repository)
 app.include_router(commission_router)
 
 app.add_middleware(
@@ -755,30 +1084,55 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[LIVE_EVENT_ID_HEADER],
 )
 
+# Orçamento de consultas por requisição (QUERY_BUDGET_MODE; desligado por padrão)
+app.add_middleware(QueryBudgetMiddleware)
+
+# Por último: fica por fora dos outros middlewares e mede a requisição inteira
+app.add_middleware(MetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Métricas no formato do Prometheus (latência por rota e comandos ao MongoDB)."""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+outbox_dispatcher = OutboxDispatcher(db, get_notification_sender())
+
 @app.on_event("startup")
 async def startup_event():
+    # Índices das consultas usadas pelas rotas (idempotente)
+    await ensure_indexes(db)
+    await check_rollups_built(db)
+
     # Create default admin user if doesn't exist
     admin = await db.users.find_one({"username": "admin"})
     if not admin:
-        admin_user = User(
+        admin_doc = build_user_doc(
             username="admin",
             name="Administrator",
-            role="admin"
+            role="admin",
+            password_hash=await hash_password_async("admin123")
         )
-        admin_doc = admin_user.model_dump()
-        admin_doc['password'] = hash_password("admin123")
-        admin_doc['created_at'] = admin_doc['created_at'].isoformat()
+        admin_user = User(**admin_doc)
         await db.users.insert_one(admin_doc)
+        user_cache.invalidate(admin_user.id)
         logger.info("Default admin user created (username: admin, password: admin123)")
 
+    # Worker que envia as notificações enfileiradas pelas rotas de escrita
+    outbox_dispatcher.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await outbox_dispatcher.stop()
     client.close()
+    password_hasher.shutdown()
@@ -1,13 +1,22 @@
 """
 Servidor simplificado SEM MongoDB para teste rápido
 Endpoint de comissão e ocorrências funcional
+Os dados ficam no InMemoryRepository (repositories.py), com a mesma regra de
+comissão do server.py: tiers por posição no mês e valor × percentual / 100
 """
+from datetime import datetime, timezone
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
 import uvicorn
 
+from commission_routes import calculate_commission_amounts
+from documents import TRUCK_RATES, build_delivery_doc, build_occurrence_doc
+from periods import get_period_key
+from repositories import InMemoryRepository
+from tiers import TierTable, assign_position_tiers
+
 app = FastAPI()
 
 # CORS
@@ -19,10 +28,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Dados em memória (mock)
-occurrences = []
-commissions = []
-deliveries = []  # Entregas por caminhão
+# Dados em memória, indexados por funcionário e por mês
+repository = InMemoryRepository()
 
 # Mock de motoristas
 employees_data = {
@@ -31,16 +38,6 @@ employees_data = {
     "emp_003": {"name": "Pedro Costa", "role": "driver"},
 }
 
-# Caminhões disponíveis
-TRUCK_TYPES = {
-    "BKO": 3.50,
-    "PYW": 3.50,
-    "NYC": 3.50,
-    "GKY": 7.50,
-    "GSD": 7.50,
-    "AUA": 10.00
-}
-
 # Models
 class DeliveryRequest(BaseModel):
     employee_id: str
@@ -71,35 +68,69 @@ class CommissionPostRequest(BaseModel):
     occurrence_count: int
     tier: str
 
+async def get_month_tiers(month: int, year: int) -> TierTable:
+    """Ranking do mês por ocorrências, como em /api/commission/calculate do server.py"""
+    return assign_position_tiers(await repository.get_month_occurrence_counts(month, year))
+
+async def build_employee_totals(employee_id: str, tiers: TierTable) -> dict:
+    """Totais de entrega, ocorrências do mês e valor a receber de um funcionário"""
+    now = datetime.now(timezone.utc)
+    totals = (await repository.get_all_time_totals([employee_id])).get(employee_id) or {}
+    month_totals = (await repository.get_period_totals(get_period_key(now.month, now.year), [employee_id])).get(employee_id) or {}
+
+    total_delivered = employees_data.get(employee_id, {}).get("total_delivered", totals.get("delivered_value", 0.0))
+    percentage = tiers.lookup(employee_id).rate
+    value_to_receive = calculate_commission_amounts([total_delivered], [percentage])[0]
+
+    return {
+        "total_deliveries": totals.get("delivery_count", 0),
+        "total_delivered_value": round(total_delivered, 2),
+        "value_to_receive": value_to_receive,
+        "by_truck": totals.get("by_truck", {}),
+        "occurrence_count": month_totals.get("occurrence_count", 0),
+        "percentage": percentage,
+    }
+
+async def get_current_tiers() -> TierTable:
+    now = datetime.now(timezone.utc)
+    return await get_month_tiers(now.month, now.year)
+
 # Endpoints de Ocorrência
 @app.post("/api/occurrences")
 async def log_occurrence(occurrence: OccurrenceRequest):
     """Registra ocorrência"""
-    occ_data = occurrence.model_dump()
-    occurrences.append(occ_data)
-    
+    occ_data = build_occurrence_doc(
+        occurrence.employee_id,
+        occurrence.employee_name,
+        occurrence.occurrence_type,
+        occurrence.description,
+        occurrence.truck_type,
+    )
+    occurrence_id = await repository.add_occurrence(occ_data)
+
     print(f"✅ Ocorrência registrada: {occurrence.employee_name} - {occurrence.occurrence_type}")
-    
+
     return {
         "message": "Occurrence logged successfully",
-        "occurrence_id": f"occ_{len(occurrences)}",
+        "occurrence_id": occurrence_id,
         "occurrence": occ_data
     }
 
 @app.get("/api/occurrences")
 async def get_occurrences(month: int, year: int):
-    """Obtém todas as ocorrências"""
+    """Obtém as ocorrências do mês"""
+    month_occurrences = await repository.list_occurrences(period=get_period_key(month, year))
     return {
         "month": month,
         "year": year,
-        "total_occurrences": len(occurrences),
-        "occurrences": occurrences
+        "total_occurrences": len(month_occurrences),
+        "occurrences": month_occurrences
     }
 
 @app.get("/api/occurrences/employee/{employee_id}")
 async def get_employee_occurrences(employee_id: str, month: int, year: int):
-    """Obtém ocorrências de um funcionário"""
-    emp_occ = [o for o in occurrences if o['employee_id'] == employee_id]
+    """Obtém ocorrências de um funcionário no mês"""
+    emp_occ = await repository.list_occurrences(employee_id=employee_id, period=get_period_key(month, year))
     return {
         "employee_id": employee_id,
         "month": month,
@@ -111,44 +142,32 @@ async def get_employee_occurrences(employee_id: str, month: int, year: int):
 # Endpoints de Comissão
 @app.post("/api/commission/calculate")
 async def calculate_commission(data: CommissionRequest):
-    """Calcula comissão baseada em ocorrências"""
-    # Conta ocorrências deste funcionário
-    emp_occurrences = [o for o in occurrences if o['employee_id'] == data.employee_id]
-    count = len(emp_occurrences)
-    
-    # Determina percentual por tier
-    if count >= 5:
-        percentage = 0.8
-        tier = "high"
-    elif count >= 2:
-        percentage = 0.9
-        tier = "median"
-    else:
-        percentage = 1.0
-        tier = "low"
-    
-    commission = data.total_delivered_value * (percentage / 100)
-    
-    print(f"📊 Comissão calculada: {data.employee_id} - {percentage}% - R$ {commission:.2f}")
-    
+    """Calcula comissão baseada no ranking de ocorrências do mês"""
+    employee_occurrences = await repository.get_month_occurrence_counts(data.month, data.year)
+    assignment = assign_position_tiers(employee_occurrences).lookup(data.employee_id)
+    commission = calculate_commission_amounts([data.total_delivered_value], [assignment.rate])[0]
+
+    print(f"📊 Comissão calculada: {data.employee_id} - {assignment.rate}% - R$ {commission:.2f}")
+
     return {
-        "percentage": percentage,
-        "commission_amount": round(commission, 2),
-        "occurrence_count": count,
-        "tier": tier
+        "percentage": assignment.rate,
+        "commission_amount": commission,
+        "occurrence_count": employee_occurrences.get(data.employee_id, 0),
+        "tier": assignment.tier
     }
 
 @app.post("/api/commission/post")
 async def post_commission(data: CommissionPostRequest):
     """Lança comissão no sistema"""
     com_data = data.model_dump()
-    commissions.append(com_data)
-    
+    com_data["posted_at"] = datetime.now(timezone.utc).isoformat()
+    commission_id = await repository.add_commission(com_data)
+
     print(f"💰 Comissão lançada: {data.employee_name} - R$ {data.commission_amount:.2f}")
-    
+
     return {
         "message": "Commission posted successfully",
-        "commission_id": f"com_{len(commissions)}",
+        "commission_id": commission_id,
         "commission": com_data,
         "notification_sent": True
     }
@@ -156,9 +175,7 @@ async def post_commission(data: CommissionPostRequest):
 @app.get("/api/commission/history")
 async def get_commissions(month: Optional[int] = None, year: Optional[int] = None):
     """Obtém histórico de comissões"""
-    filtered = commissions
-    if month and year:
-        filtered = [c for c in commissions if c['month'] == month and c['year'] == year]
+    filtered = await repository.list_commissions(month=month, year=year)
     return {
         "total": len(filtered),
         "commissions": filtered
@@ -167,8 +184,8 @@ async def get_commissions(month: Optional[int] = None, year: Optional[int] = Non
 @app.get("/api/commission/statistics")
 async def get_statistics(month: int, year: int):
     """Obtém estatísticas de comissão"""
-    month_commissions = [c for c in commissions if c['month'] == month and c['year'] == year]
-    
+    month_commissions = await repository.list_commissions(month=month, year=year)
+
     if not month_commissions:
         return {
             "month": month,
@@ -176,9 +193,9 @@ async def get_statistics(month: int, year: int):
             "total_commission": 0,
             "total_employees": 0
         }
-    
+
     total = sum(c['commission_amount'] for c in month_commissions)
-    
+
     return {
         "month": month,
         "year": year,
@@ -190,35 +207,21 @@ async def get_statistics(month: int, year: int):
 @app.get("/api/employees")
 async def get_employees():
     """Retorna lista de Motoristas/Ajudantes com Valor Total Entregue e Valor a Receber"""
+    tiers = await get_current_tiers()
     result = []
-    
+
     for emp_id, emp_data in employees_data.items():
-        # Conta ocorrências
-        emp_occ = [o for o in occurrences if o['employee_id'] == emp_id]
-        occ_count = len(emp_occ)
-        
-        # Calcula percentual
-        if occ_count >= 5:
-            percentage = 0.8
-        elif occ_count >= 2:
-            percentage = 0.9
-        else:
-            percentage = 1.0
-        
-        # Calcula valor a receber
-        total_delivered = emp_data["total_delivered"]
-        value_to_receive = total_delivered * (percentage / 100)
-        
+        totals = await build_employee_totals(emp_id, tiers)
         result.append({
             "employee_id": emp_id,
             "name": emp_data["name"],
             "role": emp_data["role"],
-            "total_delivered_value": round(total_delivered, 2),
-            "value_to_receive": round(value_to_receive, 2),
-            "occurrence_count": occ_count,
-            "percentage": percentage
+            "total_delivered_value": totals["total_delivered_value"],
+            "value_to_receive": totals["value_to_receive"],
+            "occurrence_count": totals["occurrence_count"],
+            "percentage": totals["percentage"]
         })
-    
+
     print(f"📋 {len(result)} motoristas retornados")
     return result
 
@@ -226,98 +229,36 @@ async def get_employees():
 async def get_employee_summary(employee_id: str):
     """Retorna dados de um motorista específico com entregas por caminhão"""
     # Busca motorista
-    emp_name = "Motorista"
     if employee_id in employees_data:
         emp_name = employees_data[employee_id]["name"]
     else:
         # Se o ID não existe, cria dados mock para o novo usuário
         emp_name = f"Usuário {employee_id[-4:]}"
         # Adiciona algumas entregas fictícias para teste
-        if not any(d['employee_id'] == employee_id for d in deliveries):
-            deliveries.append({
-                'employee_id': employee_id,
-                'truck_type': 'BKO',
-                'value': 5000.0
-            })
-            deliveries.append({
-                'employee_id': employee_id,
-                'truck_type': 'GKY',
-                'value': 3500.0
-            })
-    
-    # Busca entregas deste motorista
-    emp_deliveries = [d for d in deliveries if d['employee_id'] == employee_id]
-    
-    # Agrupa por caminhão
-    by_truck = {}
-    for d in emp_deliveries:
-        truck = d['truck_type']
-        if truck not in by_truck:
-            by_truck[truck] = {"count": 0, "total_value": 0}
-        by_truck[truck]["count"] += 1
-        by_truck[truck]["total_value"] += d['value']
-    
-    # Calcula ocorrências
-    emp_occ = [o for o in occurrences if o['employee_id'] == employee_id]
-    occ_count = len(emp_occ)
-    
-    # Calcula percentual
-    if occ_count >= 5:
-        percentage = 0.8
-    elif occ_count >= 2:
-        percentage = 0.9
-    else:
-        percentage = 1.0
-    
-    # Calcula total
-    total_delivered = sum(d['value'] for d in emp_deliveries)
-    value_to_receive = total_delivered * (percentage / 100)
-    
+        if not await repository.get_all_time_totals([employee_id]):
+            await repository.add_delivery(build_delivery_doc(employee_id, 'BKO', 5000.0))
+            await repository.add_delivery(build_delivery_doc(employee_id, 'GKY', 3500.0))
+
+    totals = await build_employee_totals(employee_id, await get_current_tiers())
+
     return {
         "employee_id": employee_id,
         "name": emp_name,
-        "total_delivered_value": round(total_delivered, 2),
-        "value_to_receive": round(value_to_receive, 2),
-        "by_truck": by_truck,
-        "occurrence_count": occ_count,
-        "percentage": percentage
+        "total_delivered_value": totals["total_delivered_value"],
+        "value_to_receive": totals["value_to_receive"],
+        "by_truck": totals["by_truck"],
+        "occurrence_count": totals["occurrence_count"],
+        "percentage": totals["percentage"]
     }
 
 @app.get("/api/admin/users")
 async def get_admin_users():
     """Retorna lista de usuários para o AdminDashboard com dados por caminhão"""
+    tiers = await get_current_tiers()
     result = []
-    
+
     for emp_id, emp_data in employees_data.items():
-        # Busca entregas
-        emp_deliveries = [d for d in deliveries if d['employee_id'] == emp_id]
-        total_delivered = sum(d['value'] for d in emp_deliveries)
-        
-        # Agrupa por caminhão
-        by_truck = {}
-        for d in emp_deliveries:
-            truck = d['truck_type']
-            if truck not in by_truck:
-                by_truck[truck] = {"count": 0, "total_value": 0}
-            by_truck[truck]["count"] += 1
-            by_truck[truck]["total_value"] += d['value']
-        
-        # Conta ocorrências
-        emp_occ = [o for o in occurrences if o['employee_id'] == emp_id]
-        occ_count = len(emp_occ)
-        
-        # Calcula percentual
-        if occ_count >= 5:
-            percentage = 0.8
-        elif occ_count >= 2:
-            percentage = 0.9
-        else:
-            percentage = 1.0
-        
-        # Calcula valor a receber (percentage já é decimal: 0.8, 0.9, 1.0)
-        value_to_receive = total_delivered * percentage
-        commission = value_to_receive  # Commission é o mesmo que value_to_receive
-        
+        totals = await build_employee_totals(emp_id, tiers)
         result.append({
             "user": {
                 "id": emp_id,
@@ -326,90 +267,61 @@ async def get_admin_users():
                 "role": emp_data["role"],
                 "assigned_day": "Monday"
             },
-            "total_deliveries": len(emp_deliveries),
-            "total_commission": round(commission, 2),
-            "total_delivered_value": round(total_delivered, 2),
-            "value_to_receive": round(value_to_receive, 2),
-            "by_truck": by_truck,
+            "total_deliveries": totals["total_deliveries"],
+            "total_commission": totals["value_to_receive"],
+            "total_delivered_value": totals["total_delivered_value"],
+            "value_to_receive": totals["value_to_receive"],
+            "by_truck": totals["by_truck"],
             "statistics": {
-                "occurrence_count": occ_count,
-                "percentage": percentage
+                "occurrence_count": totals["occurrence_count"],
+                "percentage": totals["percentage"]
             }
         })
-    
+
     print(f"📋 AdminDashboard: {len(result)} usuários retornados")
     return result
 
 @app.post("/api/employees/{employee_id}/update-value")
 async def update_employee_value(employee_id: str, data: dict):
-    """Atualiza o valor total entregue de um motorista"""
+    """Substitui o valor total entregue de um motorista (em vez da soma das entregas)"""
     if employee_id not in employees_data:
         return {"error": "Employee not found"}, 404
-    
-    employees_data[employee_id]["total_delivered"] = data.get("total_delivered", employees_data[employee_id]["total_delivered"])
-    
+
+    if "total_delivered" in data:
+        employees_data[employee_id]["total_delivered"] = data["total_delivered"]
+    totals = await build_employee_totals(employee_id, await get_current_tiers())
+
     return {
         "message": "Employee value updated",
         "employee_id": employee_id,
-        "new_value": employees_data[employee_id]["total_delivered"]
+        "new_value": totals["total_delivered_value"]
     }
 
 # Endpoints de Entregas por Caminhão
 @app.post("/api/deliveries")
 async def register_delivery(delivery: DeliveryRequest):
     """Registra entrega de um motorista em um caminhão específico"""
-    if delivery.truck_type not in TRUCK_TYPES:
+    if delivery.truck_type not in TRUCK_RATES:
         return {"error": "Invalid truck type"}, 400
-    
-    delivery_data = {
-        "id": f"del_{len(deliveries)+1}",
-        "employee_id": delivery.employee_id,
-        "truck_type": delivery.truck_type,
-        "value": delivery.value,
-        "timestamp": __import__('datetime').datetime.now().isoformat()
-    }
-    deliveries.append(delivery_data)
-    
+
+    delivery_data = build_delivery_doc(delivery.employee_id, delivery.truck_type, delivery.value)
+    await repository.add_delivery(delivery_data)
+
     print(f"📦 Entrega registrada: {delivery.employee_id} - {delivery.truck_type} - R$ {delivery.value:.2f}")
     return {"success": True, "delivery": delivery_data}
 
 @app.get("/api/employees/{employee_id}/deliveries")
 async def get_employee_deliveries(employee_id: str):
     """Retorna entregas de um motorista agrupadas por caminhão"""
-    emp_deliveries = [d for d in deliveries if d['employee_id'] == employee_id]
-    
-    # Agrupa por caminhão
-    by_truck = {}
-    for d in emp_deliveries:
-        truck = d['truck_type']
-        if truck not in by_truck:
-            by_truck[truck] = {"count": 0, "total_value": 0}
-        by_truck[truck]["count"] += 1
-        by_truck[truck]["total_value"] += d['value']
-    
-    # Calcula ocorrências
-    emp_occ = [o for o in occurrences if o['employee_id'] == employee_id]
-    occ_count = len(emp_occ)
-    
-    # Calcula percentual
-    if occ_count >= 5:
-        percentage = 0.8
-    elif occ_count >= 2:
-        percentage = 0.9
-    else:
-        percentage = 1.0
-    
-    # Calcula total entregue
-    total_delivered = sum(d['value'] for d in emp_deliveries)
-    value_to_receive = total_delivered * (percentage / 100)
-    
+    totals = await build_employee_totals(employee_id, await get_current_tiers())
+
     return {
         "employee_id": employee_id,
-        "by_truck": by_truck,
-        "total_delivered_value": round(total_delivered, 2),
-        "value_to_receive": round(value_to_receive, 2),
-        "occurrence_count": occ_count,
-        "percentage": percentage
+        "by_truck": totals["by_truck"],
+        "total_delivered_value": totals["total_delivered_value"],
+        "value_to_receive": totals["value_to_receive"],
+        "occurrence_count": totals["occurrence_count"],
+        "percentage": totals["percentage"]
     }
 
 # Health check
@@ -0,0 +1,421 @@
+"""
+Gerador de dados sintéticos em escala de produção
+
+Gera motoristas, ajudantes, entregas e ocorrências com os mesmos campos que
+register, create_delivery e create_occurrence gravam (documents.py), de forma
+determinística a partir de uma semente. Carrega direto no MongoDB com
+insert_many em lotes ou grava arquivos NDJSON para testes repetíveis.
+
+Uso:
+    python synthetic_data.py generate --drivers 2000 --helpers 1500 --deliveries 2000000 --end-date 2026-09-30 --to-mongo --drop
+    python synthetic_data.py generate --deliveries 100000 --end-date 2026-09-30 --out-dir data/seed42
+    python synthetic_data.py load --from-dir data/seed42 --drop
+
+Os rollups (`monthly_rollups`) são somados durante a geração e gravados junto.
+Para o mesmo resultado em execuções diferentes, fixe --seed e --end-date.
+Nunca rode com --drop contra o banco de produção.
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import random
+import string
+import time
+import unicodedata
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from passlib.hash import bcrypt
+
+from documents import TRUCK_RATES, build_delivery_doc, build_occurrence_doc, build_user_doc
+from indexes import create_indexes
+from maintenance import get_database
+from periods import build_date_fields
+from rollups import ROLLUPS_COLLECTION, add_to_rollups, apply_rollup_totals, build_rollup_documents, mark_rollups_built
+
+
+logger = logging.getLogger("synthetic_data")
+
+COLLECTIONS = ["users", "deliveries", "occurrences", ROLLUPS_COLLECTION]
+
+FIRST_NAMES = [
+    "João", "José", "Antônio", "Francisco", "Carlos", "Paulo", "Pedro", "Lucas", "Luiz", "Marcos",
+    "Luis", "Gabriel", "Rafael", "Daniel", "Marcelo", "Bruno", "Eduardo", "Felipe", "Raimundo", "Rodrigo",
+    "Maria", "Ana", "Francisca", "Antônia", "Adriana", "Juliana", "Márcia", "Fernanda", "Patrícia", "Aline",
+]
+LAST_NAMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+    "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes", "Vieira", "Barbosa",
+]
+
+# Caminhões pequenos rodam muito mais que os grandes; entregas grandes valem mais
+TRUCK_WEIGHTS = {"BKO": 0.24, "PYW": 0.22, "NYC": 0.20, "GKY": 0.14, "GSD": 0.12, "AUA": 0.08}
+# Mediana do valor por entrega (R$) por taxa do caminhão
+MEDIAN_VALUE_BY_RATE = {3.50: 350.0, 7.50: 900.0, 10.00: 1800.0}
+
+OCCURRENCE_TYPES = ["delay", "damage", "accident", "other"]
+OCCURRENCE_TYPE_WEIGHTS = [0.6, 0.25, 0.05, 0.10]
+OCCURRENCE_DESCRIPTIONS = {
+    "delay": ["Atraso na entrega de {n} horas", "Cliente ausente, reentrega necessária", "Saída do depósito atrasada"],
+    "damage": ["Avaria em {n} volumes", "Embalagem danificada na descarga", "Produto molhado na entrega"],
+    "accident": ["Colisão leve no pátio", "Dano no para-choque durante manobra"],
+    "other": ["Documentação incompleta", "Divergência de {n} itens na conferência", "Rota alterada sem aviso"],
+}
+
+
+def _bcrypt_salt(rng: random.Random) -> str:
+    alphabet = "./" + string.ascii_uppercase + string.ascii_lowercase + string.digits
+    # O último caractere do salt do bcrypt carrega só 2 bits úteis
+    return "".join(rng.choice(alphabet) for _ in range(21)) + rng.choice(".Oeu")
+
+
+class SyntheticDataGenerator:
+    """Gera os documentos em streaming; a mesma semente produz os mesmos documentos."""
+
+    def __init__(
+        self,
+        seed: int = 42,
+        drivers: int = 2000,
+        helpers: int = 1500,
+        deliveries: int = 1_000_000,
+        occurrences_per_employee_month: float = 0.8,
+        months: int = 12,
+        end_date: Optional[date] = None,
+        password: str = "senha123",
+    ):
+        self.seed = seed
+        self.drivers = drivers
+        self.helpers = helpers
+        self.deliveries = deliveries
+        self.occurrences_per_employee_month = occurrences_per_employee_month
+        self.months = months
+        self.end_date = end_date or datetime.now(timezone.utc).date()
+        self.start_date = self.end_date - timedelta(days=30 * months)
+        self.password = password
+        self.rollups: Dict[Any, Dict[str, Any]] = {}
+        self._employees: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def generated_at(self) -> str:
+        """Fim do período gerado (meia-noite depois de end_date): carimbo fixo dos rollups."""
+        next_day = self.end_date + timedelta(days=1)
+        return datetime(next_day.year, next_day.month, next_day.day, tzinfo=timezone.utc).isoformat()
+
+    def _rng(self, stream: str) -> random.Random:
+        # Uma sequência por tipo de documento: mudar a quantidade de entregas não muda os usuários
+        return random.Random(f"{self.seed}:{stream}")
+
+    @staticmethod
+    def _uuid(rng: random.Random) -> str:
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    def _working_day_moment(self, rng: random.Random) -> datetime:
+        """Dia útil (seg-sáb) no intervalo, em horário comercial."""
+        span = (self.end_date - self.start_date).days
+        while True:
+            day = self.start_date + timedelta(days=rng.randint(0, span))
+            if day.weekday() < 6:
+                break
+        return datetime(
+            day.year, day.month, day.day,
+            rng.randint(7, 17), rng.randint(0, 59), rng.randint(0, 59), rng.randint(0, 999999),
+            tzinfo=timezone.utc,
+        )
+
+    def employees(self) -> List[Dict[str, Any]]:
+        """Motoristas e ajudantes, com um peso de atividade (quanto cada um entrega)."""
+        if self._employees is not None:
+            return self._employees
+
+        rng = self._rng("users")
+        password_hash = bcrypt.using(salt=_bcrypt_salt(rng), rounds=12).hash(self.password)
+        employees = []
+        for index in range(self.drivers + self.helpers):
+            role = "driver" if index < self.drivers else "helper"
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+            username = f"{ascii_name.replace(' ', '.')}.{index:05d}"
+            created_at = datetime.combine(
+                self.start_date - timedelta(days=rng.randint(0, 365)), datetime.min.time(), timezone.utc
+            )
+            doc = build_user_doc(
+                username=username,
+                name=name,
+                role=role,
+                password_hash=password_hash,
+                user_id=self._uuid(rng),
+                created_at=created_at,
+            )
+            # Motoristas fazem a maior parte das entregas; a atividade varia bastante entre pessoas
+            activity = rng.lognormvariate(0, 0.5) * (1.5 if role == "driver" else 1.0)
+            employees.append({"doc": doc, "activity": activity})
+
+        self._employees = employees
+        return employees
+
+    def iter_users(self) -> Iterator[Dict[str, Any]]:
+        for employee in self.employees():
+            yield dict(employee["doc"])
+
+    def iter_deliveries(self, chunk_size: int = 10000) -> Iterator[Dict[str, Any]]:
+        rng = self._rng("deliveries")
+        employees = self.employees()
+        cum_activity = []
+        total = 0.0
+        for employee in employees:
+            total += employee["activity"]
+            cum_activity.append(total)
+        trucks = list(TRUCK_WEIGHTS)
+        truck_weights = [TRUCK_WEIGHTS[truck] for truck in trucks]
+
+        remaining = self.deliveries
+        while remaining > 0:
+            size = min(chunk_size, remaining)
+            remaining -= size
+            chosen_employees = rng.choices(employees, cum_weights=cum_activity, k=size)
+            chosen_trucks = rng.choices(trucks, weights=truck_weights, k=size)
+            for employee, truck_type in zip(chosen_employees, chosen_trucks):
+                median = MEDIAN_VALUE_BY_RATE.get(TRUCK_RATES[truck_type], 500.0)
+                value = round(min(rng.lognormvariate(math.log(median), 0.6), median * 15), 2)
+                delivery = build_delivery_doc(
+                    employee["doc"]["id"],
+                    truck_type,
+                    value,
+                    build_date_fields(self._working_day_moment(rng)),
+                    delivery_id=self._uuid(rng),
+                )
+                add_to_rollups(self.rollups, delivery, is_delivery=True)
+                yield delivery
+
+    def iter_occurrences(self) -> Iterator[Dict[str, Any]]:
+        """Ocorrências por funcionário com cauda longa: a maioria tem poucas, alguns têm muitas.
+
+        A quantidade segue uma Poisson cuja média varia por funcionário (gamma),
+        o que dá a distribuição binomial negativa típica de incidentes.
+        """
+        rng = self._rng("occurrences")
+        trucks = list(TRUCK_WEIGHTS)
+        truck_weights = [TRUCK_WEIGHTS[truck] for truck in trucks]
+        mean = self.occurrences_per_employee_month * self.months
+
+        for employee in self.employees():
+            doc = employee["doc"]
+            rate = rng.gammavariate(0.7, mean / 0.7) if mean > 0 else 0.0
+            for _ in range(_poisson(rng, rate)):
+                occurrence_type = rng.choices(OCCURRENCE_TYPES, weights=OCCURRENCE_TYPE_WEIGHTS, k=1)[0]
+                description = rng.choice(OCCURRENCE_DESCRIPTIONS[occurrence_type]).format(n=rng.randint(1, 5))
+                occurrence = build_occurrence_doc(
+                    doc["id"],
+                    doc["name"],
+                    occurrence_type,
+                    description,
+                    rng.choices(trucks, weights=truck_weights, k=1)[0],
+                    build_date_fields(self._working_day_moment(rng)),
+                    occurrence_id=self._uuid(rng),
+                )
+                add_to_rollups(self.rollups, occurrence, is_delivery=False)
+                yield occurrence
+
+
+def _poisson(rng: random.Random, lam: float) -> int:
+    if lam <= 0:
+        return 0
+    if lam > 50:
+        return max(0, round(rng.gauss(lam, math.sqrt(lam))))
+    # Knuth: suficiente para as médias baixas de ocorrências
+    limit, product, count = math.exp(-lam), rng.random(), 0
+    while product > limit:
+        product *= rng.random()
+        count += 1
+    return count
+
+
+def _batches(docs: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def bulk_insert(
+    collection: AsyncIOMotorCollection,
+    docs: Iterable[Dict[str, Any]],
+    batch_size: int = 5000,
+    parallel: int = 4,
+) -> int:
+    """insert_many em lotes, com até `parallel` lotes em voo ao mesmo tempo."""
+    semaphore = asyncio.Semaphore(parallel)
+    pending: List[asyncio.Task] = []
+    inserted = 0
+    started = time.perf_counter()
+
+    async def insert(batch: List[Dict[str, Any]]) -> None:
+        try:
+            await collection.insert_many(batch, ordered=False)
+        finally:
+            semaphore.release()
+
+    for batch in _batches(docs, batch_size):
+        await semaphore.acquire()
+        pending.append(asyncio.create_task(insert(batch)))
+        inserted += len(batch)
+        if inserted % (batch_size * 20) == 0:
+            pending = [task for task in pending if not task.done()]
+            elapsed = time.perf_counter() - started
+            logger.info("%s: %d documentos (%.0f/s)", collection.name, inserted, inserted / elapsed)
+
+    await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - started
+    logger.info("%s: %d documentos em %.1fs (%.0f/s)", collection.name, inserted, elapsed, inserted / elapsed if elapsed else 0)
+    return inserted
+
+
+async def drop_collections(db: AsyncIOMotorDatabase) -> None:
+    for name in COLLECTIONS:
+        await db[name].drop()
+
+
+async def generate_to_mongo(
+    db: AsyncIOMotorDatabase,
+    generator: SyntheticDataGenerator,
+    batch_size: int,
+    parallel: int,
+    drop: bool,
+) -> Dict[str, int]:
+    if drop:
+        await drop_collections(db)
+
+    counts = {
+        "users": await bulk_insert(db.users, generator.iter_users(), batch_size, parallel),
+        "deliveries": await bulk_insert(db.deliveries, generator.iter_deliveries(), batch_size, parallel),
+        "occurrences": await bulk_insert(db.occurrences, generator.iter_occurrences(), batch_size, parallel),
+    }
+    counts[ROLLUPS_COLLECTION] = await apply_rollup_totals(db, generator.rollups)
+    if drop:
+        # Banco recriado: os rollups gerados cobrem todas as entregas e ocorrências
+        await mark_rollups_built(db)
+
+    # Índices depois da carga: inserir em coleções sem índice secundário é mais rápido
+    await create_indexes(db)
+    return counts
+
+
+def write_ndjson(path: Path, docs: Iterable[Dict[str, Any]]) -> int:
+    count = 0
+    with path.open("w", encoding="utf-8") as handle:
+        for doc in docs:
+            handle.write(json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS, ensure_ascii=False))
+            handle.write("\n")
+            count += 1
+    logger.info("%s: %d documentos", path, count)
+    return count
+
+
+def generate_to_files(generator: SyntheticDataGenerator, out_dir: Path) -> Dict[str, int]:
+    """Um arquivo NDJSON por coleção (Extended JSON: datas como {"$date": ...}, aceito pelo mongoimport)."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    counts = {
+        "users": write_ndjson(out_dir / "users.ndjson", generator.iter_users()),
+        "deliveries": write_ndjson(out_dir / "deliveries.ndjson", generator.iter_deliveries()),
+        "occurrences": write_ndjson(out_dir / "occurrences.ndjson", generator.iter_occurrences()),
+    }
+    counts[ROLLUPS_COLLECTION] = write_ndjson(
+        out_dir / f"{ROLLUPS_COLLECTION}.ndjson",
+        build_rollup_documents(generator.rollups, updated_at=generator.generated_at),
+    )
+    return counts
+
+
+def read_ndjson(path: Path) -> Iterator[Dict[str, Any]]:
+    with path.open(encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                yield json_util.loads(line)
+
+
+async def load_from_files(
+    db: AsyncIOMotorDatabase,
+    from_dir: Path,
+    batch_size: int,
+    parallel: int,
+    drop: bool,
+) -> Dict[str, int]:
+    if drop:
+        await drop_collections(db)
+
+    counts = {}
+    for name in COLLECTIONS:
+        path = from_dir / f"{name}.ndjson"
+        if path.exists():
+            counts[name] = await bulk_insert(db[name], read_ndjson(path), batch_size, parallel)
+    if drop and ROLLUPS_COLLECTION in counts:
+        await mark_rollups_built(db)
+    await create_indexes(db)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="gera os dados (MongoDB e/ou NDJSON)")
+    generate.add_argument("--seed", type=int, default=42)
+    generate.add_argument("--drivers", type=int, default=2000)
+    generate.add_argument("--helpers", type=int, default=1500)
+    generate.add_argument("--deliveries", type=int, default=1_000_000)
+    generate.add_argument("--occurrences-per-month", type=float, default=0.8, help="média de ocorrências por funcionário por mês")
+    generate.add_argument("--months", type=int, default=12)
+    generate.add_argument("--end-date", type=date.fromisoformat, help="último dia gerado (AAAA-MM-DD); padrão: hoje")
+    generate.add_argument("--password", default="senha123", help="senha de todos os usuários gerados")
+    generate.add_argument("--to-mongo", action="store_true", help="carrega no banco de MONGO_URL/DB_NAME")
+    generate.add_argument("--out-dir", type=Path, help="grava um NDJSON por coleção nesta pasta")
+
+    load = subparsers.add_parser("load", help="carrega no MongoDB os NDJSON gerados antes")
+    load.add_argument("--from-dir", type=Path, required=True)
+
+    for command in (generate, load):
+        command.add_argument("--batch-size", type=int, default=5000)
+        command.add_argument("--parallel", type=int, default=4, help="lotes de insert_many em voo ao mesmo tempo")
+        command.add_argument("--drop", action="store_true", help="apaga users/deliveries/occurrences/monthly_rollups antes")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    if args.command == "generate":
+        if not args.to_mongo and not args.out_dir:
+            parser.error("informe --to-mongo e/ou --out-dir")
+
+        def new_generator() -> SyntheticDataGenerator:
+            return SyntheticDataGenerator(
+                seed=args.seed,
+                drivers=args.drivers,
+                helpers=args.helpers,
+                deliveries=args.deliveries,
+                occurrences_per_employee_month=args.occurrences_per_month,
+                months=args.months,
+                end_date=args.end_date,
+                password=args.password,
+            )
+
+        if args.out_dir:
+            logger.info("NDJSON gerado: %s", generate_to_files(new_generator(), args.out_dir))
+        if args.to_mongo:
+            counts = asyncio.run(generate_to_mongo(get_database(), new_generator(), args.batch_size, args.parallel, args.drop))
+            logger.info("Carga concluída: %s", counts)
+    elif args.command == "load":
+        counts = asyncio.run(load_from_files(get_database(), args.from_dir, args.batch_size, args.parallel, args.drop))
+        logger.info("Carga concluída: %s", counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import os
+import uuid
+
+import pytest
+from starlette.responses import Response
+
+pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture(scope="module")
+def server():
+    """server.py com mongomock-motor (o cliente do MongoDB é criado na importação)."""
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = "commission_tracker_test"
+    os.environ["NOTIFICATION_SENDER"] = "stub"
+
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+    import server as server_module
+    return server_module
+
+
+def replayed_delivery_count(server, snapshot_event_id, employee_id):
+    count = 0
+    for message in server.dashboard_events._missed_since(snapshot_event_id):
+        data = json.loads(message.split("data: ", 1)[1])
+        count += sum(delta["delivery_count"] for delta in data["employees"] if delta["employee_id"] == employee_id)
+    return count
+
+
+def test_delivery_during_admin_snapshot_is_counted_once(server, monkeypatch):
+    async def scenario():
+        employee_id = str(uuid.uuid4())
+        await server.db.users.insert_one(
+            {"id": employee_id, "username": employee_id, "name": "Motorista", "role": "driver"}
+        )
+
+        # Pausa /api/admin/users no meio da leitura dos totais
+        reading = asyncio.Event()
+        resume = asyncio.Event()
+        get_period_totals = server.repository.get_period_totals
+
+        async def paused_get_period_totals(*args, **kwargs):
+            reading.set()
+            await resume.wait()
+            return await get_period_totals(*args, **kwargs)
+
+        monkeypatch.setattr(server.repository, "get_period_totals", paused_get_period_totals)
+
+        response = Response()
+        snapshot = asyncio.create_task(server.get_admin_users_new(response, admin=None))
+        await reading.wait()
+
+        write = asyncio.create_task(
+            server.create_delivery(server.DeliveryCreate(employee_id=employee_id, truck_type="BKO", value=10))
+        )
+        await asyncio.sleep(0.1)
+        resume.set()
+        users = await snapshot
+        await write
+
+        snapshot_event_id = response.headers[server.LIVE_EVENT_ID_HEADER]
+        in_snapshot = next(u["total_deliveries"] for u in users if u["user"]["id"] == employee_id)
+        return in_snapshot, replayed_delivery_count(server, snapshot_event_id, employee_id)
+
+    in_snapshot, replayed = asyncio.run(scenario())
+
+    # Lista + eventos posteriores ao header: a entrega aparece exatamente uma vez
+    assert in_snapshot + replayed == 1
@@ -0,0 +1,46 @@
+import asyncio
+
+from live_updates import DashboardBroadcaster, DELIVERY_EVENT, RESET_EVENT
+
+
+async def read_events(broadcaster, last_event_id, count):
+    stream = broadcaster.stream(last_event_id)
+    try:
+        return [await stream.__anext__() for _ in range(count)]
+    finally:
+        await stream.aclose()
+
+
+def event_ids(messages):
+    return [line[4:] for message in messages for line in message.split("\n") if line.startswith("id: ")]
+
+
+def test_resume_from_snapshot_id_replays_only_later_events():
+    broadcaster = DashboardBroadcaster()
+    broadcaster.publish(DELIVERY_EVENT, {"employees": []})
+    snapshot_id = broadcaster.last_event_id
+    later = [broadcaster.publish(DELIVERY_EVENT, {"employees": []}) for _ in range(2)]
+
+    # retry, ready e os dois eventos posteriores à lista
+    messages = asyncio.run(read_events(broadcaster, snapshot_id, 4))
+
+    assert event_ids(messages) == later
+
+
+def test_snapshot_id_before_any_event_is_resumable():
+    broadcaster = DashboardBroadcaster()
+    snapshot_id = broadcaster.last_event_id
+    event_id = broadcaster.publish(DELIVERY_EVENT, {"employees": []})
+
+    messages = asyncio.run(read_events(broadcaster, snapshot_id, 3))
+
+    assert event_ids(messages) == [event_id]
+
+
+def test_snapshot_id_from_another_process_resets():
+    broadcaster = DashboardBroadcaster()
+    broadcaster.publish(DELIVERY_EVENT, {"employees": []})
+
+    messages = asyncio.run(read_events(broadcaster, DashboardBroadcaster().last_event_id, 3))
+
+    assert messages[2].startswith(f"event: {RESET_EVENT}")
@@ -0,0 +1,38 @@
+import base64
+
+import pytest
+from bson import ObjectId
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+SORT = [("created_at", -1), ("_id", -1)]
+
+
+def forge(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    doc = {"created_at": "2026-10-17T12:00:00+00:00", "_id": ObjectId()}
+
+    assert decode_cursor(encode_cursor(doc, SORT), SORT) == [doc["created_at"], doc["_id"]]
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        forge("not json"),
+        forge('["s", "v"]'),
+        forge('{"s": ["created_at", "_id"], "v": ["x", {"$oid": "zz"}]}'),
+        forge('{"s": ["created_at", "_id"], "v": [{"$date": "x"}, "y"]}'),
+        forge('{"s": ["created_at", "_id"], "v": [{"$date": 1e400}, "y"]}'),
+        forge('{"s": ["created_at", "_id"], "v": [{"$numberDecimal": "abc"}, "y"]}'),
+        forge('{"s": ["created_at", "_id"], "v": {"a": 1, "b": 2}}'),
+        forge('{"s": ["_id"], "v": ["y"]}'),
+    ],
+)
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, SORT)
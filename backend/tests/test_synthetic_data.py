@@ -0,0 +1,18 @@
+from datetime import date
+
+from synthetic_data import SyntheticDataGenerator, generate_to_files
+
+
+def test_same_seed_and_end_date_write_identical_files(tmp_path):
+    def generate(out_dir):
+        generator = SyntheticDataGenerator(
+            seed=7, drivers=5, helpers=3, deliveries=200, months=2, end_date=date(2026, 9, 30)
+        )
+        generate_to_files(generator, out_dir)
+        return {path.name: path.read_bytes() for path in sorted(out_dir.iterdir())}
+
+    first = generate(tmp_path / "first")
+    second = generate(tmp_path / "second")
+
+    assert "monthly_rollups.ndjson" in first
+    assert first == second
@@ -0,0 +1,64 @@
+import user_cache as user_cache_module
+from user_cache import UserCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(monkeypatch, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr(user_cache_module.time, "monotonic", clock)
+    return UserCache(**kwargs), clock
+
+
+def test_entry_expires_after_ttl(monkeypatch):
+    cache, clock = make_cache(monkeypatch, ttl_seconds=30)
+    cache.set("u1", {"id": "u1", "role": "driver"})
+
+    clock.now += 29.9
+    assert cache.get("u1") == {"id": "u1", "role": "driver"}
+
+    clock.now += 0.1
+    assert cache.get("u1") is None
+    assert cache.stats()["size"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_invalidate_forces_reload(monkeypatch):
+    cache, _ = make_cache(monkeypatch)
+    cache.set("u1", {"id": "u1", "role": "driver"})
+    cache.set("u2", {"id": "u2", "role": "helper"})
+
+    cache.invalidate("u1")
+    cache.invalidate("missing")
+
+    assert cache.get("u1") is None
+    assert cache.get("u2") == {"id": "u2", "role": "helper"}
+
+
+def test_returns_copies(monkeypatch):
+    cache, _ = make_cache(monkeypatch)
+    user = {"id": "u1", "role": "driver"}
+    cache.set("u1", user)
+
+    user["role"] = "admin"
+    cache.get("u1")["role"] = "admin"
+
+    assert cache.get("u1")["role"] == "driver"
+
+
+def test_evicts_least_recently_used(monkeypatch):
+    cache, _ = make_cache(monkeypatch, max_size=2)
+    cache.set("u1", {"id": "u1"})
+    cache.set("u2", {"id": "u2"})
+    cache.get("u1")
+    cache.set("u3", {"id": "u3"})
+
+    assert cache.get("u2") is None
+    assert cache.get("u1") is not None
+    assert cache.evictions == 1
@@ -0,0 +1,148 @@
+"""
+Atribuição de tiers por ocorrências
+Ordena a equipe de um período uma única vez e devolve uma tabela imutável
+employee_id -> (tier, percentual, posição), compartilhada por todas as rotas
+"""
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, Tuple
+
+
+HIGH = "high"  # mais ocorrências
+MEDIAN = "median"
+LOW = "low"  # menos ocorrências
+
+# Fechamento por posição (commission_routes): terços da equipe ordenada
+POSITION_RATES = {HIGH: 0.8, MEDIAN: 0.9, LOW: 1.0}
+
+# Regra por extremos (server.py): quem tem o máximo, o mínimo ou fica no meio
+EXTREME_RATES = {HIGH: 0.4, MEDIAN: 0.5, LOW: 0.6}
+
+
+@dataclass(frozen=True)
+class TierAssignment:
+    tier: str
+    rate: float
+    rank: int  # posição na ordenação por ocorrências (0 = mais ocorrências)
+    occurrence_count: int
+
+
+class TierTable(Mapping[str, TierAssignment]):
+    """Tabela imutável employee_id -> TierAssignment de um período.
+
+    `lookup` devolve a atribuição padrão para quem não está na tabela, com a
+    mesma regra que as funções antigas aplicavam a funcionários ausentes.
+    """
+
+    def __init__(self, assignments: Dict[str, TierAssignment], default: TierAssignment):
+        self._assignments = MappingProxyType(dict(assignments))
+        self.default = default
+
+    def __getitem__(self, employee_id: str) -> TierAssignment:
+        return self._assignments[employee_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._assignments)
+
+    def __len__(self) -> int:
+        return len(self._assignments)
+
+    def lookup(self, employee_id: str) -> TierAssignment:
+        return self._assignments.get(employee_id, self.default)
+
+
+def _rank(occurrence_counts: Dict[str, int]) -> List[Tuple[str, int]]:
+    """Mais ocorrências primeiro; empates mantêm a ordem do mapa (sort estável)."""
+    return sorted(occurrence_counts.items(), key=lambda item: item[1], reverse=True)
+
+
+def position_tier(position: int, total: int) -> str:
+    tier_size = total / 3
+    if position < tier_size:
+        return HIGH
+    if position < tier_size * 2:
+        return MEDIAN
+    return LOW
+
+
+def assign_position_tiers(occurrence_counts: Dict[str, int]) -> TierTable:
+    """Divide a equipe ordenada em 3 terços iguais: 0.8% / 0.9% / 1.0%.
+
+    Funcionários fora do mapa ficam na última posição (tier low), como antes.
+    """
+    ranked = _rank(occurrence_counts)
+    total = len(ranked)
+
+    assignments: Dict[str, TierAssignment] = {}
+    for position, (employee_id, count) in enumerate(ranked):
+        tier = position_tier(position, total)
+        assignments[employee_id] = TierAssignment(tier, POSITION_RATES[tier], position, count)
+
+    if total:
+        last_tier = position_tier(total - 1, total)
+        default = TierAssignment(last_tier, POSITION_RATES[last_tier], total - 1, 0)
+    else:
+        default = TierAssignment(LOW, POSITION_RATES[LOW], 0, 0)
+    return TierTable(assignments, default)
+
+
+def extreme_tier(employee_count: int, min_count: int, max_count: int) -> str:
+    """Tier pela regra de extremos, dados o mínimo/máximo da equipe."""
+    # Sem diferenciação real: todos sem ocorrência => melhor taxa;
+    # todos com mesmo número > 0 => taxa média.
+    if max_count == min_count:
+        return LOW if max_count == 0 else MEDIAN
+
+    # Com empates, quem tem mesma quantidade recebe o mesmo tier.
+    if employee_count == max_count:
+        return HIGH
+    if employee_count == min_count:
+        return LOW
+    return MEDIAN
+
+
+def assign_extreme_tiers(occurrence_counts: Dict[str, int]) -> TierTable:
+    """Mais ocorrências: 0.4%; menos: 0.6%; demais: 0.5%.
+
+    Funcionários fora do mapa contam como 0 ocorrências.
+    """
+    ranked = _rank(occurrence_counts)
+    max_count = ranked[0][1] if ranked else 0
+    min_count = ranked[-1][1] if ranked else 0
+
+    assignments: Dict[str, TierAssignment] = {}
+    for position, (employee_id, count) in enumerate(ranked):
+        tier = extreme_tier(count, min_count, max_count)
+        assignments[employee_id] = TierAssignment(tier, EXTREME_RATES[tier], position, count)
+
+    default_tier = extreme_tier(0, min_count, max_count)
+    default = TierAssignment(default_tier, EXTREME_RATES[default_tier], len(ranked), 0)
+    return TierTable(assignments, default)
+
+
+def assign_extreme_tier_from_histogram(
+    employee_id: str,
+    occurrence_count: int,
+    count_histogram: Dict[int, int],
+    in_roster: bool = True,
+) -> TierTable:
+    """Tabela da regra por extremos só para `employee_id`, sem carregar a equipe.
+
+    `count_histogram` é ocorrências -> quantidade de funcionários na equipe,
+    calculado no banco. Tier e percentual saem iguais aos de assign_extreme_tiers;
+    nos empates, a posição é a do primeiro empatado. Quem não faz parte da
+    equipe (in_roster=False) recebe a atribuição padrão, como em lookup().
+    """
+    max_count = max(count_histogram, default=0)
+    min_count = min(count_histogram, default=0)
+    rank = sum(employees for count, employees in count_histogram.items() if count > occurrence_count)
+
+    default_tier = extreme_tier(0, min_count, max_count)
+    default = TierAssignment(default_tier, EXTREME_RATES[default_tier], sum(count_histogram.values()), 0)
+    if not in_roster:
+        return TierTable({}, default)
+
+    tier = extreme_tier(occurrence_count, min_count, max_count)
+    assignment = TierAssignment(tier, EXTREME_RATES[tier], rank, occurrence_count)
+    return TierTable({employee_id: assignment}, default)
@@ -26,6 +26,60 @@ const TRUCK_RATES = {
   AUA: 10.00
 };
 
+// Soma os incrementos de entregas de /api/admin/live aos usuários carregados de /api/admin/users
+function applyEmployeeDeltas(users, deltas) {
+  const byEmployee = {};
+  deltas.forEach((delta) => {
+    byEmployee[delta.employee_id] = [...(byEmployee[delta.employee_id] || []), delta];
+  });
+
+  return users.map((userData) => {
+    const employeeDeltas = byEmployee[userData.user.id];
+    if (!employeeDeltas) return userData;
+
+    const next = {
+      ...userData,
+      by_truck: { ...(userData.by_truck || {}) },
+      statistics: { ...userData.statistics }
+    };
+    employeeDeltas.forEach((delta) => {
+      next.total_deliveries = (next.total_deliveries || 0) + delta.delivery_count;
+      next.all_time_delivered_value = round2((next.all_time_delivered_value || 0) + delta.delivered_value);
+      next.today_delivered_value = round2((next.today_delivered_value || 0) + delta.today_delivered_value);
+      Object.entries(delta.by_truck).forEach(([truck, data]) => {
+        const current = next.by_truck[truck] || { count: 0, total_value: 0 };
+        next.by_truck[truck] = {
+          count: current.count + data.count,
+          total_value: round2(current.total_value + data.total_value)
+        };
+      });
+
+      // Valor a receber é do mês corrente, como no backend. Ocorrências não passam
+      // por aqui: mudam o percentual da equipe toda e recarregam a lista
+      if (delta.month === next.statistics.month && delta.year === next.statistics.year) {
+        next.total_delivered_value = round2((next.total_delivered_value || 0) + delta.delivered_value);
+        next.value_to_receive = round2(next.total_delivered_value * (next.statistics.percentage / 100));
+        next.total_commission = next.value_to_receive;
+      }
+    });
+    return next;
+  });
+}
+
+function round2(value) {
+  return Math.round(value * 100) / 100;
+}
+
+// Ids "<processo>-<sequência>" de live_updates.py: o evento veio depois da lista carregada?
+function isEventAfter(eventId, snapshotEventId) {
+  if (!snapshotEventId) return true;
+  const [boot, sequence] = String(eventId).split('-');
+  const [snapshotBoot, snapshotSequence] = String(snapshotEventId).split('-');
+  // Outro processo (restart): o stream novo manda `reset` e a lista é recarregada
+  if (boot !== snapshotBoot) return false;
+  return Number(sequence) > Number(snapshotSequence);
+}
+
 function AdminDashboard({ user, token, onLogout }) {
   const now = new Date();
   const reportSectionRef = useRef(null);
@@ -44,21 +98,45 @@ function AdminDashboard({ user, token, onLogout }) {
   const [reportDialogOpen, setReportDialogOpen] = useState(false);
   const [reportError, setReportError] = useState('');
   const [lastReportAt, setLastReportAt] = useState('');
+  const [liveConnected, setLiveConnected] = useState(false);
+  const liveDateRef = useRef(null);
+  // Incrementos recebidos enquanto /api/admin/users está em andamento (null fora disso)
+  const liveBufferRef = useRef(null);
+  const pendingUserFetchesRef = useRef(0);
+  // Ordem das recargas: uma resposta atrasada não sobrescreve uma lista mais nova
+  const userFetchSequenceRef = useRef(0);
+  const appliedUserFetchRef = useRef(0);
 
   const navigate = useNavigate();
 
+  // Retorna o id do último evento já refletido na lista (header X-Live-Event-Id)
   const fetchUsers = async () => {
+    // Eventos que chegam durante a requisição ficam guardados; no fim só os
+    // posteriores à lista são aplicados, sem perder nem contar duas vezes
+    if (pendingUserFetchesRef.current === 0) liveBufferRef.current = [];
+    pendingUserFetchesRef.current += 1;
+    userFetchSequenceRef.current += 1;
+    const fetchSequence = userFetchSequenceRef.current;
     try {
       const response = await axios.get(`${API}/admin/users`, {
         headers: { Authorization: `Bearer ${token}` },
         timeout: 5000
       });
-      setUsers(response.data);
+      const snapshotEventId = response.headers['x-live-event-id'] || null;
+      if (fetchSequence < appliedUserFetchRef.current) return snapshotEventId;
+      appliedUserFetchRef.current = fetchSequence;
+      const missed = liveBufferRef.current.filter((entry) => isEventAfter(entry.id, snapshotEventId));
+      setUsers(missed.reduce((current, entry) => applyEmployeeDeltas(current, entry.deltas), response.data));
       console.log('✅ Usuários carregados do backend');
+      return snapshotEventId;
     } catch (error) {
       console.error('Erro ao carregar usuários:', error.message);
-      setUsers([]);
+      if (fetchSequence >= appliedUserFetchRef.current) setUsers([]);
       toast.error(error.response?.data?.detail || 'Falha ao carregar usuários');
+      return null;
+    } finally {
+      pendingUserFetchesRef.current -= 1;
+      if (pendingUserFetchesRef.current === 0) liveBufferRef.current = null;
     }
   };
 
@@ -170,13 +248,78 @@ function AdminDashboard({ user, token, onLogout }) {
     toast.success('PDF exportado com sucesso.');
   };
 
+  // Atualizações ao vivo: depois da lista inicial só chegam os incrementos por funcionário.
+  // O stream abre logo após /api/admin/users, sem esperar o relatório, e retoma do id
+  // devolvido por ela: o servidor reenvia tudo o que foi gravado entre as duas requisições
+  const openLiveUpdates = (snapshotEventId) => {
+    const resume = snapshotEventId ? `&last_event_id=${encodeURIComponent(snapshotEventId)}` : '';
+    const source = new EventSource(`${API}/admin/live?token=${encodeURIComponent(token)}${resume}`);
+
+    // Virou o dia: "hoje" e o mês dos totais mudaram, recarrega a lista
+    const syncDate = (date) => {
+      const changed = liveDateRef.current !== null && liveDateRef.current !== date;
+      liveDateRef.current = date;
+      if (changed) fetchUsers();
+      return changed;
+    };
+
+    const handleReady = (event) => {
+      syncDate(JSON.parse(event.data).date);
+      setLiveConnected(true);
+    };
+
+    const handleDeltas = (event) => {
+      const { employees } = JSON.parse(event.data);
+      if (syncDate(employees[0].date)) return;
+      if (liveBufferRef.current) {
+        liveBufferRef.current.push({ id: event.lastEventId, deltas: employees });
+        return;
+      }
+      setUsers((current) => applyEmployeeDeltas(current, employees));
+    };
+
+    // Uma ocorrência muda o percentual de vários funcionários (tier da equipe): recarrega
+    const handleOccurrence = (event) => {
+      const { employees } = JSON.parse(event.data);
+      if (syncDate(employees[0].date)) return;
+      fetchUsers();
+    };
+
+    const handleCommission = (event) => {
+      const commission = JSON.parse(event.data);
+      toast.success(`💰 Comissão lançada: ${commission.employee_name} - R$ ${Number(commission.commission_amount).toFixed(2)}`);
+    };
+
+    // Eventos perdidos (reconexão tardia ou reinício do servidor)
+    const handleReset = () => fetchUsers();
+
+    source.addEventListener('ready', handleReady);
+    source.addEventListener('delivery', handleDeltas);
+    source.addEventListener('occurrence', handleOccurrence);
+    source.addEventListener('commission', handleCommission);
+    source.addEventListener('reset', handleReset);
+    // O EventSource reconecta sozinho e retoma pelo Last-Event-ID
+    source.onerror = () => setLiveConnected(false);
+
+    return source;
+  };
+
   useEffect(() => {
+    let source = null;
+    let closed = false;
+
     const loadData = async () => {
-      await fetchUsers();
+      const snapshotEventId = await fetchUsers();
+      if (!closed) source = openLiveUpdates(snapshotEventId);
       await fetchMonthlyReport();
       setLoading(false);
     };
     loadData();
+
+    return () => {
+      closed = true;
+      if (source) source.close();
+    };
   }, []);
 
 
@@ -199,7 +342,7 @@ function AdminDashboard({ user, token, onLogout }) {
       toast.success(`✅ Entrega registrada! R$ ${parseFloat(commissionData.value).toFixed(2)} - ${commissionData.truck_type}`);
       setCommissionDialogOpen(false);
       setCommissionData({ value: '', truck_type: 'BKO' });
-      await fetchUsers();
+      if (!liveConnected) await fetchUsers();
     } catch (err) {
       toast.error('❌ Erro: ' + (err.response?.data?.detail || err.message));
     } finally {
@@ -227,7 +370,7 @@ function AdminDashboard({ user, token, onLogout }) {
       toast.success(`✅ Ocorrência registrada! ${occurrenceData.truck_type}`);
       setOccurrenceDialogOpen(false);
       setOccurrenceData({ type: 'delay', description: '', truck_type: 'BKO' });
-      await fetchUsers();
+      if (!liveConnected) await fetchUsers();
     } catch (err) {
       toast.error('❌ Erro: ' + (err.response?.data?.detail || err.message));
     } finally {
@@ -17,6 +17,8 @@ const occurrenceTypeLabel = {
   other: 'Outro'
 };
 
+const OCCURRENCES_PAGE_SIZE = 20;
+
 const formatDateTime = (value) => {
   if (!value) return '-';
   const date = new Date(value);
@@ -28,6 +30,9 @@ function UserDashboard({ user, token, onLogout }) {
   const [loading, setLoading] = useState(true);
   const [employeeSummary, setEmployeeSummary] = useState(null);
   const [loadError, setLoadError] = useState('');
+  const [occurrences, setOccurrences] = useState([]);
+  const [occurrencesCursor, setOccurrencesCursor] = useState(null);
+  const [loadingOccurrences, setLoadingOccurrences] = useState(false);
   const navigate = useNavigate();
 
   const fetchEmployeeSummary = async () => {
@@ -45,11 +50,29 @@ function UserDashboard({ user, token, onLogout }) {
     }
   };
 
+  // Lista paginada: o resumo traz só as contagens
+  const fetchOccurrences = async (cursor = null) => {
+    try {
+      setLoadingOccurrences(true);
+      const response = await axios.get(`${BACKEND_URL}/api/employees/${user.id}/occurrences`, {
+        params: { limit: OCCURRENCES_PAGE_SIZE, ...(cursor ? { cursor } : {}) }
+      });
+      setOccurrences((current) => (cursor ? [...current, ...response.data.occurrences] : response.data.occurrences));
+      setOccurrencesCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error('❌ Erro ao carregar ocorrências:', error.message);
+      toast.error('Erro ao carregar ocorrências');
+    } finally {
+      setLoadingOccurrences(false);
+    }
+  };
+
   useEffect(() => {
     console.log('UserDashboard montado, user:', user);
     setLoading(false);
     if (user?.id) {
       fetchEmployeeSummary();
+      fetchOccurrences();
     }
   }, [user?.id]);
 
@@ -181,7 +204,7 @@ function UserDashboard({ user, token, onLogout }) {
                 <CardTitle className="text-xl">⚠️ Suas Ocorrências</CardTitle>
               </CardHeader>
               <CardContent>
-                {employeeSummary.occurrences && employeeSummary.occurrences.length > 0 ? (
+                {occurrences.length > 0 ? (
                   <div className="overflow-x-auto">
                     <table className="w-full text-sm">
                       <thead>
@@ -193,7 +216,7 @@ function UserDashboard({ user, token, onLogout }) {
                         </tr>
                       </thead>
                       <tbody>
-                        {employeeSummary.occurrences.map((occurrence, index) => (
+                        {occurrences.map((occurrence, index) => (
                           <tr key={`${occurrence.created_at || 'occ'}-${index}`} className="border-b hover:bg-gray-50">
                             <td className="py-2 px-3">{formatDateTime(occurrence.created_at)}</td>
                             <td className="py-2 px-3">{occurrenceTypeLabel[occurrence.type] || occurrence.type || '-'}</td>
@@ -203,6 +226,16 @@ function UserDashboard({ user, token, onLogout }) {
                         ))}
                       </tbody>
                     </table>
+                    {occurrencesCursor && (
+                      <Button
+                        onClick={() => fetchOccurrences(occurrencesCursor)}
+                        disabled={loadingOccurrences}
+                        variant="outline"
+                        className="mt-4"
+                      >
+                        {loadingOccurrences ? 'Carregando...' : 'Carregar mais'}
+                      </Button>
+                    )}
                   </div>
                 ) : (
                   <p className="text-sm text-muted-foreground">Nenhuma ocorrência registrada para você.</p>